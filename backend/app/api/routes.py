@@ -1,6 +1,11 @@
-from fastapi import APIRouter, HTTPException
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Request
 from fastapi.responses import StreamingResponse
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.sse import TokenCoalescer, dumps
 from app.schemas.chat import CaseSlotState, ChatRequest
+from app.services.batch_service import parse_batch
 
 
 def create_router(container):
@@ -42,6 +47,48 @@ def create_router(container):
 
     @router.post("/chat/stream")
     async def chat_stream(request: ChatRequest):
-        return StreamingResponse(container.qa.stream_chat(request), media_type="text/event-stream")
+        window_ms = settings.sse_window_ms if request.stream_window_ms is None else min(request.stream_window_ms, settings.sse_max_window_ms)
+        coalescer = TokenCoalescer(window_ms, request.stream_max_bytes or settings.sse_max_bytes, settings.sse_max_pending)
+        return StreamingResponse(coalescer.stream(container.qa.stream_chat(request)), media_type="text/event-stream")
+
+    @router.post("/batch")
+    async def batch(
+        http_request: Request,
+        concurrency: Optional[int] = Query(default=None, ge=1),
+        persist: bool = True,
+        mode: str = Query(default="normal", pattern="^(normal|plus)$"),
+    ):
+        try:
+            items = parse_batch((await http_request.body()).decode("utf-8").splitlines())
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=f"JSONL 解析失败: {exc}")
+        if not items:
+            raise HTTPException(status_code=400, detail="批量问题为空")
+        rows = container.batch.run(items, concurrency, persist, mode)
+        return StreamingResponse((dumps(row) + "\n" async for row in rows), media_type="application/x-ndjson")
+
+    @router.get("/metrics")
+    async def get_metrics():
+        reranker = container.retrieval.reranker
+        sse_events, sse_frames = metrics.total("sse_events_in"), metrics.total("sse_frames_out")
+        return {
+            "retrieval_cache": container.retrieval.cache_stats(),
+            "rerank_cache": reranker.cache.stats() if reranker.cache is not None else {"enabled": False},
+            "guardrail_lexicon": container.guardrail.lexicon.counts,
+            "intent_router": container.intent.route_stats(),
+            "intent_cache": container.intent.cache.stats() if container.intent.cache is not None else {"enabled": False},
+            "answer_cache": container.qa.answer_cache.stats() if container.qa.answer_cache is not None else {"enabled": False},
+            "cancellation": {
+                "requests_cancelled": metrics.total("requests_cancelled"),
+                "llm_streams_cancelled": metrics.total("llm_streams_cancelled"),
+                "llm_tokens_saved": metrics.total("llm_tokens_saved"),
+            },
+            "sse": {
+                "events_in": sse_events,
+                "frames_out": sse_frames,
+                "events_per_frame": round(sse_events / sse_frames, 2) if sse_frames else None,
+            },
+            "counters": metrics.snapshot(),
+        }
 
     return router
@@ -0,0 +1,41 @@
+import argparse
+import asyncio
+import sys
+from app.container import Container
+from app.core.logging import configure_logging
+from app.core.sse import dumps
+from app.services.batch_service import parse_batch
+
+
+async def run(args):
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    with source:
+        items = parse_batch(source)
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    container = Container()
+    failed = 0
+    try:
+        async for row in container.batch.run(items, args.concurrency, not args.no_persist, args.mode):
+            failed += row["status"] != "ok"
+            output.write(dumps(row) + "\n")
+            output.flush()
+    finally:
+        await container.close()
+        if output is not sys.stdout:
+            output.close()
+    print(f"items={len(items)} failed={failed}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量问答：读取 JSONL 问题，按并发上限运行问答流水线并输出 JSONL 结果")
+    parser.add_argument("input", help="JSONL 文件（每行 {\"id\", \"query\", \"mode\"}，或纯文本问题），- 表示标准输入")
+    parser.add_argument("--output", default="-", help="结果 JSONL 文件，缺省输出到标准输出")
+    parser.add_argument("--concurrency", type=int, default=None, help="并发问题数，缺省取 BATCH_CONCURRENCY")
+    parser.add_argument("--mode", default="normal", choices=["normal", "plus"], help="未指定 mode 的问题使用的模式")
+    parser.add_argument("--no-persist", action="store_true", help="不写入会话记录与记忆")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    configure_logging()
+    main()
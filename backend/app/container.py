@@ -1,5 +1,6 @@
 from app.repositories.mongo_repo import MongoRepository
 from app.repositories.redis_repo import RedisRepository
+from app.services.batch_service import BatchService
 from app.services.conversation_service import ConversationService
 from app.services.guardrail_service import GuardrailService
 from app.services.intent_service import IntentService
@@ -16,10 +17,12 @@ class Container:
         self.model = ModelService()
         self.conversation = ConversationService(self.mongo)
         self.guardrail = GuardrailService()
-        self.intent = IntentService(self.model)
+        self.intent = IntentService(self.model, self.guardrail)
         self.retrieval = RetrievalService(self.model)
         self.memory = MemoryService(self.mongo, self.redis, self.model)
         self.qa = QAOrchestrator(self.mongo, self.conversation, self.model, self.intent, self.retrieval, self.memory, self.guardrail)
+        self.batch = BatchService(self.qa)
 
     async def close(self):
+        self.model.close()
         await self.mongo.close()
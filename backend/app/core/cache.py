@@ -0,0 +1,71 @@
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Dict, Hashable, Optional
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text or "").lower().split())
+
+
+def query_hash(text: str) -> str:
+    return hashlib.sha1(normalize_query(text).encode("utf-8")).hexdigest()
+
+
+class TTLCache:
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 0):
+        self.max_size = max(1, max_size)
+        self.ttl = ttl_seconds
+        self.version = ""
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            expires_at, value = item
+            if expires_at and expires_at < monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        expires_at = monotonic() + self.ttl if self.ttl > 0 else 0
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def ensure_version(self, version: str):
+        if version == self.version:
+            return
+        with self._lock:
+            if version != self.version:
+                self._data.clear()
+                self.version = version
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+            "version": self.version,
+        }
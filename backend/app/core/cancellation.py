@@ -0,0 +1,33 @@
+import threading
+from typing import Optional
+
+
+class RequestCancelled(Exception):
+    pass
+
+
+class CancellationToken:
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason = ""
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "cancelled"):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def wait(self, timeout: float) -> bool:
+        return self._event.wait(timeout)
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise RequestCancelled(self.reason)
+
+
+def check_cancelled(token: Optional[CancellationToken]):
+    if token is not None:
+        token.raise_if_cancelled()
@@ -52,8 +52,59 @@ class Settings:
 
     es_host: str = _get("ES_HOST", "http://localhost:9200")
     es_index: str = _get("ES_INDEX", _get("INDEX_NAME", "legal_corpus")).replace(" ", "")
+    es_index_replicas: int = int(_get("ES_INDEX_REPLICAS", "1"))
+    es_index_retain: int = int(_get("ES_INDEX_RETAIN", "1"))
+    embedding_dims: int = int(_get("EMBEDDING_DIMS", "1152"))
+    embedding_projection_dims: int = int(_get("EMBEDDING_PROJECTION_DIMS", "0"))
+    embedding_projection_path: str = _resolve_path(_get("EMBEDDING_PROJECTION_PATH", ""), str(BASE_DIR / "rag" / "embedding_projection.npz"))
+    retrieval_backend: str = _get("RETRIEVAL_BACKEND", "es")
+    local_index_dir: str = _resolve_path(_get("LOCAL_INDEX_DIR", ""), str(BASE_DIR / "rag" / "local_index"))
+    retrieval_fusion: str = _get("RETRIEVAL_FUSION", "python")
+    hybrid_parity_sample_rate: float = float(_get("HYBRID_PARITY_SAMPLE_RATE", "0"))
+    retrieval_ids_only: bool = _get_bool("RETRIEVAL_IDS_ONLY", False)
+    retrieval_cache_enabled: bool = _get_bool("RETRIEVAL_CACHE_ENABLED", True)
+    retrieval_cache_size: int = int(_get("RETRIEVAL_CACHE_SIZE", "2000"))
+    retrieval_cache_ttl_seconds: float = float(_get("RETRIEVAL_CACHE_TTL_SECONDS", "3600"))
+    intent_router_enabled: bool = _get_bool("INTENT_ROUTER_ENABLED", True)
+    intent_router_threshold: float = float(_get("INTENT_ROUTER_THRESHOLD", "0.9"))
+    intent_cache_enabled: bool = _get_bool("INTENT_CACHE_ENABLED", True)
+    intent_cache_size: int = int(_get("INTENT_CACHE_SIZE", "2000"))
+    intent_cache_ttl_seconds: float = float(_get("INTENT_CACHE_TTL_SECONDS", "1800"))
+    llm_rate_limit_rps: float = float(_get("LLM_RATE_LIMIT_RPS", "0"))
+    llm_rate_limit_burst: float = float(_get("LLM_RATE_LIMIT_BURST", "0"))
+    embedding_rate_limit_rps: float = float(_get("EMBEDDING_RATE_LIMIT_RPS", "0"))
+    embedding_rate_limit_burst: float = float(_get("EMBEDDING_RATE_LIMIT_BURST", "0"))
+    rerank_rate_limit_rps: float = float(_get("RERANK_RATE_LIMIT_RPS", "0"))
+    rerank_rate_limit_burst: float = float(_get("RERANK_RATE_LIMIT_BURST", "0"))
+    batch_concurrency: int = int(_get("BATCH_CONCURRENCY", "4"))
+    batch_max_concurrency: int = int(_get("BATCH_MAX_CONCURRENCY", "16"))
+    progressive_citations: bool = _get_bool("PROGRESSIVE_CITATIONS", True)
+    sse_window_ms: float = float(_get("SSE_WINDOW_MS", "40"))
+    sse_max_window_ms: float = float(_get("SSE_MAX_WINDOW_MS", "500"))
+    sse_max_bytes: int = int(_get("SSE_MAX_BYTES", "1024"))
+    sse_max_pending: int = int(_get("SSE_MAX_PENDING", "256"))
+    generation_pipelined: bool = _get_bool("GENERATION_PIPELINED", True)
+    generation_stream_workers: int = int(_get("GENERATION_STREAM_WORKERS", "16"))
+    prompt_token_budget_normal: int = int(_get("PROMPT_TOKEN_BUDGET_NORMAL", "2000"))
+    prompt_token_budget_plus: int = int(_get("PROMPT_TOKEN_BUDGET_PLUS", "4000"))
+    prompt_token_budget_draft: int = int(_get("PROMPT_TOKEN_BUDGET_DRAFT", "1200"))
+    answer_cache_enabled: bool = _get_bool("ANSWER_CACHE_ENABLED", True)
+    answer_cache_size: int = int(_get("ANSWER_CACHE_SIZE", "1000"))
+    answer_cache_ttl_seconds: float = float(_get("ANSWER_CACHE_TTL_SECONDS", "86400"))
+    answer_cache_similarity: float = float(_get("ANSWER_CACHE_SIMILARITY", "0.95"))
+    index_version_ttl_seconds: float = float(_get("INDEX_VERSION_TTL_SECONDS", "30"))
+    law_catalog_path: str = _resolve_path(_get("LAW_CATALOG_PATH", ""), str(BASE_DIR / "rag" / "law_catalog.json"))
+    guardrail_lexicon_dir: str = _resolve_path(_get("GUARDRAIL_LEXICON_DIR", ""), str(BASE_DIR / "rag" / "guardrail"))
+    guardrail_reload_interval: float = float(_get("GUARDRAIL_RELOAD_INTERVAL", "5"))
     docs_folder: str = _resolve_path(_get("DOCS_FOLDER", ""), str(BASE_DIR / "rag" / "data"))
 
+    ingest_parse_workers: int = int(_get("INGEST_PARSE_WORKERS", "4"))
+    ingest_embed_batch_size: int = int(_get("INGEST_EMBED_BATCH_SIZE", "8"))
+    ingest_embed_concurrency: int = int(_get("INGEST_EMBED_CONCURRENCY", "4"))
+    ingest_checkpoint_path: str = _resolve_path(_get("INGEST_CHECKPOINT_PATH", ""), str(BASE_DIR / "rag" / "ingest_checkpoint.jsonl"))
+    ingest_manifest_path: str = _resolve_path(_get("INGEST_MANIFEST_PATH", ""), str(BASE_DIR / "rag" / "ingest_manifest.json"))
+    ingest_watch_interval: float = float(_get("INGEST_WATCH_INTERVAL", "2"))
+
     mongodb_url: str = _get("MONGODB_URL", "mongodb://localhost:27017")
     mongodb_database: str = _get("MONGODB_DATABASE", _get("DATABASE_NAME", "rag_system"))
     conversations_collection: str = _get("CONVERSATIONS_COLLECTION", _get("COLLECTION_NAME", "chat_history"))
@@ -78,6 +129,21 @@ class Settings:
     rerank_model_name: str = _get("RERANK_MODEL_NAME", "qwen3-rerank")
     rerank_endpoint: str = _get("RERANK_ENDPOINT", "https://dashscope.aliyuncs.com/compatible-api/v1/reranks")
     rerank_model_path: str = _get("RERANK_MODEL_PATH", str(BASE_DIR / "rag" / "rerank_model"))
+    rerank_backend: str = _get("RERANK_BACKEND", "torch")
+    rerank_onnx_path: str = _resolve_path(_get("RERANK_ONNX_PATH", ""), str(BASE_DIR / "rag" / "rerank_model_onnx"))
+    rerank_onnx_threads: int = int(_get("RERANK_ONNX_THREADS", "4"))
+    rerank_max_length: int = int(_get("RERANK_MAX_LENGTH", "512"))
+    rerank_batching_enabled: bool = _get_bool("RERANK_BATCHING_ENABLED", True)
+    rerank_batch_window_ms: float = float(_get("RERANK_BATCH_WINDOW_MS", "10"))
+    rerank_max_batch_pairs: int = int(_get("RERANK_MAX_BATCH_PAIRS", "64"))
+    rerank_bucket_chars: int = int(_get("RERANK_BUCKET_CHARS", "64"))
+    rerank_pool_size: int = int(_get("RERANK_POOL_SIZE", "8"))
+    rerank_deadline_seconds: float = float(_get("RERANK_DEADLINE_SECONDS", "2.5"))
+    rerank_local_deadline_seconds: float = float(_get("RERANK_LOCAL_DEADLINE_SECONDS", "0"))
+    rerank_timeout_seconds: float = float(_get("RERANK_TIMEOUT_SECONDS", "10"))
+    rerank_cache_enabled: bool = _get_bool("RERANK_CACHE_ENABLED", True)
+    rerank_cache_size: int = int(_get("RERANK_CACHE_SIZE", "20000"))
+    rerank_cache_ttl_seconds: float = float(_get("RERANK_CACHE_TTL_SECONDS", "86400"))
     fusion_top_k: int = int(_get("FUSION_TOP_K", "10"))
     rerank_top_n: int = int(_get("RERANK_TOP_N", "5"))
     docs_per_intent: int = int(_get("DOCS_PER_INTENT", _get("RERANK_TOP_N", "5")))
@@ -0,0 +1,74 @@
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+Match = Tuple[int, int, str, Any]
+
+
+class KeywordAutomaton:
+    def __init__(self, keywords: Iterable[Tuple[str, Any]] = ()):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[str, Any]]] = [[]]
+        self._size = 0
+        self._built = True
+        for keyword, payload in keywords:
+            self.add(keyword, payload)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, keyword: str, payload: Any = None):
+        if not keyword:
+            return
+        node = 0
+        for ch in keyword:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._goto[node][ch] = nxt
+            node = nxt
+        self._out[node].append((keyword, payload))
+        self._size += 1
+        self._built = False
+
+    def build(self) -> "KeywordAutomaton":
+        queue = deque(self._goto[0].values())
+        for node in queue:
+            self._fail[node] = 0
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+        self._built = True
+        return self
+
+    def finditer(self, text: str) -> Iterator[Match]:
+        if not self._built:
+            self.build()
+        node = 0
+        for i, ch in enumerate(text or ""):
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            for keyword, payload in self._out[node]:
+                yield i - len(keyword) + 1, i + 1, keyword, payload
+
+    def findall(self, text: str, longest: bool = True) -> List[Match]:
+        matches = sorted(self.finditer(text), key=lambda m: (m[0], m[0] - m[1]))
+        if not longest:
+            return matches
+        result: List[Match] = []
+        end = 0
+        for match in matches:
+            if match[0] >= end:
+                result.append(match)
+                end = match[1]
+        return result
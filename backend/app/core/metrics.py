@@ -0,0 +1,41 @@
+import threading
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._counters: Dict[Tuple[str, Tuple], float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def get(self, name: str, **labels) -> float:
+        return self._counters.get((name, tuple(sorted((k, str(v)) for k, v in labels.items()))), 0.0)
+
+    def total(self, name: str) -> float:
+        with self._lock:
+            return sum(value for (key, _), value in self._counters.items() if key == name)
+
+    def ratio(self, hit_name: str, miss_name: str, **labels) -> Optional[float]:
+        hits = self.get(hit_name, **labels)
+        total = hits + self.get(miss_name, **labels)
+        return round(hits / total, 4) if total else None
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        result: Dict[str, Dict[str, float]] = defaultdict(dict)
+        with self._lock:
+            items = list(self._counters.items())
+        for (name, labels), value in sorted(items):
+            result[name][",".join(f"{k}={v}" for k, v in labels) or "total"] = value
+        return dict(result)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,35 @@
+import threading
+import time
+from typing import Optional
+from app.core.metrics import metrics
+
+
+class RateLimiter:
+    def __init__(self, name: str, rate: float, burst: Optional[float] = None):
+        self.name = name
+        self.rate = max(0.0, rate)
+        self.capacity = max(1.0, burst or self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self):
+        if not self.enabled:
+            return
+        wait = self._reserve()
+        metrics.incr("rate_limit_acquired", limiter=self.name)
+        if wait > 0:
+            metrics.incr("rate_limit_wait_ms", wait * 1000, limiter=self.name)
+            time.sleep(wait)
@@ -0,0 +1,116 @@
+import asyncio
+import json
+from importlib import import_module
+from time import monotonic
+from typing import Any, AsyncGenerator, AsyncIterator, List
+from app.core.metrics import metrics
+from app.schemas.events import ChatEvent
+
+try:
+    _orjson = import_module("orjson")
+except ImportError:
+    _orjson = None
+
+_END = object()
+
+
+def _default(value: Any) -> Any:
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(data: Any) -> str:
+    if _orjson is not None:
+        return _orjson.dumps(data, default=_default).decode("utf-8")
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=_default)
+
+
+def encode_event(name: str, data: Any) -> str:
+    return f"event: {name}\ndata: {dumps(data)}\n\n"
+
+
+def encode(event: ChatEvent) -> str:
+    return encode_event(event.name, event.data)
+
+
+class TokenCoalescer:
+    def __init__(self, window_ms: float, max_bytes: int, max_pending: int = 256):
+        self.window = max(0.0, window_ms) / 1000
+        self.max_bytes = max(1, max_bytes)
+        self.max_pending = max(1, max_pending)
+        self.events_in = 0
+        self.frames_out = 0
+
+    async def stream(self, events: AsyncGenerator[ChatEvent, None]) -> AsyncIterator[str]:
+        if self.window <= 0:
+            try:
+                async for event in events:
+                    self.events_in += 1
+                    self.frames_out += 1
+                    yield encode(event)
+            finally:
+                self._record()
+            return
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_pending)
+        pump = asyncio.create_task(self._pump(events, queue))
+        parts: List[str] = []
+        size = 0
+        deadline = None
+        try:
+            while True:
+                timeout = None if deadline is None else max(0.0, deadline - monotonic())
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    yield self._flush(parts)
+                    parts, size, deadline = [], 0, None
+                    continue
+                if isinstance(item, BaseException):
+                    raise item
+                if item is not _END and item.name == "token":
+                    content = item.content
+                    self.events_in += 1
+                    parts.append(content)
+                    size += len(content.encode("utf-8"))
+                    if deadline is None:
+                        deadline = monotonic() + self.window
+                    if size >= self.max_bytes:
+                        yield self._flush(parts)
+                        parts, size, deadline = [], 0, None
+                    continue
+                if parts:
+                    yield self._flush(parts)
+                    parts, size, deadline = [], 0, None
+                if item is _END:
+                    return
+                self.events_in += 1
+                self.frames_out += 1
+                yield encode(item)
+        finally:
+            self._record()
+            pump.cancel()
+            await asyncio.shield(self._close(pump, events))
+
+    def _record(self):
+        metrics.incr("sse_events_in", self.events_in)
+        metrics.incr("sse_frames_out", self.frames_out)
+
+    async def _close(self, pump: asyncio.Task, events: AsyncGenerator[ChatEvent, None]):
+        await asyncio.gather(pump, return_exceptions=True)
+        await events.aclose()
+
+    async def _pump(self, events: AsyncGenerator[ChatEvent, None], queue: asyncio.Queue):
+        try:
+            async for event in events:
+                await queue.put(event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            await queue.put(exc)
+            return
+        await queue.put(_END)
+
+    def _flush(self, parts: List[str]) -> str:
+        self.frames_out += 1
+        return encode_event("token", {"content": "".join(parts)})
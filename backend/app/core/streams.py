@@ -0,0 +1,72 @@
+import asyncio
+from concurrent.futures import Executor
+from time import perf_counter
+from typing import AsyncIterator, Callable, Iterable, Optional
+
+_DONE = object()
+
+
+class _StreamError:
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+class ThreadedStream:
+    def __init__(self, factory: Callable[[], Iterable], executor: Optional[Executor] = None):
+        self.factory = factory
+        self.executor = executor
+        self.started_at: Optional[float] = None
+        self.first_item_at: Optional[float] = None
+        self.produced = 0
+        self.consumed = 0
+        self.closed = False
+        self._queue: Optional[asyncio.Queue] = None
+
+    def start(self) -> "ThreadedStream":
+        if self._queue is None:
+            loop = asyncio.get_running_loop()
+            self._queue = asyncio.Queue()
+            self.started_at = perf_counter()
+            loop.run_in_executor(self.executor, self._run, loop)
+        return self
+
+    def close(self):
+        self.closed = True
+
+    def _run(self, loop: asyncio.AbstractEventLoop):
+        items = None
+        try:
+            items = iter(self.factory())
+            for item in items:
+                if self.closed:
+                    break
+                if self.first_item_at is None:
+                    self.first_item_at = perf_counter()
+                self.produced += 1
+                loop.call_soon_threadsafe(self._queue.put_nowait, item)
+        except Exception as exc:
+            loop.call_soon_threadsafe(self._queue.put_nowait, _StreamError(exc))
+        finally:
+            if self.closed and hasattr(items, "close"):
+                items.close()
+            loop.call_soon_threadsafe(self._queue.put_nowait, _DONE)
+
+    @property
+    def buffered(self) -> int:
+        return self.produced - self.consumed
+
+    def first_item_ms(self) -> Optional[float]:
+        if self.started_at is None or self.first_item_at is None:
+            return None
+        return (self.first_item_at - self.started_at) * 1000
+
+    async def __aiter__(self) -> AsyncIterator:
+        self.start()
+        while True:
+            item = await self._queue.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _StreamError):
+                raise item.exc
+            self.consumed += 1
+            yield item
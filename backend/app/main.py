@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.routes import create_router
@@ -29,6 +30,8 @@ def create_app() -> FastAPI:
             "llm_model": settings.llm_model,
             "small_llm_model": settings.small_llm_model,
             "es_index": settings.es_index,
+            "index_version": await asyncio.to_thread(container.retrieval.es.index_version),
+            "retrieval_backend": settings.retrieval_backend,
             "rerank_provider": settings.rerank_provider,
             "rerank_model": settings.rerank_model_name,
             "fusion_top_k": settings.fusion_top_k,
@@ -1,13 +1,27 @@
+import argparse
+import hashlib
 import json
+import logging
 import re
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
 import requests
 from docx import Document
 from app.core.config import settings
+from app.core.logging import configure_logging
+from app.repositories.memory_repo import read_full_embeddings, read_snapshot, write_snapshot
+from app.services.embedding_projection import EmbeddingProjection
+from app.services.law_catalog import default_catalog
 from app.services.model_service import ModelService
 
+logger = logging.getLogger(__name__)
+
 ARTICLE_RE = re.compile(r"(第[一二三四五六七八九十百千万零]+条\s*.*?)(?=第[一二三四五六七八九十百千万零]+条\s*|$)", re.S)
+HASH_FIELDS = ("content", "law_name", "chapter", "article_id", "source_type", "authority_level")
 
 
 def read_docx(path: Path) -> str:
@@ -26,16 +40,56 @@ def extract_article_id(text: str) -> str:
 
 
 def chapter_from_filename(name: str) -> str:
-    m = re.search(r"公司法(第[一二三四五六七八九十百千万零]+章)", name)
+    m = re.search(r"(第[一二三四五六七八九十百千万零]+章)", name)
     return m.group(1) if m else ""
 
 
-def mapping() -> Dict:
+def doc_id(filename: str, chunk_index: int) -> str:
+    return f"{Path(filename).stem}-{chunk_index}"
+
+
+def content_hash(chunk: Dict) -> str:
+    payload = json.dumps([chunk.get(name, "") for name in HASH_FIELDS], ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def docx_paths(docs_folder: str = None) -> List[Path]:
+    return [path for path in sorted(Path(docs_folder or settings.docs_folder).glob("*.docx")) if not path.name.startswith("~$")]
+
+
+def parse_file(path: str) -> List[Dict]:
+    path = Path(path)
+    chapter = chapter_from_filename(path.name)
+    law = default_catalog().tag(path.name)
+    chunks = []
+    for idx, chunk in enumerate(split_articles(read_docx(path)), 1):
+        chunks.append({
+            "id": doc_id(path.name, idx),
+            "content": chunk,
+            "law_name": law["law_name"],
+            "chapter": chapter,
+            "article_id": extract_article_id(chunk),
+            "filename": path.name,
+            "chunk_index": idx,
+            "source_type": law["source_type"],
+            "authority_level": law["authority_level"],
+        })
+        chunks[-1]["content_hash"] = content_hash(chunks[-1])
+    return chunks
+
+
+def load_chunks(docs_folder: str = None) -> List[Dict]:
+    return [chunk for path in docx_paths(docs_folder) for chunk in parse_file(str(path))]
+
+
+def mapping(bulk: bool = False) -> Dict:
+    index_settings = {"number_of_replicas": 0, "refresh_interval": "-1"} if bulk else {"number_of_replicas": settings.es_index_replicas}
     return {
+        "settings": {"index": index_settings},
         "mappings": {
             "properties": {
                 "content": {"type": "text"},
-                "embedding": {"type": "dense_vector", "dims": 1152, "index": True, "similarity": "cosine"},
+                "embedding": {"type": "dense_vector", "dims": settings.embedding_projection_dims or settings.embedding_dims, "index": True, "similarity": "cosine"},
                 "law_name": {"type": "keyword"},
                 "chapter": {"type": "keyword"},
                 "article_id": {"type": "keyword"},
@@ -43,45 +97,452 @@ def mapping() -> Dict:
                 "chunk_index": {"type": "integer"},
                 "source_type": {"type": "keyword"},
                 "authority_level": {"type": "keyword"},
+                "content_hash": {"type": "keyword"},
             }
         }
     }
 
 
+def es_url(suffix: str = "") -> str:
+    return f"{settings.es_host.rstrip('/')}{suffix}"
+
+
+def versioned_index_name() -> str:
+    return f"{settings.es_index}_v{time.strftime('%Y%m%d%H%M%S')}"
+
+
+def alias_targets() -> List[str]:
+    resp = requests.get(es_url(f"/_alias/{settings.es_index}"), timeout=5)
+    if resp.status_code == 404:
+        return []
+    resp.raise_for_status()
+    return sorted(resp.json())
+
+
+def create_index(name: str, bulk: bool = False):
+    resp = requests.put(es_url(f"/{name}"), headers={"Content-Type": "application/json"}, data=json.dumps(mapping(bulk)), timeout=10)
+    resp.raise_for_status()
+    logger.info("创建物理索引: index=%s bulk=%s", name, bulk)
+
+
+def finalize_index(name: str):
+    resp = requests.put(
+        es_url(f"/{name}/_settings"),
+        json={"index": {"refresh_interval": None, "number_of_replicas": settings.es_index_replicas}},
+        timeout=10,
+    )
+    resp.raise_for_status()
+    requests.post(es_url(f"/{name}/_refresh"), timeout=60).raise_for_status()
+    requests.post(es_url(f"/{name}/_forcemerge"), params={"max_num_segments": 1}, timeout=600).raise_for_status()
+    logger.info("物理索引已恢复设置并完成段合并: index=%s", name)
+
+
+def swap_alias(name: str) -> List[str]:
+    alias = settings.es_index
+    previous = alias_targets()
+    actions: List[Dict] = [{"remove": {"index": old, "alias": alias}} for old in previous if old != name]
+    if not previous and requests.head(es_url(f"/{alias}"), timeout=5).status_code == 200:
+        actions.append({"remove_index": {"index": alias}})
+        logger.warning("检测到同名旧索引，切换别名时将其删除: index=%s", alias)
+    actions.append({"add": {"index": name, "alias": alias}})
+    resp = requests.post(es_url("/_aliases"), json={"actions": actions}, timeout=30)
+    resp.raise_for_status()
+    logger.info("索引别名已切换: alias=%s index=%s previous=%s", alias, name, ",".join(previous) or "-")
+    return [old for old in previous if old != name]
+
+
+def index_exists(name: str) -> bool:
+    return requests.head(es_url(f"/{name}"), timeout=5).status_code == 200
+
+
+def drop_old_indices(previous: List[str]):
+    for old in sorted(previous)[:max(0, len(previous) - settings.es_index_retain)]:
+        resp = requests.delete(es_url(f"/{old}"), timeout=30)
+        logger.info("删除旧物理索引: index=%s status=%s", old, resp.status_code)
+
+
 def ensure_index():
-    url = f"{settings.es_host.rstrip('/')}/{settings.es_index}"
+    url = es_url(f"/{settings.es_index}")
     if requests.head(url, timeout=5).status_code == 200:
+        resp = requests.put(f"{url}/_mapping", json={"properties": {"content_hash": {"type": "keyword"}}}, timeout=10)
+        resp.raise_for_status()
         return
-    resp = requests.put(url, headers={"Content-Type": "application/json"}, data=json.dumps(mapping()), timeout=10)
+    name = versioned_index_name()
+    create_index(name)
+    swap_alias(name)
+
+
+class IngestCheckpoint:
+    def __init__(self, path: str, index: str):
+        self.path = Path(path)
+        self.index = index
+        self.done: Dict[str, str] = {}
+        self.vectors: Dict[str, List[float]] = {}
+
+    def load(self):
+        if not self.path.exists():
+            return
+        with self.path.open(encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if item.get("index") == self.index and item.get("hash"):
+                    self.done[item["id"]] = item["hash"]
+                    self.vectors[item["hash"]] = item["embedding"]
+        logger.info("读取断点续传记录: path=%s done=%d", self.path, len(self.done))
+
+    def record(self, items: List[Tuple[Dict, List[float]]]):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as fh:
+            for chunk, embedding in items:
+                fh.write(json.dumps({"index": self.index, "id": chunk["id"], "hash": chunk["content_hash"], "embedding": embedding}) + "\n")
+                self.done[chunk["id"]] = chunk["content_hash"]
+                self.vectors[chunk["content_hash"]] = embedding
+
+    def clear(self):
+        self.done = {}
+        self.vectors = {}
+        if self.path.exists():
+            self.path.unlink()
+
+    def begin_rebuild(self):
+        self.clear()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps({"rebuild": self.index}) + "\n", encoding="utf-8")
+
+    @staticmethod
+    def rebuild_target(path: str) -> str:
+        path = Path(path)
+        if not path.exists():
+            return ""
+        with path.open(encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if item.get("rebuild"):
+                    return item["rebuild"]
+        return ""
+
+
+class IngestManifest:
+    def __init__(self, path: str, index: str):
+        self.path = Path(path)
+        self.index = index
+        self.chunks: Dict[str, Dict[str, str]] = {}
+
+    def load(self):
+        if not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except json.JSONDecodeError:
+            logger.warning("入库清单损坏，按全量处理: %s", self.path)
+            return
+        if data.get("index") == self.index:
+            self.chunks = data.get("chunks", {})
+        logger.info("读取入库清单: path=%s chunks=%d", self.path, len(self.chunks))
+
+    def hashes(self) -> Dict[str, str]:
+        return {chunk_id: item.get("hash", "") for chunk_id, item in self.chunks.items()}
+
+    def save(self, chunks: List[Dict]):
+        self.chunks = {chunk["id"]: {"hash": chunk["content_hash"], "filename": chunk["filename"]} for chunk in chunks}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"index": self.index, "chunks": self.chunks}, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(self.path)
+
+
+@dataclass
+class IngestStats:
+    files: int = 0
+    chunks: int = 0
+    resumed: int = 0
+    unchanged: int = 0
+    reused: int = 0
+    embedded: int = 0
+    written: int = 0
+    deleted: int = 0
+    failed: int = 0
+    parse_seconds: float = 0.0
+    embed_seconds: float = 0.0
+    write_seconds: float = 0.0
+    total_seconds: float = 0.0
+
+    def report(self) -> str:
+        rate = self.written / self.total_seconds if self.total_seconds else 0.0
+        return (
+            f"files={self.files} chunks={self.chunks} unchanged={self.unchanged} resumed={self.resumed} "
+            f"reused={self.reused} embedded={self.embedded} written={self.written} deleted={self.deleted} "
+            f"failed={self.failed} parse_s={self.parse_seconds:.2f} "
+            f"embed_s={self.embed_seconds:.2f} bulk_s={self.write_seconds:.2f} total_s={self.total_seconds:.2f} "
+            f"throughput={rate:.1f} chunks/s"
+        )
+
+
+def bulk_index(session: requests.Session, index: str, items: List[Tuple[Dict, List[float]]]) -> Tuple[List[str], List[str]]:
+    lines = []
+    for chunk, embedding in items:
+        source = {key: value for key, value in chunk.items() if key != "id"}
+        source["embedding"] = embedding
+        lines.append(json.dumps({"index": {"_index": index, "_id": chunk["id"]}}))
+        lines.append(json.dumps(source, ensure_ascii=False))
+    return _bulk(session, lines, "index")
+
+
+def bulk_delete(session: requests.Session, index: str, ids: List[str]) -> Tuple[List[str], List[str]]:
+    return _bulk(session, [json.dumps({"delete": {"_index": index, "_id": chunk_id}}) for chunk_id in ids], "delete")
+
+
+def _bulk(session: requests.Session, lines: List[str], action: str) -> Tuple[List[str], List[str]]:
+    resp = session.post(
+        es_url("/_bulk"),
+        headers={"Content-Type": "application/x-ndjson"},
+        data=("\n".join(lines) + "\n").encode("utf-8"),
+        timeout=60,
+    )
     resp.raise_for_status()
+    ok, failed = [], []
+    for item in resp.json().get("items", []):
+        result = item.get(action, {})
+        missing = action == "delete" and result.get("status") == 404
+        (failed if result.get("error") and not missing else ok).append(result.get("_id", ""))
+    return ok, failed
+
+
+def _embed_batch(model: ModelService, batch: List[Dict]) -> Tuple[List[Dict], List[Optional[List[float]]], float]:
+    start = perf_counter()
+    vectors = model.embed_texts([chunk["content"] for chunk in batch], raw=True)
+    return batch, vectors, perf_counter() - start
 
 
-def ingest():
-    ensure_index()
-    model = ModelService()
-    docs_dir = Path(settings.docs_folder)
-    for path in docs_dir.glob("*.docx"):
-        if path.name.startswith("~$"):
+def previous_vectors() -> Dict[str, List[float]]:
+    snapshot = read_snapshot(settings.local_index_dir)
+    embeddings = read_full_embeddings(settings.local_index_dir)
+    if snapshot is None or embeddings is None or not embeddings.size or embeddings.shape[1] != settings.embedding_dims:
+        return {}
+    docs = snapshot[0]
+    return {doc.get("content_hash") or content_hash(doc): embeddings[idx].tolist() for idx, doc in enumerate(docs)}
+
+
+def restore_projection(backup: Optional[bytes]):
+    target = Path(settings.embedding_projection_path)
+    if backup is None:
+        target.unlink(missing_ok=True)
+    else:
+        tmp = target.with_suffix(".tmp")
+        tmp.write_bytes(backup)
+        tmp.replace(target)
+    logger.warning("别名切换失败，已恢复原投影文件: path=%s", target)
+
+
+def bump_content_version(session: requests.Session, index: str):
+    version = time.strftime("%Y%m%d%H%M%S")
+    resp = session.put(es_url(f"/{index}/_mapping"), json={"_meta": {"content_version": version}}, timeout=10)
+    if resp.status_code >= 300:
+        logger.warning("更新索引内容版本失败: status=%s body=%s", resp.status_code, resp.text[:200])
+
+
+def rebuild_index(restart: bool) -> Tuple[str, bool]:
+    target = IngestCheckpoint.rebuild_target(settings.ingest_checkpoint_path)
+    if target and index_exists(target) and target not in alias_targets():
+        if not restart:
+            logger.info("续建未完成的重建索引: index=%s", target)
+            return target, True
+        requests.delete(es_url(f"/{target}"), timeout=30)
+        logger.info("删除未切换别名的重建索引: index=%s", target)
+    index = versioned_index_name()
+    create_index(index, bulk=True)
+    IngestCheckpoint(settings.ingest_checkpoint_path, index).begin_rebuild()
+    return index, False
+
+
+def ingest(workers: int = None, batch_size: int = None, concurrency: int = None, restart: bool = False, rebuild: bool = False) -> IngestStats:
+    started = perf_counter()
+    stats = IngestStats()
+    dims = settings.embedding_projection_dims
+    projection = None if rebuild else EmbeddingProjection.load(settings.embedding_projection_path, dims)
+    if dims and projection is None and not rebuild:
+        raise RuntimeError("已配置 EMBEDDING_PROJECTION_DIMS 但投影文件不可用，请使用 --rebuild 重新拟合并重建索引")
+    paths = docx_paths()
+    stats.files = len(paths)
+    with ProcessPoolExecutor(max_workers=workers or settings.ingest_parse_workers) as pool:
+        chunks = [chunk for file_chunks in pool.map(parse_file, [str(path) for path in paths]) for chunk in file_chunks]
+    stats.chunks = len(chunks)
+    if rebuild and dims and dims > EmbeddingProjection.max_dims(len(chunks), settings.embedding_dims):
+        raise RuntimeError(
+            f"EMBEDDING_PROJECTION_DIMS={dims} 超出可拟合上限 {EmbeddingProjection.max_dims(len(chunks), settings.embedding_dims)}"
+            f"（条文数 {len(chunks)}，原始维度 {settings.embedding_dims}），请调小后重试"
+        )
+    resumed = False
+    if rebuild:
+        index, resumed = rebuild_index(restart)
+        restart = not resumed
+    else:
+        ensure_index()
+        index = settings.es_index
+    stats.parse_seconds = perf_counter() - started
+    manifest = IngestManifest(settings.ingest_manifest_path, settings.es_index)
+    manifest.load()
+    checkpoint = IngestCheckpoint(settings.ingest_checkpoint_path, index)
+    if restart:
+        if not rebuild:
+            checkpoint.clear()
+        stored: Dict[str, str] = {}
+        vectors: Dict[str, List[float]] = {}
+    elif resumed:
+        checkpoint.load()
+        stored = {} if dims else dict(checkpoint.done)
+        vectors = dict(checkpoint.vectors)
+    else:
+        checkpoint.load()
+        stored = {**manifest.hashes(), **checkpoint.done}
+        vectors = {**previous_vectors(), **checkpoint.vectors}
+    current_ids = {chunk["id"] for chunk in chunks}
+    stale = [] if rebuild else [chunk_id for chunk_id in manifest.chunks if chunk_id not in current_ids]
+    reusable, pending = [], []
+    for chunk in chunks:
+        chunk_hash = chunk["content_hash"]
+        if stored.get(chunk["id"]) == chunk_hash and chunk_hash in vectors:
+            if checkpoint.done.get(chunk["id"]) == chunk_hash:
+                stats.resumed += 1
+            else:
+                stats.unchanged += 1
+        elif chunk_hash in vectors:
+            reusable.append((chunk, vectors[chunk_hash]))
+        else:
+            pending.append(chunk)
+    session = requests.Session()
+
+    def write(items: List[Tuple[Dict, List[float]]]):
+        write_start = perf_counter()
+        projected = items if projection is None else [(chunk, row) for (chunk, _), row in zip(items, projection.apply_many([vector for _, vector in items]).tolist())]
+        ok, failed = bulk_index(session, index, projected)
+        stats.write_seconds += perf_counter() - write_start
+        ok_ids = set(ok)
+        checkpoint.record([(chunk, vector) for chunk, vector in items if chunk["id"] in ok_ids])
+        stats.written += len(ok_ids)
+        stats.failed += len(failed)
+        logger.info("入库进度: written=%d pending=%d failed=%d", stats.written, len(reusable) + len(pending), stats.failed)
+
+    deferred: Optional[List[Tuple[Dict, List[float]]]] = [] if rebuild and dims else None
+    batch_size = batch_size or settings.ingest_embed_batch_size
+    if deferred is not None:
+        deferred.extend(reusable)
+        stats.reused += len(reusable)
+        reusable = []
+    for i in range(0, len(reusable), max(batch_size, 100)):
+        items = reusable[i:i + max(batch_size, 100)]
+        write(items)
+        stats.reused += len(items)
+    if pending:
+        model = ModelService()
+        batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+        with ThreadPoolExecutor(max_workers=concurrency or settings.ingest_embed_concurrency) as pool:
+            futures = [pool.submit(_embed_batch, model, batch) for batch in batches]
+            for future in as_completed(futures):
+                batch, vectors_batch, elapsed = future.result()
+                stats.embed_seconds += elapsed
+                items = [(chunk, vector) for chunk, vector in zip(batch, vectors_batch) if vector]
+                stats.embedded += len(items)
+                stats.failed += len(batch) - len(items)
+                if items and deferred is not None:
+                    deferred.extend(items)
+                elif items:
+                    write(items)
+    if deferred:
+        projection = EmbeddingProjection.fit([vector for _, vector in deferred], dims)
+        for i in range(0, len(deferred), max(batch_size, 100)):
+            write(deferred[i:i + max(batch_size, 100)])
+    if stale:
+        ok, failed = bulk_delete(session, index, stale)
+        stats.deleted = len(ok)
+        stats.failed += len(failed)
+        logger.info("删除已失效条文: deleted=%d failed=%d", len(ok), len(failed))
+    vectors.update(checkpoint.vectors)
+    changed = bool(stats.written or stats.deleted or restart or rebuild)
+    if rebuild:
+        if stats.failed:
+            logger.error("全量重建存在失败条文，保留新索引但不切换别名，再次执行 --rebuild 将续建: index=%s failed=%d", index, stats.failed)
+            stats.total_seconds = perf_counter() - started
+            return stats
+        bump_content_version(session, index)
+        finalize_index(index)
+        backup = Path(settings.embedding_projection_path).read_bytes() if projection is not None and Path(settings.embedding_projection_path).exists() else None
+        if projection is not None:
+            projection.save(settings.embedding_projection_path)
+        try:
+            previous = swap_alias(index)
+        except Exception:
+            if projection is not None:
+                restore_projection(backup)
+            raise
+        drop_old_indices(previous)
+    elif changed:
+        session.post(es_url(f"/{index}/_refresh"), timeout=30)
+        bump_content_version(session, index)
+    stored.update(checkpoint.done)
+    indexed = [chunk for chunk in chunks if stored.get(chunk["id"]) == chunk["content_hash"] and chunk["content_hash"] in vectors]
+    if changed or read_snapshot(settings.local_index_dir) is None:
+        full = [vectors[chunk["content_hash"]] for chunk in indexed]
+        if projection is None:
+            write_snapshot(settings.local_index_dir, indexed, full)
+        else:
+            write_snapshot(settings.local_index_dir, indexed, projection.apply_many(full) if full else [], full_embeddings=full)
+    manifest.save(indexed)
+    if stats.failed == 0:
+        checkpoint.clear()
+    stats.total_seconds = perf_counter() - started
+    return stats
+
+
+def file_state(docs_folder: str = None) -> Dict[str, float]:
+    return {str(path): path.stat().st_mtime for path in docx_paths(docs_folder)}
+
+
+def watch(interval: float = None, **kwargs):
+    interval = interval or settings.ingest_watch_interval
+    logger.info("监听知识库目录变更: folder=%s interval=%.1fs", settings.docs_folder, interval)
+    state = file_state()
+    while True:
+        time.sleep(interval)
+        current = file_state()
+        if current == state:
             continue
-        text = read_docx(path)
-        chapter = chapter_from_filename(path.name)
-        for idx, chunk in enumerate(split_articles(text), 1):
-            emb = model.embed_text(chunk)
-            if not emb:
-                continue
-            body = {
-                "content": chunk,
-                "embedding": emb,
-                "law_name": "中华人民共和国公司法",
-                "chapter": chapter,
-                "article_id": extract_article_id(chunk),
-                "filename": path.name,
-                "chunk_index": idx,
-                "source_type": "law_text",
-                "authority_level": "unknown",
-            }
-            requests.post(f"{settings.es_host.rstrip('/')}/{settings.es_index}/_doc", headers={"Content-Type": "application/json"}, data=json.dumps(body, ensure_ascii=False), timeout=10)
+        time.sleep(interval)
+        settled = file_state()
+        if settled != current:
+            continue
+        changed = sorted(set(settled.items()) ^ set(state.items()))
+        logger.info("检测到知识库文件变更: %s", ", ".join(sorted({Path(name).name for name, _ in changed})))
+        state = settled
+        try:
+            stats = ingest(**kwargs)
+            logger.info("增量入库完成: %s", stats.report())
+        except Exception as exc:
+            logger.exception("增量入库失败: %s", exc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="公司法知识库入库（内容哈希增量、并行解析、批量向量化、_bulk 写入、断点续传）")
+    parser.add_argument("--workers", type=int, default=None, help="解析进程数")
+    parser.add_argument("--batch-size", type=int, default=None, help="每批向量化的条文数")
+    parser.add_argument("--concurrency", type=int, default=None, help="并发向量化批次数")
+    parser.add_argument("--restart", action="store_true", help="忽略断点记录与入库清单，全量重建")
+    parser.add_argument("--rebuild", action="store_true", help="写入新的版本化物理索引，完成后原子切换别名（零停机重建）")
+    parser.add_argument("--watch", action="store_true", help="首次入库后持续监听 .docx 变更并增量入库")
+    args = parser.parse_args()
+    options = {"workers": args.workers, "batch_size": args.batch_size, "concurrency": args.concurrency}
+    stats = ingest(restart=args.restart, rebuild=args.rebuild, **options)
+    print(stats.report())
+    if args.watch:
+        watch(**options)
 
 
 if __name__ == "__main__":
-    ingest()
+    configure_logging()
+    main()
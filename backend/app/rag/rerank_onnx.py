@@ -0,0 +1,65 @@
+import argparse
+import logging
+from importlib import import_module
+from pathlib import Path
+from app.core.config import settings
+from app.core.logging import configure_logging
+from app.services.reranker import ONNX_MODEL_FILE
+
+logger = logging.getLogger(__name__)
+
+FP32_MODEL_FILE = "model.onnx"
+
+
+def export_onnx(model_path: str, output_dir: str, opset: int = 14) -> Path:
+    torch = import_module("torch")
+    transformers = import_module("transformers")
+    output = Path(output_dir)
+    output.mkdir(parents=True, exist_ok=True)
+    tokenizer = transformers.AutoTokenizer.from_pretrained(model_path)
+    model = transformers.AutoModelForSequenceClassification.from_pretrained(model_path)
+    model.eval()
+    sample = tokenizer([("股东查账权", "第五十七条 股东有权查阅、复制公司章程。")], padding=True, truncation=True, return_tensors="pt", max_length=settings.rerank_max_length)
+    input_names = [name for name in ["input_ids", "attention_mask", "token_type_ids"] if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["logits"] = {0: "batch"}
+    target = output / FP32_MODEL_FILE
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            str(target),
+            input_names=input_names,
+            output_names=["logits"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            do_constant_folding=True,
+        )
+    tokenizer.save_pretrained(str(output))
+    model.config.save_pretrained(str(output))
+    logger.info("Rerank ONNX 导出完成: %s", target)
+    return target
+
+
+def quantize_int8(output_dir: str) -> Path:
+    quantization = import_module("onnxruntime.quantization")
+    source = Path(output_dir) / FP32_MODEL_FILE
+    target = Path(output_dir) / ONNX_MODEL_FILE
+    quantization.quantize_dynamic(str(source), str(target), weight_type=quantization.QuantType.QInt8)
+    logger.info("Rerank ONNX int8 量化完成: %s", target)
+    return target
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出并量化本地 Rerank 模型为 ONNX int8")
+    parser.add_argument("--model-path", default=settings.rerank_model_path)
+    parser.add_argument("--output-dir", default=settings.rerank_onnx_path)
+    parser.add_argument("--opset", type=int, default=14)
+    args = parser.parse_args()
+    export_onnx(args.model_path, args.output_dir, opset=args.opset)
+    quantize_int8(args.output_dir)
+
+
+if __name__ == "__main__":
+    configure_logging()
+    main()
@@ -0,0 +1,44 @@
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentStore:
+    def __init__(self, repo):
+        self.repo = repo
+        self.version: Optional[str] = None
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def load(self, version: str):
+        docs = {doc["id"]: doc for doc in self.repo.iter_documents() if doc.get("id")}
+        with self._lock:
+            self.docs = docs
+            self.version = version
+        logger.info("本地文档库加载完成: version=%s docs=%d", version, len(docs))
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        return self.docs.get(doc_id)
+
+    def remember(self, docs: List[Dict[str, Any]], fields: List[str]):
+        missing = {doc["id"]: {"id": doc["id"], **{name: doc.get(name, "") for name in fields}} for doc in docs if doc.get("id") and doc["id"] not in self.docs}
+        if missing:
+            with self._lock:
+                self.docs.update(missing)
+
+    def hydrate(self, hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        missing = [hit["id"] for hit in hits if hit.get("id") and hit["id"] not in self.docs]
+        if missing:
+            fetched = self.repo.get_documents(missing)
+            with self._lock:
+                self.docs.update(fetched)
+            logger.info("本地文档库补齐: requested=%d fetched=%d", len(missing), len(fetched))
+        hydrated = []
+        for hit in hits:
+            doc = self.docs.get(hit.get("id"))
+            if doc is None:
+                continue
+            hydrated.append({**doc, "id": hit["id"], "score": hit.get("score", 0.0), "channel": hit.get("channel", "")})
+        return hydrated
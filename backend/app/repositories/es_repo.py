@@ -1,16 +1,33 @@
 import json
 import logging
-from typing import Any, Dict, List, Optional
+from time import monotonic
+from typing import Any, Dict, Iterator, List, Optional
 import requests
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+DOC_FIELDS = ["content", "filename", "law_name", "chapter", "article_id", "chunk_index", "source_type", "authority_level"]
+FILTER_FIELDS = ("law_name", "source_type", "authority_level")
+Filters = Optional[Dict[str, List[str]]]
+
+
+def filter_clauses(filters: Filters) -> List[Dict[str, Any]]:
+    return [{"terms": {name: list(filters[name])}} for name in FILTER_FIELDS if filters and filters.get(name)]
+
+
+def _filtered(query: Dict[str, Any], filters: Filters) -> Dict[str, Any]:
+    clauses = filter_clauses(filters)
+    return {"bool": {"must": [query], "filter": clauses}} if clauses else query
+
 
 class ElasticsearchRepository:
     def __init__(self):
         self.host = settings.es_host.rstrip("/")
         self.index = settings.es_index
+        self._version = ""
+        self._version_checked_at = 0.0
+        self._hybrid_unsupported_until = 0.0
 
     def _url(self, suffix: str) -> str:
         return f"{self.host}/{self.index}{suffix}"
@@ -22,58 +39,141 @@ class ElasticsearchRepository:
         except Exception:
             return False
 
-    def search_knn(self, embedding: Optional[List[float]], top_k: int = 10) -> List[Dict[str, Any]]:
+    def index_version(self) -> str:
+        if self._version and monotonic() - self._version_checked_at < settings.index_version_ttl_seconds:
+            return self._version
+        try:
+            resp = requests.get(self._url(""), params={"filter_path": "*.settings.index.uuid,*.mappings._meta"}, timeout=3)
+            if resp.status_code == 200:
+                versions = []
+                for name, item in sorted(resp.json().items()):
+                    content_version = item.get("mappings", {}).get("_meta", {}).get("content_version", "")
+                    versions.append(f"{name}:{item['settings']['index']['uuid']}:{content_version}")
+                self._version = ",".join(versions)
+        except Exception as exc:
+            logger.warning("ES 索引版本读取失败: %s", exc)
+        self._version_checked_at = monotonic()
+        return self._version
+
+    def _knn(self, embedding: List[float], top_k: int, filters: Filters) -> Dict[str, Any]:
+        knn = {"field": "embedding", "query_vector": embedding, "k": top_k, "num_candidates": max(50, top_k * 5)}
+        clauses = filter_clauses(filters)
+        if clauses:
+            knn["filter"] = clauses
+        return knn
+
+    def search_knn(self, embedding: Optional[List[float]], top_k: int = 10, ids_only: bool = False, filters: Filters = None) -> List[Dict[str, Any]]:
         if not embedding:
             return []
         body = {
-            "knn": {"field": "embedding", "query_vector": embedding, "k": top_k, "num_candidates": max(50, top_k * 5)},
-            "fields": ["content", "filename", "law_name", "chapter", "article_id", "chunk_index"],
-            "_source": False,
+            "knn": self._knn(embedding, top_k, filters),
+            "size": top_k,
         }
-        return self._search(body, "dense")
+        return self._search(body, "dense", ids_only)
 
-    def search_bm25(self, query: str, top_k: int = 10) -> List[Dict[str, Any]]:
+    def search_bm25(self, query: str, top_k: int = 10, ids_only: bool = False, filters: Filters = None) -> List[Dict[str, Any]]:
         body = {
-            "query": {"match": {"content": {"query": query}}},
-            "fields": ["content", "filename", "law_name", "chapter", "article_id", "chunk_index"],
-            "_source": False,
+            "query": _filtered({"match": {"content": {"query": query}}}, filters),
             "size": top_k,
         }
-        return self._search(body, "bm25")
+        return self._search(body, "bm25", ids_only)
 
-    def search_rule_article(self, article_id: str, top_k: int = 10) -> List[Dict[str, Any]]:
+    def search_rule_article(self, article_id: str, top_k: int = 10, ids_only: bool = False, filters: Filters = None) -> List[Dict[str, Any]]:
         should = [
             {"term": {"article_id": article_id}},
             {"match_phrase": {"content": article_id}},
         ]
         body = {
-            "query": {"bool": {"should": should, "minimum_should_match": 1}},
-            "fields": ["content", "filename", "law_name", "chapter", "article_id", "chunk_index"],
-            "_source": False,
+            "query": _filtered({"bool": {"should": should, "minimum_should_match": 1}}, filters),
+            "size": top_k,
+        }
+        return self._search(body, "rule", ids_only)
+
+    def search_rule_chapter(self, chapter: str, top_k: int = 10, ids_only: bool = False, filters: Filters = None) -> List[Dict[str, Any]]:
+        body = {
+            "query": _filtered({"term": {"chapter": chapter}}, filters),
             "size": top_k,
         }
-        return self._search(body, "rule")
+        return self._search(body, "rule", ids_only)
 
-    def search_rule_chapter(self, chapter: str, top_k: int = 10) -> List[Dict[str, Any]]:
+    def search_hybrid(self, embedding: Optional[List[float]], query: str, rule_ids: List[str] = None, top_k: int = 10, ids_only: bool = False, filters: Filters = None) -> Optional[List[Dict[str, Any]]]:
+        if self._hybrid_unsupported_until > monotonic():
+            return None
+        sub_searches = [{"query": _filtered({"match": {"content": {"query": query}}}, filters)}]
+        if rule_ids:
+            sub_searches.append({"query": _filtered({"ids": {"values": rule_ids}}, filters)})
         body = {
-            "query": {"bool": {"should": [{"term": {"chapter": chapter}}, {"match_phrase": {"filename": f"公司法{chapter}.docx"}}], "minimum_should_match": 1}},
-            "fields": ["content", "filename", "law_name", "chapter", "article_id", "chunk_index"],
-            "_source": False,
+            "sub_searches": sub_searches,
+            "rank": {"rrf": {"window_size": max(top_k, 50), "rank_constant": 60}},
             "size": top_k,
         }
-        return self._search(body, "rule")
+        if embedding:
+            body["knn"] = self._knn(embedding, top_k, filters)
+        elif len(sub_searches) == 1:
+            body = {"query": sub_searches[0]["query"], "size": top_k}
+        results = self._search(body, "hybrid", ids_only, quiet=True)
+        if results is None:
+            self._hybrid_unsupported_until = monotonic() + 300
+            logger.warning("ES 服务端 RRF 不可用，5 分钟内回退 Python 融合")
+        return results
 
-    def _search(self, body: Dict[str, Any], channel: str) -> List[Dict[str, Any]]:
+    def get_documents(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        if not ids:
+            return {}
+        try:
+            resp = requests.post(self._url("/_mget"), params={"_source_includes": ",".join(DOC_FIELDS)}, headers={"Content-Type": "application/json"}, data=json.dumps({"ids": ids}), timeout=10)
+            if resp.status_code != 200:
+                logger.warning("ES 文档批量读取失败: %s %s", resp.status_code, resp.text[:200])
+                return {}
+            return {item["_id"]: {"id": item["_id"], **item.get("_source", {})} for item in resp.json().get("docs", []) if item.get("found")}
+        except Exception as exc:
+            logger.warning("ES 文档批量读取异常: %s", exc)
+            return {}
+
+    def iter_documents(self, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        body = {"size": batch_size, "_source": DOC_FIELDS, "sort": ["_doc"]}
+        resp = requests.post(self._url("/_search"), params={"scroll": "2m"}, headers={"Content-Type": "application/json"}, data=json.dumps(body), timeout=30)
+        resp.raise_for_status()
+        data = resp.json()
+        scroll_id = data.get("_scroll_id")
+        try:
+            while True:
+                hits = data.get("hits", {}).get("hits", [])
+                if not hits:
+                    break
+                for hit in hits:
+                    yield {"id": hit.get("_id", ""), **hit.get("_source", {})}
+                resp = requests.post(f"{self.host}/_search/scroll", headers={"Content-Type": "application/json"}, data=json.dumps({"scroll": "2m", "scroll_id": scroll_id}), timeout=30)
+                resp.raise_for_status()
+                data = resp.json()
+                scroll_id = data.get("_scroll_id", scroll_id)
+        finally:
+            if scroll_id:
+                requests.delete(f"{self.host}/_search/scroll", headers={"Content-Type": "application/json"}, data=json.dumps({"scroll_id": scroll_id}), timeout=5)
+
+    def _search(self, body: Dict[str, Any], channel: str, ids_only: bool = False, quiet: bool = False) -> Optional[List[Dict[str, Any]]]:
+        body["_source"] = False
+        if not ids_only:
+            body["fields"] = DOC_FIELDS
         try:
             resp = requests.post(self._url("/_search"), headers={"Content-Type": "application/json"}, data=json.dumps(body), timeout=15)
             if resp.status_code != 200:
                 logger.warning("ES %s 检索失败: %s %s", channel, resp.status_code, resp.text[:200])
-                return []
+                return None if quiet else []
             hits = resp.json().get("hits", {}).get("hits", [])
+            if ids_only:
+                return [{"id": hit.get("_id", ""), "score": self._hit_score(hit), "channel": channel} for hit in hits]
             return [self._hit_to_doc(hit, channel) for hit in hits]
         except Exception as exc:
             logger.warning("ES %s 检索异常: %s", channel, exc)
-            return []
+            return None if quiet else []
+
+    def _hit_score(self, hit: Dict[str, Any]) -> float:
+        if hit.get("_score") is not None:
+            return float(hit["_score"])
+        if hit.get("_rank"):
+            return 1.0 / (60 + int(hit["_rank"]))
+        return 0.0
 
     def _hit_to_doc(self, hit: Dict[str, Any], channel: str) -> Dict[str, Any]:
         fields = hit.get("fields", {})
@@ -88,6 +188,8 @@ class ElasticsearchRepository:
             "chapter": first("chapter"),
             "article_id": first("article_id"),
             "chunk_index": first("chunk_index", 0),
-            "score": float(hit.get("_score") or 0.0),
+            "source_type": first("source_type", "law_text"),
+            "authority_level": first("authority_level", "unknown"),
+            "score": self._hit_score(hit),
             "channel": channel,
         }
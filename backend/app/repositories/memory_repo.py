@@ -0,0 +1,260 @@
+import json
+import logging
+import math
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime
+from pathlib import Path
+from time import monotonic
+from typing import Any, Dict, Iterator, List, Optional
+import numpy as np
+from app.core.config import settings
+from app.repositories.es_repo import DOC_FIELDS, FILTER_FIELDS, Filters
+
+logger = logging.getLogger(__name__)
+
+DOCUMENTS_FILE = "documents.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+FULL_EMBEDDINGS_FILE = "embeddings_full.npy"
+META_FILE = "meta.json"
+
+
+def char_ngrams(text: str, n: int = 2) -> List[str]:
+    text = "".join((text or "").split())
+    if len(text) < n:
+        return [text] if text else []
+    return [text[i:i + n] for i in range(len(text) - n + 1)]
+
+
+def _matrix(docs: List[Dict[str, Any]], embeddings: List[List[float]]) -> np.ndarray:
+    matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(docs), -1) if len(embeddings) else np.zeros((len(docs), 0), dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True) if matrix.size else None
+    return matrix / np.where(norms == 0, 1, norms) if norms is not None else matrix
+
+
+def _replace(target: Path, write):
+    tmp = target.with_name(f".{target.name}.tmp")
+    with tmp.open("wb") as fh:
+        write(fh)
+    tmp.replace(target)
+
+
+def write_snapshot(path: str, docs: List[Dict[str, Any]], embeddings: List[List[float]], full_embeddings: List[List[float]] = None):
+    target = Path(path)
+    target.mkdir(parents=True, exist_ok=True)
+    matrix = _matrix(docs, embeddings)
+    _replace(target / EMBEDDINGS_FILE, lambda fh: np.save(fh, matrix))
+    if full_embeddings is not None:
+        full = _matrix(docs, full_embeddings)
+        _replace(target / FULL_EMBEDDINGS_FILE, lambda fh: np.save(fh, full))
+    elif (target / FULL_EMBEDDINGS_FILE).exists():
+        (target / FULL_EMBEDDINGS_FILE).unlink()
+    _replace(target / DOCUMENTS_FILE, lambda fh: fh.write(json.dumps(docs, ensure_ascii=False).encode("utf-8")))
+    meta = {"version": datetime.now().strftime("%Y%m%d%H%M%S%f"), "count": len(docs), "dims": int(matrix.shape[1])}
+    _replace(target / META_FILE, lambda fh: fh.write(json.dumps(meta).encode("utf-8")))
+    logger.info("本地检索快照已写入: path=%s docs=%d dims=%d", target, len(docs), meta["dims"])
+
+
+def read_snapshot(path: str):
+    source = Path(path)
+    if not (source / DOCUMENTS_FILE).exists():
+        return None
+    docs = json.loads((source / DOCUMENTS_FILE).read_text(encoding="utf-8"))
+    meta = json.loads((source / META_FILE).read_text(encoding="utf-8")) if (source / META_FILE).exists() else {}
+    embeddings = np.load(source / EMBEDDINGS_FILE, mmap_mode="r") if (source / EMBEDDINGS_FILE).exists() else None
+    return docs, embeddings, meta
+
+
+def read_full_embeddings(path: str) -> Optional[np.ndarray]:
+    source = Path(path)
+    for name in (FULL_EMBEDDINGS_FILE, EMBEDDINGS_FILE):
+        if (source / name).exists():
+            return np.load(source / name, mmap_mode="r")
+    return None
+
+
+class MemoryIndexState:
+    def __init__(self, docs: List[Dict[str, Any]], embeddings: Optional[np.ndarray], version: str, k1: float, b: float):
+        self.docs = docs
+        self.embeddings = embeddings if embeddings is not None and embeddings.size else None
+        self.version = version
+        postings: Dict[str, List] = defaultdict(list)
+        doc_lengths = np.zeros(len(docs), dtype=np.float32)
+        self.article_map: Dict[str, List[int]] = defaultdict(list)
+        self.chapter_map: Dict[str, List[int]] = defaultdict(list)
+        for idx, doc in enumerate(docs):
+            grams = Counter(char_ngrams(doc.get("content", "")))
+            doc_lengths[idx] = sum(grams.values())
+            for gram, tf in grams.items():
+                postings[gram].append((idx, tf))
+            if doc.get("article_id"):
+                self.article_map[doc["article_id"]].append(idx)
+            if doc.get("chapter"):
+                self.chapter_map[doc["chapter"]].append(idx)
+        self.doc_lengths = doc_lengths
+        self.fields = {name: np.array([doc.get(name) or "" for doc in docs], dtype=object) for name in FILTER_FIELDS}
+        self.masks: Dict[tuple, np.ndarray] = {}
+        self.avg_length = float(doc_lengths.mean()) if len(docs) else 0.0
+        length_norm = k1 * (1 - b + b * doc_lengths / (self.avg_length or 1))
+        self.postings: Dict[str, tuple] = {}
+        for gram, items in postings.items():
+            ids = np.array([idx for idx, _ in items], dtype=np.int64)
+            tfs = np.array([tf for _, tf in items], dtype=np.float32)
+            idf = math.log(1 + (len(docs) - len(items) + 0.5) / (len(items) + 0.5))
+            self.postings[gram] = (ids, idf * tfs * (k1 + 1) / (tfs + length_norm[ids]))
+
+
+class InMemoryRetrievalRepository:
+    def __init__(self, docs: List[Dict[str, Any]], embeddings: Optional[np.ndarray] = None, version: str = "memory", k1: float = 1.2, b: float = 0.75, source: Path = None):
+        self.k1 = k1
+        self.b = b
+        self.source = source
+        self._meta_mtime = self._snapshot_mtime()
+        self._checked_at = monotonic()
+        self._reload_lock = threading.Lock()
+        self._state = MemoryIndexState(docs, embeddings, version, k1, b)
+
+    @property
+    def docs(self) -> List[Dict[str, Any]]:
+        return self._state.docs
+
+    @property
+    def embeddings(self) -> Optional[np.ndarray]:
+        return self._state.embeddings
+
+    @property
+    def version(self) -> str:
+        return self._state.version
+
+    @classmethod
+    def load(cls, path: str = None) -> "InMemoryRetrievalRepository":
+        source = Path(path or settings.local_index_dir)
+        snapshot = read_snapshot(str(source))
+        if snapshot is None:
+            logger.warning("本地检索快照不存在，直接解析 DOCS_FOLDER（无向量通道）: %s", source)
+            return cls.from_docs_folder()
+        docs, embeddings, meta = snapshot
+        logger.info("本地检索快照加载完成: path=%s docs=%d version=%s", source, len(docs), meta.get("version", ""))
+        return cls(docs, embeddings, version=f"memory:{meta.get('version', '')}", source=source)
+
+    @classmethod
+    def from_docs_folder(cls, docs_folder: str = None) -> "InMemoryRetrievalRepository":
+        from app.rag.knowledge_ingest import load_chunks
+
+        docs = load_chunks(docs_folder)
+        return cls(docs, None, version=f"memory:docs:{len(docs)}")
+
+    def health(self) -> bool:
+        return bool(self.docs)
+
+    def index_version(self) -> str:
+        if self.source is None or monotonic() - self._checked_at < settings.index_version_ttl_seconds:
+            return self._state.version
+        if not self._reload_lock.acquire(blocking=False):
+            return self._state.version
+        try:
+            self._checked_at = monotonic()
+            mtime = self._snapshot_mtime()
+            if mtime != self._meta_mtime:
+                snapshot = read_snapshot(str(self.source))
+                if snapshot is not None and self._consistent(*snapshot):
+                    docs, embeddings, meta = snapshot
+                    self._state = MemoryIndexState(docs, embeddings, f"memory:{meta.get('version', '')}", self.k1, self.b)
+                    self._meta_mtime = mtime
+                    logger.info("本地检索快照已重新加载: docs=%d version=%s", len(docs), self._state.version)
+        finally:
+            self._reload_lock.release()
+        return self._state.version
+
+    def _consistent(self, docs: List[Dict[str, Any]], embeddings: Optional[np.ndarray], meta: Dict[str, Any]) -> bool:
+        rows = len(docs) if embeddings is None or not embeddings.size else embeddings.shape[0]
+        if meta.get("count", len(docs)) == len(docs) == rows:
+            return True
+        logger.warning("本地检索快照写入未完成，暂不重新加载: docs=%d embeddings=%d meta=%s", len(docs), rows, meta.get("count"))
+        return False
+
+    def _snapshot_mtime(self) -> float:
+        meta = self.source / META_FILE if self.source is not None else None
+        return meta.stat().st_mtime if meta is not None and meta.exists() else 0.0
+
+    def iter_documents(self) -> Iterator[Dict[str, Any]]:
+        for doc in self._state.docs:
+            yield {"id": doc.get("id", ""), **{name: doc.get(name, "") for name in DOC_FIELDS}}
+
+    def get_documents(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        wanted = set(ids)
+        return {doc["id"]: doc for doc in self.iter_documents() if doc["id"] in wanted}
+
+    def _mask(self, state: MemoryIndexState, filters: Filters) -> Optional[np.ndarray]:
+        key = tuple((name, tuple(sorted(filters[name]))) for name in FILTER_FIELDS if filters and filters.get(name))
+        if not key:
+            return None
+        mask = state.masks.get(key)
+        if mask is None:
+            mask = np.ones(len(state.docs), dtype=bool)
+            for name, values in key:
+                mask &= np.isin(state.fields[name], list(values))
+            if len(state.masks) >= 256:
+                state.masks.clear()
+            state.masks[key] = mask
+        return mask
+
+    def search_knn(self, embedding: Optional[List[float]], top_k: int = 10, ids_only: bool = False, filters: Filters = None) -> List[Dict[str, Any]]:
+        state = self._state
+        if not embedding or state.embeddings is None:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        if query.shape[0] != state.embeddings.shape[1]:
+            logger.warning("本地向量维度不一致: query=%d index=%d", query.shape[0], state.embeddings.shape[1])
+            return []
+        norm = np.linalg.norm(query)
+        if not norm:
+            return []
+        mask = self._mask(state, filters)
+        if mask is None:
+            return self._top(state, state.embeddings @ (query / norm), top_k, "dense", positive_only=False)
+        candidates = np.flatnonzero(mask)
+        return self._top(state, state.embeddings[candidates] @ (query / norm), top_k, "dense", positive_only=False, ids=candidates)
+
+    def search_hybrid(self, embedding: Optional[List[float]], query: str, rule_ids: List[str] = None, top_k: int = 10, ids_only: bool = False, filters: Filters = None) -> Optional[List[Dict[str, Any]]]:
+        return None
+
+    def search_bm25(self, query: str, top_k: int = 10, ids_only: bool = False, filters: Filters = None) -> List[Dict[str, Any]]:
+        state = self._state
+        scores = np.zeros(len(state.docs), dtype=np.float32)
+        for gram in set(char_ngrams(query)):
+            posting = state.postings.get(gram)
+            if posting is not None:
+                scores[posting[0]] += posting[1]
+        mask = self._mask(state, filters)
+        if mask is not None:
+            scores[~mask] = 0
+        return self._top(state, scores, top_k, "bm25")
+
+    def search_rule_article(self, article_id: str, top_k: int = 10, ids_only: bool = False, filters: Filters = None) -> List[Dict[str, Any]]:
+        state = self._state
+        return self._rule(state, state.article_map.get(article_id, []), top_k, filters)
+
+    def search_rule_chapter(self, chapter: str, top_k: int = 10, ids_only: bool = False, filters: Filters = None) -> List[Dict[str, Any]]:
+        state = self._state
+        return self._rule(state, state.chapter_map.get(chapter, []), top_k, filters)
+
+    def _rule(self, state: MemoryIndexState, indices: List[int], top_k: int, filters: Filters) -> List[Dict[str, Any]]:
+        mask = self._mask(state, filters)
+        return [self._doc(state, idx, 1.0, "rule") for idx in indices if mask is None or mask[idx]][:top_k]
+
+    def _top(self, state: MemoryIndexState, scores: np.ndarray, top_k: int, channel: str, positive_only: bool = True, ids: np.ndarray = None) -> List[Dict[str, Any]]:
+        if not len(scores) or top_k <= 0:
+            return []
+        top_k = min(top_k, len(scores))
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        ordered = candidates[np.argsort(-scores[candidates])]
+        return [self._doc(state, int(idx if ids is None else ids[idx]), float(scores[idx]), channel) for idx in ordered if not positive_only or scores[idx] > 0]
+
+    def _doc(self, state: MemoryIndexState, idx: int, score: float, channel: str) -> Dict[str, Any]:
+        doc = state.docs[idx]
+        item = {name: doc.get(name, "") for name in DOC_FIELDS}
+        item["law_name"] = item["law_name"] or "中华人民共和国公司法"
+        item["chunk_index"] = item["chunk_index"] or 0
+        item.update({"id": doc.get("id", ""), "score": score, "channel": channel})
+        return item
@@ -4,6 +4,7 @@ from pydantic import BaseModel, Field
 
 class Citation(BaseModel):
     citation_id: str
+    doc_id: str = ""
     law_name: str = "中华人民共和国公司法"
     article_id: str = ""
     content: str
@@ -12,11 +13,20 @@ class Citation(BaseModel):
     intent_id: Optional[str] = None
 
 
+class RetrievalFilters(BaseModel):
+    law_name: List[str] = Field(default_factory=list)
+    source_type: List[str] = Field(default_factory=list)
+    authority_level: List[str] = Field(default_factory=list)
+
+
 class ChatRequest(BaseModel):
     conversation_id: str
     query: str
     mode: str = Field(default="normal", pattern="^(normal|plus)$")
     stream: bool = True
+    filters: Optional[RetrievalFilters] = None
+    stream_window_ms: Optional[int] = Field(default=None, ge=0, le=1000)
+    stream_max_bytes: Optional[int] = Field(default=None, ge=16, le=65536)
 
 
 class Message(BaseModel):
@@ -100,6 +110,7 @@ class IntentAnalysis(BaseModel):
     need_clarification: bool = False
     clarification_question: str = ""
     missing_slots: List[str] = Field(default_factory=list)
+    law_names: List[str] = Field(default_factory=list)
     intents: List[IntentItem] = Field(default_factory=list)
     slots: Dict[str, Any] = Field(default_factory=dict)
     case_slot_state: CaseSlotState = Field(default_factory=CaseSlotState)
@@ -0,0 +1,12 @@
+from dataclasses import dataclass
+from typing import Any
+
+
+@dataclass(frozen=True)
+class ChatEvent:
+    name: str
+    data: Any
+
+    @property
+    def content(self) -> str:
+        return self.data.get("content", "") if self.name == "token" else ""
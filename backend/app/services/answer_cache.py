@@ -0,0 +1,93 @@
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from app.core.cache import TTLCache, query_hash
+from app.core.metrics import metrics
+from app.schemas.chat import Citation
+
+logger = logging.getLogger(__name__)
+
+
+def case_slots_empty(state: Optional[Dict[str, Any]]) -> bool:
+    for name, slots in (state or {}).items():
+        if name == "active_scenario":
+            if slots not in (None, "", "general"):
+                return False
+            continue
+        for value in (slots or {}).values() if isinstance(slots, dict) else [slots]:
+            if value not in (None, "", [], {}):
+                return False
+    return True
+
+
+class AnswerCache:
+    def __init__(self, max_size: int = 1000, ttl_seconds: float = 86400, similarity: float = 0.95, top_ids: int = 3, group_size: int = 16):
+        self.exact = TTLCache(max_size, ttl_seconds)
+        self.semantic = TTLCache(max_size, ttl_seconds)
+        self.similarity = similarity
+        self.top_ids = top_ids
+        self.group_size = group_size
+        self._lock = threading.Lock()
+
+    def lookup(self, query: str, vector: Optional[Sequence[float]], citations: List[Citation], version: str, model: str) -> Tuple[Optional[str], str]:
+        self.exact.ensure_version(version)
+        self.semantic.ensure_version(version)
+        answer = self.exact.get(self._exact_key(query, citations, model))
+        if answer is not None:
+            metrics.incr("answer_cache_hits", tier="exact")
+            return answer, "exact"
+        group = self.semantic.get(self._semantic_key(citations, model)) if vector else None
+        if group:
+            query_vector = self._normalize(vector)
+            vectors, answers = group
+            if query_vector is not None and query_vector.shape[0] == vectors.shape[1]:
+                scores = vectors @ query_vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity:
+                    metrics.incr("answer_cache_hits", tier="semantic")
+                    logger.info("语义答案缓存命中: similarity=%.4f", float(scores[best]))
+                    return answers[best], "semantic"
+        metrics.incr("answer_cache_misses")
+        return None, ""
+
+    def store(self, query: str, vector: Optional[Sequence[float]], citations: List[Citation], answer: str, version: str, model: str):
+        if not citations or not answer or self.exact.version != version:
+            return
+        self.exact.set(self._exact_key(query, citations, model), answer)
+        query_vector = self._normalize(vector)
+        if query_vector is None:
+            return
+        key = self._semantic_key(citations, model)
+        with self._lock:
+            vectors, answers = self.semantic.get(key) or (np.zeros((0, query_vector.shape[0]), dtype=np.float32), [])
+            if vectors.shape[1] != query_vector.shape[0]:
+                vectors, answers = np.zeros((0, query_vector.shape[0]), dtype=np.float32), []
+            vectors = np.vstack([vectors, query_vector])[-self.group_size:]
+            answers = (answers + [answer])[-self.group_size:]
+            self.semantic.set(key, (vectors, answers))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "exact": self.exact.stats(),
+            "semantic": self.semantic.stats(),
+            "hits_exact": metrics.get("answer_cache_hits", tier="exact"),
+            "hits_semantic": metrics.get("answer_cache_hits", tier="semantic"),
+            "misses": metrics.get("answer_cache_misses"),
+        }
+
+    def _exact_key(self, query: str, citations: List[Citation], model: str) -> tuple:
+        return query_hash(query), model, tuple(self._ids(citations))
+
+    def _semantic_key(self, citations: List[Citation], model: str) -> tuple:
+        return model, tuple(self._ids(citations)[:self.top_ids])
+
+    def _ids(self, citations: List[Citation]) -> List[str]:
+        return [c.doc_id or f"{c.filename}:{c.article_id}" for c in citations]
+
+    def _normalize(self, vector: Optional[Sequence[float]]) -> Optional[np.ndarray]:
+        if not vector:
+            return None
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else None
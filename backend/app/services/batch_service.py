@@ -0,0 +1,139 @@
+import asyncio
+import json
+import logging
+from time import perf_counter
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+from uuid import uuid4
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.schemas.chat import CaseSlotState, ChatRequest
+from app.services.memory_service import MemoryService
+from app.services.qa_orchestrator import QAOrchestrator, StreamProgress
+
+logger = logging.getLogger(__name__)
+
+
+def parse_batch(lines: Iterable[str]) -> List[Dict[str, Any]]:
+    items = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        items.append(json.loads(line) if line.startswith("{") else {"query": line})
+    return items
+
+
+class DryRunStore:
+    async def next_qa_id(self, conversation_id: str) -> str:
+        return f"{conversation_id}.1"
+
+    async def get_conversation(self, conversation_id: str):
+        return None
+
+    async def get_case_slot_state(self, conversation_id: str) -> Dict[str, Any]:
+        return CaseSlotState().model_dump()
+
+    async def update_case_slot_state(self, conversation_id: str, case_slot_state: Dict[str, Any]) -> Dict[str, Any]:
+        return CaseSlotState(**(case_slot_state or {})).model_dump()
+
+    async def append_user(self, *args, **kwargs):
+        pass
+
+    async def append_assistant(self, *args, **kwargs):
+        pass
+
+    async def mark_support(self, conversation_id: str):
+        pass
+
+
+class DryRunMemory:
+    def __init__(self, memory: MemoryService):
+        self.memory = memory
+
+    async def build_short_context(self, conversation_id: str, limit: int = 3) -> str:
+        return ""
+
+    async def build_context(self, *args, **kwargs) -> str:
+        return ""
+
+    def build_memory_vector(self, original_vector, intent_vectors):
+        return self.memory.build_memory_vector(original_vector, intent_vectors)
+
+    def write_short(self, *args, **kwargs):
+        pass
+
+    def write_long(self, *args, **kwargs):
+        pass
+
+    async def maybe_mid_summary(self, conversation_id: str):
+        pass
+
+
+class BatchService:
+    def __init__(self, qa: QAOrchestrator):
+        self.qa = qa
+        store = DryRunStore()
+        self.dry_run = QAOrchestrator(store, store, qa.model, qa.intent, qa.retrieval, DryRunMemory(qa.memory), qa.guardrail)
+        self.dry_run.packer = qa.packer
+        self.dry_run.answer_cache = qa.answer_cache
+
+    async def run(self, items: List[Dict[str, Any]], concurrency: Optional[int] = None, persist: bool = True, mode: str = "normal") -> AsyncIterator[Dict[str, Any]]:
+        concurrency = max(1, min(concurrency or settings.batch_concurrency, settings.batch_max_concurrency))
+        batch_id = uuid4().hex[:8]
+        pending: asyncio.Queue = asyncio.Queue()
+        for index, item in enumerate(items):
+            pending.put_nowait((index, item))
+        results: asyncio.Queue = asyncio.Queue()
+
+        async def worker():
+            while not pending.empty():
+                index, item = pending.get_nowait()
+                await results.put(await self._answer(batch_id, index, item, persist, mode))
+
+        start = perf_counter()
+        logger.info("批量问答开始: batch=%s items=%d concurrency=%d persist=%s", batch_id, len(items), concurrency, persist)
+        workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(items)))]
+        failed = 0
+        try:
+            for _ in range(len(items)):
+                row = await results.get()
+                failed += row["status"] != "ok"
+                yield row
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            logger.info("批量问答结束: batch=%s items=%d failed=%d total_ms=%.1f", batch_id, len(items), failed, (perf_counter() - start) * 1000)
+
+    async def _answer(self, batch_id: str, index: int, item: Dict[str, Any], persist: bool, mode: str) -> Dict[str, Any]:
+        start = perf_counter()
+        query = str(item.get("query") or "").strip()
+        row: Dict[str, Any] = {"index": index, "id": item.get("id", index), "query": query}
+        try:
+            if not query:
+                raise ValueError("query 不能为空")
+            conversation_id = item.get("conversation_id") or (await self.qa.conversation.create() if persist else f"batch-{batch_id}-{index}")
+            request = ChatRequest(conversation_id=conversation_id, query=query, mode=item.get("mode") or mode, stream=False, filters=item.get("filters"))
+            progress = StreamProgress()
+            async for _ in (self.qa if persist else self.dry_run).stream_chat(request, progress=progress, progressive=False):
+                pass
+            response = progress.response(request)
+            row.update({
+                "status": "ok",
+                "conversation_id": conversation_id,
+                "qa_id": response.qa_id,
+                "mode": request.mode,
+                "answer": response.answer,
+                "need_human": response.need_human,
+                "need_clarification": response.need_clarification,
+                "query_type": response.intent_analysis.query_type if response.intent_analysis else "",
+                "citations": [{"citation_id": c.citation_id, "law_name": c.law_name, "article_id": c.article_id, "score": c.score} for c in response.citations],
+                "first_useful_ms": round(progress.first_useful_ms, 1) if progress.first_useful_ms is not None else None,
+                "timings": progress.timings,
+            })
+        except Exception as exc:
+            logger.warning("批量问答单条失败: batch=%s index=%d error=%s", batch_id, index, exc)
+            row.update({"status": "error", "error": str(exc)})
+        metrics.incr("batch_items", status=row["status"])
+        row["total_ms"] = round((perf_counter() - start) * 1000, 1)
+        return row
@@ -0,0 +1,162 @@
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+from app.schemas.chat import Citation
+
+NO_CONTEXT = "未检索到可靠法律条文。"
+MEMORY_PRIORITY = ("【短期记忆】", "【中期摘要记忆】", "【长期图记忆】")
+SHINGLE = 10
+DUPLICATE_OVERLAP = 0.8
+MIN_CITATION_TOKENS = 40
+DUPLICATE_NOTE = "（内容与前文依据重叠，已省略）"
+ASCII_RE = re.compile(r"[A-Za-z0-9\s]")
+
+
+def char_tokens(ch: str) -> float:
+    return 0.25 if ASCII_RE.match(ch) else 1.0
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(sum(char_tokens(ch) for ch in text or ""))
+
+
+def truncate_tokens(text: str, max_tokens: int, keep_tail: bool = False) -> str:
+    if max_tokens <= 0:
+        return ""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    chars = reversed(text) if keep_tail else text
+    used, kept = 0.0, []
+    for ch in chars:
+        used += char_tokens(ch)
+        if used > max_tokens - 1:
+            break
+        kept.append(ch)
+    return "…" + "".join(reversed(kept)) if keep_tail else "".join(kept) + "…"
+
+
+@dataclass(frozen=True)
+class PackBudget:
+    total: int
+    memory_share: float
+    max_citations: Optional[int] = None
+    citation_cap: Optional[int] = None
+
+
+@dataclass
+class PackedContext:
+    context: str
+    memory: str
+    analysis: str
+    budget: int
+    tokens: Dict[str, int] = field(default_factory=dict)
+    citations_used: int = 0
+    citations_total: int = 0
+    deduped: int = 0
+    trimmed: List[str] = field(default_factory=list)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "budget": self.budget,
+            "tokens": sum(self.tokens.values()),
+            **{f"{name}_tokens": value for name, value in self.tokens.items()},
+            "citations": f"{self.citations_used}/{self.citations_total}",
+            "deduped": self.deduped,
+            "trimmed": ",".join(self.trimmed) or "none",
+        }
+
+
+def default_budgets() -> Dict[str, PackBudget]:
+    return {
+        "normal": PackBudget(settings.prompt_token_budget_normal, 0.25),
+        "plus": PackBudget(settings.prompt_token_budget_plus, 0.35),
+        "draft": PackBudget(settings.prompt_token_budget_draft, 0.25, max_citations=3, citation_cap=180),
+    }
+
+
+class ContextPacker:
+    def __init__(self, budgets: Dict[str, PackBudget] = None):
+        self.budgets = budgets or default_budgets()
+
+    def pack(self, mode: str, query: str, citations: List[Citation], memory_context: str = "", analysis: str = "", follow_up: bool = False) -> PackedContext:
+        budget = self.budgets[mode]
+        tokens = {"query": estimate_tokens(query), "analysis": estimate_tokens(analysis)}
+        remaining = max(0, budget.total - tokens["query"] - tokens["analysis"])
+        memory_need = estimate_tokens(memory_context)
+        share = max(budget.memory_share, 0.5) if follow_up else budget.memory_share
+        memory_reserve = min(memory_need, int(remaining * share))
+        blocks, kept, used, deduped, trimmed = self._pack_citations(citations[:budget.max_citations] if budget.max_citations else citations, remaining - memory_reserve, budget.citation_cap)
+        memory = self._pack_memory(memory_context, remaining - used)
+        tokens["citations"] = used
+        tokens["memory"] = estimate_tokens(memory)
+        if memory != (memory_context or ""):
+            trimmed.append("memory")
+        return PackedContext(
+            context="\n\n".join(blocks) or NO_CONTEXT,
+            memory=memory,
+            analysis=analysis,
+            budget=budget.total,
+            tokens=tokens,
+            citations_used=kept,
+            citations_total=len(citations),
+            deduped=deduped,
+            trimmed=trimmed,
+        )
+
+    def _pack_citations(self, citations: List[Citation], limit: int, cap: Optional[int]):
+        blocks: List[str] = []
+        seen_texts: List[str] = []
+        seen_shingles = set()
+        used = deduped = 0
+        trimmed: List[str] = []
+        for citation in citations:
+            header = f"[{citation.citation_id}]《{citation.law_name}》{citation.article_id} 来源:{citation.filename}"
+            body = citation.content or ""
+            compact = "".join(body.split())
+            shingles = {compact[i:i + SHINGLE] for i in range(max(1, len(compact) - SHINGLE + 1))}
+            if compact and (any(compact in text for text in seen_texts) or len(shingles & seen_shingles) >= DUPLICATE_OVERLAP * len(shingles)):
+                note = f"{header}{DUPLICATE_NOTE}"
+                if used + estimate_tokens(note) <= limit:
+                    blocks.append(note)
+                    used += estimate_tokens(note)
+                deduped += 1
+                continue
+            room = limit - used - estimate_tokens(header) - 1
+            if cap is not None and estimate_tokens(body) > cap:
+                body = truncate_tokens(body, cap)
+                trimmed.append(citation.citation_id)
+            if room < MIN_CITATION_TOKENS:
+                break
+            if estimate_tokens(body) > room:
+                body = truncate_tokens(body, room)
+                trimmed.append(citation.citation_id)
+            block = f"{header}\n{body}"
+            blocks.append(block)
+            used += estimate_tokens(block)
+            seen_texts.append(compact)
+            seen_shingles |= shingles
+        return blocks, len(seen_texts), used, deduped, trimmed
+
+    def _pack_memory(self, memory_context: str, limit: int) -> str:
+        if not memory_context or limit <= 0:
+            return ""
+        if estimate_tokens(memory_context) <= limit:
+            return memory_context
+        sections = memory_context.split("\n\n")
+        order = sorted(range(len(sections)), key=lambda i: next((rank for rank, name in enumerate(MEMORY_PRIORITY) if sections[i].startswith(name)), len(MEMORY_PRIORITY)))
+        kept: Dict[int, str] = {}
+        for index in order:
+            room = limit - sum(estimate_tokens(text) + 1 for text in kept.values())
+            if room < MIN_CITATION_TOKENS:
+                break
+            kept[index] = self._trim_section(sections[index], room)
+        return "\n\n".join(kept[i] for i in sorted(kept))
+
+    def _trim_section(self, section: str, limit: int) -> str:
+        if estimate_tokens(section) <= limit:
+            return section
+        header, _, body = section.partition("\n")
+        room = limit - estimate_tokens(header) - 1
+        return f"{header}\n{truncate_tokens(body, room, keep_tail=header == MEMORY_PRIORITY[0])}"
@@ -46,15 +46,18 @@ class ConversationService:
             "timestamp": beijing_time(),
         })
 
-    async def append_assistant(self, conversation_id: str, qa_id: str, answer: str, mode: str, citations: List[Citation]):
-        await self.repo.append_message(conversation_id, {
+    async def append_assistant(self, conversation_id: str, qa_id: str, answer: str, mode: str, citations: List[Citation], truncated: bool = False):
+        message = {
             "role": "assistant",
             "content": answer,
             "qa_id": qa_id,
             "mode": mode,
             "citations": [c.model_dump() for c in citations],
             "timestamp": beijing_time(),
-        })
+        }
+        if truncated:
+            message["truncated"] = True
+        await self.repo.append_message(conversation_id, message)
 
     async def mark_support(self, conversation_id: str):
         await self.repo.set_conversation_status(conversation_id, "support")
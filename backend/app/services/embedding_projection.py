@@ -0,0 +1,76 @@
+import logging
+from pathlib import Path
+from typing import List, Optional, Sequence
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def l2_normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+class EmbeddingProjection:
+    def __init__(self, mean: np.ndarray, components: np.ndarray, explained: np.ndarray = None):
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.components = np.asarray(components, dtype=np.float32)
+        self.explained = np.asarray(explained if explained is not None else [], dtype=np.float32)
+
+    @property
+    def input_dims(self) -> int:
+        return int(self.components.shape[0])
+
+    @property
+    def dims(self) -> int:
+        return int(self.components.shape[1])
+
+    @staticmethod
+    def max_dims(samples: int, features: int) -> int:
+        return max(0, min(samples - 1, features))
+
+    @classmethod
+    def fit(cls, vectors: Sequence[Sequence[float]], dims: int) -> "EmbeddingProjection":
+        matrix = l2_normalize(np.asarray(vectors, dtype=np.float64))
+        limit = cls.max_dims(*matrix.shape)
+        if not 0 < dims <= limit:
+            raise ValueError(f"投影维度 {dims} 超出可拟合范围 1..{limit}（样本数 {matrix.shape[0]}，原始维度 {matrix.shape[1]}），请调小 EMBEDDING_PROJECTION_DIMS")
+        mean = matrix.mean(axis=0)
+        _, singular, vt = np.linalg.svd(matrix - mean, full_matrices=False)
+        variance = singular ** 2
+        explained = variance[:dims] / variance.sum() if variance.sum() else np.zeros(dims)
+        logger.info("向量降维投影拟合完成: samples=%d dims=%d->%d explained=%.4f", matrix.shape[0], matrix.shape[1], dims, float(explained.sum()))
+        return cls(mean, vt[:dims].T, explained)
+
+    def apply_many(self, vectors: Sequence[Sequence[float]]) -> np.ndarray:
+        matrix = l2_normalize(np.asarray(vectors, dtype=np.float32).reshape(-1, self.input_dims))
+        return l2_normalize((matrix - self.mean) @ self.components)
+
+    def apply(self, vector: Optional[Sequence[float]]) -> Optional[List[float]]:
+        if not vector:
+            return vector
+        if len(vector) != self.input_dims:
+            logger.warning("向量维度与投影不一致，跳过降维: vector=%d projection=%d", len(vector), self.input_dims)
+            return list(vector)
+        return self.apply_many([vector])[0].tolist()
+
+    def save(self, path: str):
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_suffix(".tmp")
+        with tmp.open("wb") as fh:
+            np.savez(fh, mean=self.mean, components=self.components, explained=self.explained)
+        tmp.replace(target)
+        logger.info("向量降维投影已保存: path=%s dims=%d", target, self.dims)
+
+    @classmethod
+    def load(cls, path: str, dims: int = 0) -> Optional["EmbeddingProjection"]:
+        source = Path(path)
+        if dims <= 0 or not source.exists():
+            return None
+        with np.load(source) as data:
+            projection = cls(data["mean"], data["components"], data["explained"])
+        if projection.dims != dims:
+            logger.warning("投影维度与配置不一致，停用降维: projection=%d config=%d", projection.dims, dims)
+            return None
+        return projection
@@ -0,0 +1,147 @@
+import logging
+import unicodedata
+from dataclasses import dataclass
+from functools import lru_cache
+from importlib import import_module
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from app.core.keyword_automaton import KeywordAutomaton
+
+logger = logging.getLogger(__name__)
+
+LEXICON_KINDS = ("banned", "handoff")
+SKIP_CATEGORIES = ("P", "Z", "C", "S")
+T2S_PAIRS = (
+    "與与 萬万 專专 業业 東东 兩两 嚴严 個个 豐丰 臨临 為为 麗丽 舉举 義义 樂乐 習习 書书 買买 亂乱 爭争 於于 虧亏 雲云 亞亚 產产 親亲 億亿 僅仅 從从 儀仪 "
+    "們们 價价 眾众 優优 會会 傳传 傷伤 偽伪 體体 佔占 併并 偵侦 債债 傾倾 備备 兒儿 黨党 關关 興兴 內内 冊册 寫写 軍军 農农 淨净 減减 幾几 憑凭 擊击 則则 "
+    "剛刚 創创 刪删 別别 劃划 劇剧 動动 務务 勝胜 勞劳 勢势 勵励 區区 醫医 華华 協协 單单 賣卖 衛卫 卻却 廠厂 廳厅 歷历 厲厉 壓压 參参 雙双 發发 髮发 變变 "
+    "葉叶 號号 嗎吗 啟启 嚇吓 員员 問问 團团 園园 圍围 國国 圖图 圓圆 聖圣 場场 壞坏 塊块 堅坚 聲声 處处 夠够 頭头 奪夺 獎奖 婦妇 媽妈 學学 孫孙 寧宁 寶宝 "
+    "實实 審审 憲宪 對对 導导 將将 爾尔 屆届 屬属 層层 歲岁 島岛 師师 帳帐 帶带 幫帮 幹干 庫库 廢废 廣广 應应 開开 彈弹 強强 歸归 當当 錄录 徹彻 後后 術术 "
+    "衝冲 徵征 復复 複复 憶忆 態态 懷怀 戰战 戲戏 戶户 執执 擴扩 掃扫 揚扬 換换 損损 搶抢 擁拥 擇择 擔担 據据 擠挤 撥拨 擬拟 攝摄 敗败 敵敌 數数 斷断 無无 "
+    "舊旧 時时 暫暂 條条 來来 極极 構构 樣样 標标 樹树 橋桥 機机 檢检 權权 歡欢 歐欧 殘残 殺杀 毀毁 氣气 漢汉 溝沟 滅灭 滿满 濟济 燈灯 燒烧 熱热 獨独 獲获 "
+    "環环 現现 畫画 畢毕 療疗 盡尽 監监 盤盘 礎础 碼码 確确 禮礼 禍祸 離离 種种 積积 稅税 穩稳 窮穷 競竞 筆笔 節节 範范 築筑 簡简 簽签 糧粮 緊紧 紀纪 約约 "
+    "紅红 級级 紙纸 細细 終终 組组 經经 結结 絕绝 給给 統统 絲丝 維维 綜综 網网 線线 編编 練练 緣缘 縣县 總总 績绩 織织 罰罚 罷罢 羅罗 聞闻 聯联 聽听 職职 "
+    "腦脑 臉脸 藝艺 蘇苏 補补 裝装 製制 見见 規规 視视 覺觉 觀观 計计 訂订 認认 討讨 訓训 議议 訊讯 記记 講讲 許许 論论 設设 訪访 證证 評评 識识 詞词 試试 "
+    "該该 詳详 話话 誠诚 誤误 說说 請请 諾诺 讀读 課课 調调 談谈 謀谋 謝谢 讓让 負负 財财 責责 貨货 販贩 貧贫 購购 貴贵 費费 貸贷 貿贸 資资 賊贼 賄贿 賠赔 "
+    "賬账 質质 賭赌 賴赖 贈赠 贏赢 趕赶 跡迹 踐践 車车 軟软 較较 載载 輕轻 輸输 轉转 辦办 辭辞 這这 連连 進进 運运 過过 達达 違违 遠远 適适 選选 遺遗 邊边 "
+    "鄉乡 郵邮 釋释 針针 鈔钞 鐵铁 銀银 銷销 鋼钢 錢钱 錯错 鍵键 鎖锁 長长 門门 閉闭 間间 閱阅 闆板 陣阵 陰阴 陳陈 險险 隊队 隨随 隱隐 雜杂 雞鸡 難难 電电 "
+    "靈灵 靜静 響响 頁页 頂顶 項项 順顺 須须 預预 領领 題题 額额 願愿 類类 顧顾 顯显 風风 飛飞 飯饭 飲饮 養养 餘余 館馆 馬马 駕驾 驗验 騙骗 鬥斗 魚鱼 鳥鸟 "
+    "黃黄 點点 齊齐 龍龙 訴诉 訟讼 詐诈 轄辖 辯辩 護护 繼继 囑嘱 僱雇 營营 謊谎 綁绑 騷骚 擾扰 槍枪 襲袭 詛诅 罵骂 滾滚 絡络 幣币 匯汇 兌兑 麼么 鬧闹 憤愤 "
+    "惱恼 厭厌"
+)
+T2S_TABLE = {pair[0]: pair[1] for pair in T2S_PAIRS.split()}
+
+
+@lru_cache(maxsize=1)
+def _opencc():
+    try:
+        return import_module("opencc").OpenCC("t2s")
+    except Exception:
+        return None
+
+
+@lru_cache(maxsize=65536)
+def to_simplified(ch: str) -> str:
+    converter = _opencc()
+    if converter is not None:
+        converted = converter.convert(ch)
+        if len(converted) == 1:
+            return converted
+    return T2S_TABLE.get(ch, ch)
+
+
+def normalize_text(text: str) -> Tuple[str, List[int]]:
+    chars: List[str] = []
+    positions: List[int] = []
+    for index, ch in enumerate(text or ""):
+        for piece in unicodedata.normalize("NFKC", ch).lower():
+            if unicodedata.category(piece)[0] in SKIP_CATEGORIES:
+                continue
+            chars.append(to_simplified(piece))
+            positions.append(index)
+    return "".join(chars), positions
+
+
+@dataclass(frozen=True)
+class LexiconEntry:
+    kind: str
+    term: str
+    label: str = ""
+    source: str = "builtin"
+
+
+@dataclass(frozen=True)
+class LexiconMatch:
+    kind: str
+    term: str
+    label: str
+    source: str
+    start: int
+    end: int
+    text: str
+
+    def explain(self) -> str:
+        return f"{self.kind}:{self.term}" + (f"({self.label})" if self.label else "") + f" <- '{self.text}'@{self.start}-{self.end} [{self.source}]"
+
+
+class GuardrailLexicon:
+    def __init__(self, entries: Iterable[LexiconEntry]):
+        self.automaton = KeywordAutomaton()
+        self.counts: Dict[str, int] = {kind: 0 for kind in LEXICON_KINDS}
+        self._terms: Dict[str, List[str]] = {kind: [] for kind in LEXICON_KINDS}
+        seen = set()
+        for entry in entries:
+            key, _ = normalize_text(entry.term)
+            if not key or (entry.kind, key) in seen:
+                continue
+            seen.add((entry.kind, key))
+            self.automaton.add(key, entry)
+            self.counts[entry.kind] = self.counts.get(entry.kind, 0) + 1
+            self._terms.setdefault(entry.kind, []).append(entry.term)
+        self.automaton.build()
+
+    def __len__(self) -> int:
+        return len(self.automaton)
+
+    def terms(self, kind: str) -> List[str]:
+        return list(self._terms.get(kind, []))
+
+    def scan(self, text: str, kind: Optional[str] = None) -> List[LexiconMatch]:
+        normalized, positions = normalize_text(text)
+        matches: List[LexiconMatch] = []
+        for start, end, _, entry in self.automaton.finditer(normalized):
+            if kind is not None and entry.kind != kind:
+                continue
+            origin, stop = positions[start], positions[end - 1] + 1
+            matches.append(LexiconMatch(entry.kind, entry.term, entry.label, entry.source, origin, stop, text[origin:stop]))
+        return matches
+
+    @classmethod
+    def load(cls, folder: str, defaults: Dict[str, Iterable[str]] = None) -> "GuardrailLexicon":
+        entries = [LexiconEntry(kind, term) for kind, terms in (defaults or {}).items() for term in terms]
+        for path in lexicon_files(folder):
+            kind = lexicon_kind(path)
+            for line in path.read_text(encoding="utf-8").splitlines():
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                term, _, label = line.partition("\t")
+                entries.append(LexiconEntry(kind, term.strip(), label.strip(), path.name))
+        lexicon = cls(entries)
+        logger.info("护栏词库加载完成: folder=%s %s", folder, " ".join(f"{k}={v}" for k, v in lexicon.counts.items()))
+        return lexicon
+
+
+def lexicon_kind(path: Path) -> str:
+    return path.stem.split(".")[0].split("_")[0]
+
+
+def lexicon_files(folder: str) -> List[Path]:
+    source = Path(folder)
+    if not source.is_dir():
+        return []
+    return sorted(path for path in source.glob("*.txt") if lexicon_kind(path) in LEXICON_KINDS)
+
+
+def lexicon_stamp(folder: str) -> Tuple:
+    return tuple((path.name, path.stat().st_mtime_ns, path.stat().st_size) for path in lexicon_files(folder))
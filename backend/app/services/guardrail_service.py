@@ -1,15 +1,93 @@
-from typing import Tuple
+import logging
+import threading
+from time import monotonic
+from typing import Callable, List, Optional, Tuple
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.guardrail_lexicon import GuardrailLexicon, LexiconMatch, lexicon_stamp
+
+logger = logging.getLogger(__name__)
+
+REJECT_TEXT = "抱歉，我不能帮助规避法律义务、逃避执行或实施违法行为。你可以咨询合法合规的权利救济路径。"
 
 
 class GuardrailService:
-    def __init__(self):
-        self.handoff_keywords = ["转人工", "人工客服", "找客服", "找律师", "真人", "投诉"]
-        self.illegal_keywords = ["逃避执行", "转移资产", "骗", "诈骗", "规避社保", "不被抓", "洗钱"]
+    def __init__(self, lexicon_dir: str = None):
+        self.builtin_handoff = ["转人工", "人工客服", "找客服", "找律师", "真人", "投诉"]
+        self.builtin_illegal = ["逃避执行", "转移资产", "骗", "诈骗", "规避社保", "不被抓", "洗钱"]
+        self.lexicon_dir = lexicon_dir or settings.guardrail_lexicon_dir
+        self._lock = threading.Lock()
+        self._reloading = False
+        self._listeners: List[Callable[[GuardrailLexicon], None]] = []
+        self._stamp: Optional[Tuple] = None
+        self._checked_at = monotonic()
+        self.lexicon = self._reload(force=True)
+
+    @property
+    def handoff_keywords(self) -> List[str]:
+        return self.lexicon.terms("handoff")
+
+    @property
+    def illegal_keywords(self) -> List[str]:
+        return self.lexicon.terms("banned")
+
+    def on_reload(self, listener: Callable[[GuardrailLexicon], None]):
+        self._listeners.append(listener)
+
+    def current_lexicon(self) -> GuardrailLexicon:
+        if monotonic() - self._checked_at >= settings.guardrail_reload_interval:
+            self._schedule_reload()
+        return self.lexicon
+
+    def _schedule_reload(self):
+        with self._lock:
+            if self._reloading:
+                return
+            self._reloading = True
+            self._checked_at = monotonic()
+        threading.Thread(target=self._refresh, name="guardrail-reload", daemon=True).start()
+
+    def _refresh(self):
+        try:
+            lexicon = self.lexicon
+            if self._reload() is not lexicon:
+                for listener in self._listeners:
+                    listener(self.lexicon)
+        except Exception as exc:
+            logger.warning("护栏词库后台重载失败: folder=%s error=%s", self.lexicon_dir, exc)
+        finally:
+            with self._lock:
+                self._reloading = False
+                self._checked_at = monotonic()
+
+    def _reload(self, force: bool = False) -> GuardrailLexicon:
+        stamp = lexicon_stamp(self.lexicon_dir)
+        if not force and stamp == self._stamp:
+            return self.lexicon
+        try:
+            lexicon = GuardrailLexicon.load(self.lexicon_dir, {"handoff": self.builtin_handoff, "banned": self.builtin_illegal})
+        except Exception as exc:
+            logger.warning("护栏词库加载失败，沿用当前词库: folder=%s error=%s", self.lexicon_dir, exc)
+            if not force:
+                self._stamp = stamp
+                return self.lexicon
+            lexicon = GuardrailLexicon.load("", {"handoff": self.builtin_handoff, "banned": self.builtin_illegal})
+        self._stamp = stamp
+        self.lexicon = lexicon
+        if not force:
+            metrics.incr("guardrail_lexicon_reloads")
+        return lexicon
+
+    def explain(self, query: str) -> List[LexiconMatch]:
+        return self.current_lexicon().scan(query)
 
     def need_human(self, query: str) -> bool:
-        return any(k in query for k in self.handoff_keywords)
+        return bool(self.current_lexicon().scan(query, kind="handoff"))
 
     def reject_reason(self, query: str) -> Tuple[bool, str]:
-        if any(k in query for k in self.illegal_keywords):
-            return True, "抱歉，我不能帮助规避法律义务、逃避执行或实施违法行为。你可以咨询合法合规的权利救济路径。"
+        matches = self.current_lexicon().scan(query, kind="banned")
+        if matches:
+            metrics.incr("guardrail_rejects")
+            logger.info("安全护栏拦截: %s", "; ".join(match.explain() for match in matches[:5]))
+            return True, REJECT_TEXT
         return False, ""
@@ -0,0 +1,137 @@
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+from app.core.keyword_automaton import KeywordAutomaton
+from app.schemas.chat import CaseSlotState, IntentAnalysis, IntentItem
+from app.services.law_catalog import LawCatalog, default_catalog
+from app.services.rule_index import ARTICLE_SPAN_RE
+
+STRONG_HANDOFF = ["转人工", "人工客服", "人工服务", "找客服", "接人工"]
+WEAK_HANDOFF = ["投诉", "找律师", "太差", "没用", "垃圾", "很生气", "失望", "别用AI", "别用ai"]
+SMALL_TALK = {
+    "greeting": ["你好", "您好", "hi", "hello", "嗨", "哈喽", "在吗", "在不在", "早上好", "下午好", "晚上好"],
+    "thanks": ["谢谢", "谢谢你", "谢谢您", "多谢", "感谢", "thanks", "thank you", "好的", "明白了", "知道了", "ok"],
+    "identity": ["你是谁", "你能做什么", "你可以做什么", "你会什么", "介绍一下你自己", "你有什么功能"],
+}
+SMALL_TALK_REPLIES = {
+    "greeting": "你好，我是法律咨询助手。你可以向我提问公司法、股东权利、股权转让、公司治理或清算相关问题。",
+    "thanks": "不客气。如果还有公司法、股东权利、股权转让、公司治理或清算相关问题，可以继续问我。",
+    "identity": "我是法律咨询助手，可以解答公司法条文含义、股东权利、股权转让、公司治理、公司解散与清算等问题，也可以结合你提供的案情做初步分析。",
+}
+LOOKUP_PHRASES = [
+    "规定了什么", "规定的是什么", "是怎么规定的", "怎么规定", "如何规定", "讲了什么", "说了什么", "说的是什么",
+    "是什么", "什么内容", "内容是什么", "的内容", "原文", "全文", "规定", "请问", "帮我查", "查一下", "看看",
+]
+FILLERS = ["啊", "呀", "哈", "呢", "吧", "嘛", "哦", "喔", "了", "的", "一下", "请"]
+HANDOFF_FILLERS = ["我要", "我想", "帮我", "给我", "马上", "立刻", "赶紧", "麻烦"]
+NEGATIONS = ["不需要", "不用", "不要", "不必", "无需", "不想", "没必要", "别"]
+PUNCT_RE = re.compile(r"[\s\W_]+", re.UNICODE)
+
+
+@dataclass
+class RouteDecision:
+    rule: str
+    confidence: float
+    analysis: Optional[IntentAnalysis] = None
+
+
+class IntentPreRouter:
+    def __init__(self, handoff_keywords: Iterable[str] = (), catalog: LawCatalog = None):
+        self.catalog = catalog or default_catalog()
+        automaton = KeywordAutomaton()
+        for keyword in dict.fromkeys([*STRONG_HANDOFF, *handoff_keywords]):
+            automaton.add(keyword, ("handoff", 0.95 if keyword in STRONG_HANDOFF else 0.7))
+        for keyword in WEAK_HANDOFF:
+            automaton.add(keyword, ("handoff", 0.7))
+        for category, keywords in SMALL_TALK.items():
+            for keyword in keywords:
+                automaton.add(keyword, (category, 0.95))
+        for entry in self.catalog.entries:
+            for name in entry.names():
+                automaton.add(name, ("law", entry.law_name))
+        for keyword in LOOKUP_PHRASES:
+            automaton.add(keyword, ("lookup", 0.0))
+        for keyword in FILLERS:
+            automaton.add(keyword, ("filler", 0.0))
+        for keyword in HANDOFF_FILLERS:
+            automaton.add(keyword, ("handoff_filler", 0.0))
+        self.automaton = automaton.build()
+
+    def route(self, query: str, case_slot_state: Dict[str, Any] = None) -> RouteDecision:
+        text = unicodedata.normalize("NFKC", query or "").lower()
+        matches = self.automaton.findall(text)
+        handoffs = [(s, e, payload[1]) for s, e, _, payload in self.automaton.finditer(text) if payload[0] == "handoff" and not self._negated(text, s)]
+        if handoffs:
+            spans = [(s, e) for s, e, _ in handoffs] + [(s, e) for s, e, _, payload in matches if payload[0] in SMALL_TALK or payload[0] in {"filler", "handoff_filler"}]
+            confidence = max(weight for _, _, weight in handoffs) * self._coverage(text, spans)
+            return RouteDecision("handoff", round(confidence, 4), self._handoff(case_slot_state))
+        articles = [m.span() for m in ARTICLE_SPAN_RE.finditer(text)]
+        if articles:
+            return self._statute(text, matches, articles, case_slot_state)
+        categories = [payload[0] for _, _, _, payload in matches if payload[0] in SMALL_TALK]
+        if not categories:
+            return RouteDecision("none", 0.0)
+        category = max(set(categories), key=categories.count)
+        coverage = self._coverage(text, [(s, e) for s, e, _, payload in matches if payload[0] in SMALL_TALK or payload[0] == "filler"])
+        return RouteDecision(category, round(0.95 * coverage, 4), self._small_talk(category, case_slot_state))
+
+    def _statute(self, text: str, matches, articles, case_slot_state) -> RouteDecision:
+        laws: List[str] = list(dict.fromkeys(payload[1] for _, _, _, payload in matches if payload[0] == "law"))
+        spans = articles + [(s, e) for s, e, _, payload in matches if payload[0] in {"law", "lookup", "filler"}]
+        coverage = self._coverage(text, spans)
+        if laws:
+            base = 0.95
+        else:
+            base = 0.9 if len(self.catalog.entries) == 1 else 0.8
+            laws = [self.catalog.entries[0].law_name] if len(self.catalog.entries) == 1 else []
+        refs = "、".join(text[s:e].replace(" ", "") for s, e in articles)
+        analysis = IntentAnalysis(
+            query_type="knowledge_qa",
+            matched_scenario="general",
+            law_names=laws,
+            intents=[IntentItem(intent_id="I1", intent_name="法条原文查询", rewritten_query=f"{''.join(laws)}{refs}的规定")],
+            slots={},
+            case_slot_state=CaseSlotState(**(case_slot_state or {})),
+        )
+        return RouteDecision("statute_lookup", round(base * coverage, 4), analysis)
+
+    def _negated(self, text: str, start: int) -> bool:
+        prefix = PUNCT_RE.split(text[max(0, start - 6):start])[-1]
+        return any(word in prefix for word in NEGATIONS)
+
+    def _coverage(self, text: str, spans) -> float:
+        covered = [False] * len(text)
+        for start, end in spans:
+            for i in range(start, end):
+                covered[i] = True
+        total = kept = 0
+        for i, ch in enumerate(text):
+            if PUNCT_RE.fullmatch(ch):
+                continue
+            total += 1
+            kept += covered[i]
+        return kept / total if total else 0.0
+
+    def _handoff(self, case_slot_state) -> IntentAnalysis:
+        return IntentAnalysis(
+            query_type="human_handoff",
+            matched_scenario="general",
+            risk_level="high",
+            need_human=True,
+            handoff_reason="用户明确要求转人工或表达对服务的不满。",
+            intents=[],
+            slots={},
+            case_slot_state=CaseSlotState(**(case_slot_state or {})),
+        )
+
+    def _small_talk(self, category: str, case_slot_state) -> IntentAnalysis:
+        return IntentAnalysis(
+            query_type="simple_chat",
+            matched_scenario="general",
+            direct_answer=True,
+            direct_answer_text=SMALL_TALK_REPLIES[category],
+            intents=[],
+            slots={},
+            case_slot_state=CaseSlotState(**(case_slot_state or {})),
+        )
@@ -1,7 +1,15 @@
+import hashlib
 import logging
 import json
-from typing import Any, Dict
+from typing import Any, Dict, Optional, Tuple
+from app.core.cache import TTLCache, query_hash
+from app.core.config import settings
+from app.core.metrics import metrics
 from app.schemas.chat import CaseSlotState, IntentAnalysis, IntentItem
+from app.services.guardrail_lexicon import GuardrailLexicon
+from app.services.guardrail_service import GuardrailService
+from app.services.intent_router import IntentPreRouter
+from app.services.law_catalog import default_catalog
 from app.services.model_service import ModelService
 
 logger = logging.getLogger(__name__)
@@ -38,7 +46,8 @@ SCENARIO_GUIDE = """
 2. 如果本次问题补充、修正或否定了既有事实，应更新对应槽位；如果本次问题没有涉及某槽位，必须保留原值，不要清空。
 3. 如果本次是 simple_chat、non_legal、knowledge_qa 或 human_handoff，只要用户表达了与案件事实有关的信息，也要更新 case_slot_state；如果没有案件事实信息，则原样返回当前 case_slot_state。
 4. 若是案例咨询，拆解 2 到 4 个法律子意图，每个子意图给 rewritten_query；同时在 slots 中抽取与 matched_scenario 对应的本轮事实槽位，未知字段填 null 或空数组，不要臆造事实。
-输出字段：query_type, matched_scenario, risk_level, need_human, handoff_reason, direct_answer, direct_answer_text, need_clarification, clarification_question, missing_slots, intents, slots, case_slot_state。
+如果用户明确指向某部法律或司法解释（如“公司法”“公司法司法解释三”），在 law_names 中输出其名称；未明确指向时输出空数组 []，不要猜测。
+输出字段：query_type, matched_scenario, risk_level, need_human, handoff_reason, direct_answer, direct_answer_text, need_clarification, clarification_question, missing_slots, law_names, intents, slots, case_slot_state。
 
 必须参考以下分类示例：
 用户：“我要转人工，你这个回答完全没用”
@@ -65,12 +74,63 @@ SCENARIO_GUIDE = """
 
 
 class IntentService:
-    def __init__(self, model_service: ModelService):
+    def __init__(self, model_service: ModelService, guardrail: Optional[GuardrailService] = None):
         self.model = model_service
+        self.router = None
+        if settings.intent_router_enabled:
+            self.router = IntentPreRouter(guardrail.handoff_keywords if guardrail is not None else ())
+            if guardrail is not None:
+                guardrail.on_reload(self._rebuild_router)
+        self.cache = TTLCache(settings.intent_cache_size, settings.intent_cache_ttl_seconds) if settings.intent_cache_enabled else None
 
     def analyze(self, query: str, case_slot_state: Dict[str, Any] = None) -> IntentAnalysis:
-        fallback = self._fallback(query)
         current_slots = self._normalize_case_slot_state(case_slot_state)
+        router = self.router
+        if router is not None:
+            decision = router.route(query, current_slots)
+            if decision.analysis is not None and decision.confidence >= settings.intent_router_threshold:
+                metrics.incr("intent_route", route="local", rule=decision.rule)
+                logger.info("意图预路由命中: query=%s rule=%s confidence=%.2f", query[:40], decision.rule, decision.confidence)
+                return decision.analysis
+        key = self._cache_key(query, current_slots)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            metrics.incr("intent_cache_hits" if cached is not None else "intent_cache_misses")
+            if cached is not None:
+                metrics.incr("intent_route", route="cache")
+                logger.info("意图识别缓存命中: query=%s query_type=%s", query[:40], cached.query_type)
+                return cached.model_copy(deep=True)
+        metrics.incr("intent_route", route="llm")
+        analysis, degraded = self._analyze(query, current_slots)
+        if self.cache is not None and not degraded:
+            self.cache.set(key, analysis.model_copy(deep=True))
+        return analysis
+
+    def _rebuild_router(self, lexicon: GuardrailLexicon):
+        self.router = IntentPreRouter(lexicon.terms("handoff"), self.router.catalog)
+        logger.info("意图预路由已按护栏词库重建: handoff=%d", len(lexicon.terms("handoff")))
+
+    def route_stats(self) -> Dict[str, Any]:
+        routes = metrics.snapshot().get("intent_route", {})
+        local = sum(value for label, value in routes.items() if "route=local" in label)
+        cache = routes.get("route=cache", 0.0)
+        llm = routes.get("route=llm", 0.0)
+        total = local + cache + llm
+        return {
+            "enabled": self.router is not None,
+            "threshold": settings.intent_router_threshold,
+            "local": local,
+            "cache": cache,
+            "llm": llm,
+            "local_by_rule": {label.split("rule=", 1)[-1]: value for label, value in routes.items() if "route=local" in label},
+            "llm_skip_ratio": round((local + cache) / total, 4) if total else None,
+        }
+
+    def _cache_key(self, query: str, slots: Dict[str, Any]) -> Tuple[str, str]:
+        return query_hash(query), hashlib.sha1(json.dumps(slots, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def _analyze(self, query: str, current_slots: Dict[str, Any]) -> Tuple[IntentAnalysis, bool]:
+        fallback = self._fallback(query)
         fallback.case_slot_state = CaseSlotState(**current_slots)
         user_payload = f"""【用户问题】
 {query}
@@ -78,14 +138,17 @@ class IntentService:
 【当前会话案例槽位状态】
 {json.dumps(current_slots, ensure_ascii=False)}
 """
+        fallback_payload = fallback.model_dump()
         data = self.model.call_small_json([
             {"role": "system", "content": SCENARIO_GUIDE},
             {"role": "user", "content": user_payload},
-        ], fallback=fallback.model_dump())
+        ], fallback=fallback_payload)
+        degraded = data is fallback_payload
         try:
             analysis = IntentAnalysis(**data)
         except Exception:
             analysis = fallback
+            degraded = True
         analysis.case_slot_state = CaseSlotState(**self._merge_case_slot_state(
             current_slots,
             analysis.case_slot_state.model_dump() if analysis.case_slot_state else {},
@@ -108,16 +171,18 @@ class IntentService:
             analysis.intents = []
             if not analysis.handoff_reason:
                 analysis.handoff_reason = "用户存在转人工诉求或明显负面情绪。"
-            return analysis
+            return analysis, degraded
         if analysis.query_type in {"simple_chat", "non_legal"}:
             analysis.direct_answer = True
             if not analysis.direct_answer_text:
                 analysis.direct_answer_text = self._direct_answer(query, analysis.query_type).direct_answer_text
             analysis.intents = []
-            return analysis
+            return analysis, degraded
         if not analysis.intents:
             analysis.intents = [IntentItem(intent_id="I1", intent_name="原始问题检索", rewritten_query=query)]
-        return analysis
+        catalog = default_catalog()
+        analysis.law_names = catalog.resolve(analysis.law_names) or catalog.match(query)
+        return analysis, degraded
 
     def _direct_answer(self, query: str, query_type: str) -> IntentAnalysis:
         fallback_text = "您好，我是法律咨询助手。你可以向我提问公司法、股东权利、股权转让、公司治理或公司清算相关问题。"
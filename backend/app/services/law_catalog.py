@@ -0,0 +1,79 @@
+import json
+import logging
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LAW_NAME = "中华人民共和国公司法"
+
+
+@dataclass(frozen=True)
+class LawEntry:
+    law_name: str
+    short_name: str = ""
+    file_pattern: str = ""
+    aliases: tuple = field(default_factory=tuple)
+    source_type: str = "law_text"
+    authority_level: str = "unknown"
+
+    def names(self) -> List[str]:
+        return [name for name in (self.law_name, self.short_name, *self.aliases) if name]
+
+
+DEFAULT_CATALOG = (
+    LawEntry(law_name=DEFAULT_LAW_NAME, short_name="公司法", file_pattern=r"^公司法", aliases=("新公司法",), source_type="law_text", authority_level="law"),
+)
+
+
+class LawCatalog:
+    def __init__(self, entries: Iterable[LawEntry]):
+        self.entries = list(entries)
+        self._names = sorted(((name, entry) for entry in self.entries for name in entry.names()), key=lambda x: len(x[0]), reverse=True)
+
+    @classmethod
+    def load(cls, path: str = None) -> "LawCatalog":
+        source = Path(path or settings.law_catalog_path)
+        if not source.exists():
+            return cls(DEFAULT_CATALOG)
+        try:
+            items = json.loads(source.read_text(encoding="utf-8"))
+            entries = [LawEntry(**{**item, "aliases": tuple(item.get("aliases", []))}) for item in items]
+        except Exception as exc:
+            logger.warning("法规目录读取失败，使用内置目录: path=%s error=%s", source, exc)
+            return cls(DEFAULT_CATALOG)
+        logger.info("法规目录加载完成: path=%s laws=%d", source, len(entries))
+        return cls(entries)
+
+    def tag(self, filename: str) -> Dict[str, str]:
+        entry = self.for_file(filename)
+        if entry is None:
+            return {"law_name": re.split(r"第[一二三四五六七八九十百千万零\d]+章", Path(filename).stem)[0] or DEFAULT_LAW_NAME, "source_type": "law_text", "authority_level": "unknown"}
+        return {"law_name": entry.law_name, "source_type": entry.source_type, "authority_level": entry.authority_level}
+
+    def for_file(self, filename: str) -> Optional[LawEntry]:
+        for entry in self.entries:
+            if entry.file_pattern and re.search(entry.file_pattern, filename):
+                return entry
+        return None
+
+    def match(self, text: str) -> List[str]:
+        found: List[str] = []
+        text = text or ""
+        for name, entry in self._names:
+            if name in text and entry.law_name not in found:
+                found.append(entry.law_name)
+                text = text.replace(name, " ")
+        return found
+
+    def resolve(self, names: Iterable[str]) -> List[str]:
+        return list(dict.fromkeys(law for name in names or [] for law in self.match(name)))
+
+
+@lru_cache(maxsize=1)
+def default_catalog() -> LawCatalog:
+    return LawCatalog.load()
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from typing import Dict, List, Optional
 import numpy as np
@@ -14,6 +15,8 @@ logger = logging.getLogger(__name__)
 def cosine(vec1, vec2):
     a = np.array(vec1, dtype=float)
     b = np.array(vec2, dtype=float)
+    if a.shape != b.shape:
+        return 0.0
     denom = np.linalg.norm(a) * np.linalg.norm(b)
     return float(np.dot(a, b) / denom) if denom else 0.0
 
@@ -127,7 +130,7 @@ class MemoryService:
         messages = doc.get("messages", [])[-settings.summary_interval * 2:]
         text = "\n".join([f"{m.get('role')}: {m.get('content')}" for m in messages])
         prompt = "请将以下法律咨询对话压缩为 JSON 摘要，字段包括 case_facts, confirmed_slots, missing_slots, legal_issues, cited_articles, given_advice, next_questions。"
-        summary_text = self.model.call_small_text([
+        summary_text = await asyncio.to_thread(self.model.call_small_text, [
             {"role": "system", "content": prompt},
             {"role": "user", "content": text},
         ], fallback="{}")
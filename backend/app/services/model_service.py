@@ -1,33 +1,89 @@
 import json
 import logging
-from typing import Dict, Generator, Iterable, List
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Generator, Iterable, List, Optional
 from openai import OpenAI
 from dashscope import MultiModalEmbedding
+from app.core.cancellation import CancellationToken
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.rate_limit import RateLimiter
+from app.services.embedding_projection import EmbeddingProjection
 
 logger = logging.getLogger(__name__)
 
+STREAM_FAILURE_TEXT = "\n\n抱歉，模型服务暂时不可用，请稍后重试。"
+
 
 class ModelService:
     def __init__(self):
         self.client = OpenAI(api_key=settings.dashscope_api_key, base_url=settings.dashscope_base_url)
+        self.llm_limiter = RateLimiter("llm", settings.llm_rate_limit_rps, settings.llm_rate_limit_burst)
+        self.embedding_limiter = RateLimiter("embedding", settings.embedding_rate_limit_rps, settings.embedding_rate_limit_burst)
+        self.projection: Optional[EmbeddingProjection] = None
+        self._projection_mtime = None
+        self.stream_executor = ThreadPoolExecutor(max_workers=settings.generation_stream_workers, thread_name_prefix="llm-stream")
+
+    def current_projection(self) -> Optional[EmbeddingProjection]:
+        if settings.embedding_projection_dims <= 0:
+            return None
+        path = Path(settings.embedding_projection_path)
+        mtime = path.stat().st_mtime if path.exists() else 0.0
+        if mtime != self._projection_mtime:
+            self._projection_mtime = mtime
+            self.projection = EmbeddingProjection.load(str(path), settings.embedding_projection_dims)
+            if self.projection is None:
+                logger.warning("已配置向量降维但投影文件不可用，使用原始维度: %s", path)
+        return self.projection
 
-    def embed_text(self, text: str):
+    def close(self):
+        self.stream_executor.shutdown(wait=False, cancel_futures=True)
+
+    def embed_text(self, text: str, raw: bool = False):
         if not text.strip():
             return None
         try:
+            self.embedding_limiter.acquire()
             resp = MultiModalEmbedding.call(
                 model=settings.embedding_model,
                 input=[{"text": text}],
                 api_key=settings.dashscope_api_key,
             )
-            return resp.output["embeddings"][0]["embedding"]
+            vector = resp.output["embeddings"][0]["embedding"]
+            projection = None if raw else self.current_projection()
+            return vector if projection is None else projection.apply(vector)
         except Exception as exc:
             logger.warning("Embedding 调用失败: %s", exc)
             return None
 
+    def embed_texts(self, texts: List[str], raw: bool = False) -> List[Optional[List[float]]]:
+        if not texts:
+            return []
+        try:
+            self.embedding_limiter.acquire()
+            resp = MultiModalEmbedding.call(
+                model=settings.embedding_model,
+                input=[{"text": text} for text in texts],
+                api_key=settings.dashscope_api_key,
+            )
+            items = resp.output["embeddings"]
+            vectors: List[Optional[List[float]]] = [None] * len(texts)
+            for position, item in enumerate(items):
+                index = item.get("index", position)
+                if 0 <= index < len(texts):
+                    vectors[index] = item["embedding"]
+            if all(vector is not None for vector in vectors):
+                projection = None if raw else self.current_projection()
+                return vectors if projection is None else projection.apply_many(vectors).tolist()
+            logger.warning("批量 Embedding 结果不完整，逐条补齐: expected=%d got=%d", len(texts), len(items))
+        except Exception as exc:
+            logger.warning("批量 Embedding 调用失败，逐条补齐: %s", exc)
+        return [self.embed_text(text, raw=raw) for text in texts]
+
     def call_small_json(self, messages: List[Dict[str, str]], fallback: Dict) -> Dict:
         try:
+            self.llm_limiter.acquire()
             resp = self.client.chat.completions.create(
                 model=settings.small_llm_model,
                 messages=messages,
@@ -43,6 +99,7 @@ class ModelService:
 
     def call_small_text(self, messages: List[Dict[str, str]], fallback: str = "") -> str:
         try:
+            self.llm_limiter.acquire()
             resp = self.client.chat.completions.create(
                 model=settings.small_llm_model,
                 messages=messages,
@@ -54,9 +111,10 @@ class ModelService:
             logger.warning("小模型文本调用失败，使用降级结果: %s", exc)
             return fallback
 
-    def stream_main(self, messages: List[Dict[str, str]], model: str = None, max_tokens: int = 1800, temperature: float = 0.4) -> Iterable[str]:
+    def stream_main(self, messages: List[Dict[str, str]], model: str = None, max_tokens: int = 1800, temperature: float = 0.4, cancel: Optional[CancellationToken] = None) -> Iterable[str]:
         model_name = model or settings.llm_model
         try:
+            self.llm_limiter.acquire()
             stream = self.client.chat.completions.create(
                 model=model_name,
                 messages=messages,
@@ -64,7 +122,16 @@ class ModelService:
                 max_tokens=max_tokens,
                 stream=True,
             )
+            emitted = 0
             for chunk in stream:
+                if cancel is not None and cancel.cancelled:
+                    stream.close()
+                    saved = max(0, max_tokens - emitted)
+                    metrics.incr("llm_streams_cancelled", model=model_name)
+                    metrics.incr("llm_tokens_saved", saved, model=model_name)
+                    logger.info("模型流式调用已取消: model=%s emitted=%d saved_tokens=%d reason=%s", model_name, emitted, saved, cancel.reason)
+                    return
+                emitted += 1
                 if not chunk.choices:
                     continue
                 delta = chunk.choices[0].delta
@@ -73,4 +140,4 @@ class ModelService:
                     yield text
         except Exception as exc:
             logger.exception("模型流式调用失败: model=%s error=%s", model_name, exc)
-            yield "\n\n抱歉，模型服务暂时不可用，请稍后重试。"
+            yield STREAM_FAILURE_TEXT
@@ -1,21 +1,71 @@
+import asyncio
 import json
 import logging
+from dataclasses import dataclass, field
 from time import perf_counter
-from typing import AsyncGenerator, List
+from typing import AsyncGenerator, Dict, List, Optional
+from app.core.cancellation import CancellationToken, RequestCancelled
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.streams import ThreadedStream
 from app.repositories.mongo_repo import MongoRepository
 from app.schemas.chat import CaseSlotState, ChatRequest, ChatResponse, Citation, IntentAnalysis, IntentItem
+from app.schemas.events import ChatEvent
+from app.services.answer_cache import AnswerCache, case_slots_empty
+from app.services.context_packer import ContextPacker, PackedContext
 from app.services.conversation_service import ConversationService
 from app.services.guardrail_service import GuardrailService
 from app.services.intent_service import IntentService
+from app.services.law_catalog import default_catalog
 from app.services.memory_service import MemoryService
-from app.services.model_service import ModelService
+from app.services.model_service import STREAM_FAILURE_TEXT, ModelService
 from app.services.retrieval_service import RetrievalService
 
 DISCLAIMER = "\n\n【特别声明】本回答由人工智能系统生成，仅供法律信息参考，不构成正式法律意见。具体案件请咨询具备执业资格的专业律师。"
+USEFUL_EVENTS = {"token", "citations", "citations_final"}
+TRUNCATED_MARKER = "\n\n【回答已中断】连接在回答生成完成前断开，以上为中断前已输出的部分内容。"
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class StreamProgress:
+    trace_id: str = ""
+    started_at: float = 0.0
+    first_useful_ms: Optional[float] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+    stage: str = "request_received"
+    qa_id: str = ""
+    persisted: bool = False
+    answer_parts: List[str] = field(default_factory=list)
+    citations: List[Citation] = field(default_factory=list)
+    analysis: Optional[IntentAnalysis] = None
+    need_human: bool = False
+
+    def observe(self, event: ChatEvent):
+        if event.name == "token":
+            self.answer_parts.append(event.content)
+        elif event.name == "meta":
+            self.qa_id = event.data.get("qa_id", "")
+        elif event.name in {"citations", "citations_final"}:
+            self.citations = event.data.get("citations", [])
+        elif event.name == "intent":
+            self.analysis = event.data
+        elif event.name == "handoff":
+            self.need_human = True
+
+    def response(self, request: ChatRequest) -> ChatResponse:
+        return ChatResponse(
+            conversation_id=request.conversation_id,
+            qa_id=self.qa_id,
+            answer="".join(self.answer_parts),
+            mode=request.mode,
+            need_human=self.need_human,
+            need_clarification=bool(self.analysis and self.analysis.need_clarification),
+            citations=self.citations,
+            intent_analysis=self.analysis,
+        )
+
+
 class QAOrchestrator:
     def __init__(self, mongo: MongoRepository, conversation: ConversationService, model: ModelService, intent: IntentService, retrieval: RetrievalService, memory: MemoryService, guardrail: GuardrailService):
         self.mongo = mongo
@@ -25,18 +75,63 @@ class QAOrchestrator:
         self.retrieval = retrieval
         self.memory = memory
         self.guardrail = guardrail
+        self.packer = ContextPacker()
+        self._background = set()
+        self.answer_cache = AnswerCache(settings.answer_cache_size, settings.answer_cache_ttl_seconds, settings.answer_cache_similarity) if settings.answer_cache_enabled else None
+
+    async def stream_chat(self, request: ChatRequest, cancel: Optional[CancellationToken] = None, progress: Optional[StreamProgress] = None, progressive: bool = True) -> AsyncGenerator[ChatEvent, None]:
+        cancel = cancel or CancellationToken()
+        progress = progress or StreamProgress()
+        events = self._stream_chat(request, cancel, progress, progressive and settings.progressive_citations)
+        try:
+            async for event in events:
+                cancel.raise_if_cancelled()
+                progress.observe(event)
+                if progress.first_useful_ms is None and event.name in USEFUL_EVENTS:
+                    progress.first_useful_ms = (perf_counter() - progress.started_at) * 1000
+                    logger.info("QA_TIMING trace=%s stage=first_useful_content total_ms=%.1f source=%s", progress.trace_id, progress.first_useful_ms, event.name)
+                yield event
+        except RequestCancelled:
+            self._on_cancelled(request, progress, cancel)
+        except (asyncio.CancelledError, GeneratorExit):
+            cancel.cancel("client_disconnect")
+            self._on_cancelled(request, progress, cancel)
+            raise
+        finally:
+            await events.aclose()
 
-    async def stream_chat(self, request: ChatRequest) -> AsyncGenerator[str, None]:
+    def _on_cancelled(self, request: ChatRequest, progress: StreamProgress, cancel: CancellationToken):
+        metrics.incr("requests_cancelled", stage=progress.stage)
+        logger.info("QA_TIMING trace=%s stage=cancelled last_stage=%s reason=%s answer_chars=%d persisted=%s", progress.trace_id, progress.stage, cancel.reason, sum(len(part) for part in progress.answer_parts), progress.persisted)
+        if not progress.qa_id or progress.persisted:
+            return
+        answer = "".join(progress.answer_parts).strip() + TRUNCATED_MARKER
+        try:
+            task = asyncio.get_running_loop().create_task(
+                self.conversation.append_assistant(request.conversation_id, progress.qa_id, answer, request.mode, progress.citations, truncated=True)
+            )
+        except RuntimeError:
+            return
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _stream_chat(self, request: ChatRequest, cancel: CancellationToken, progress: StreamProgress, progressive: bool) -> AsyncGenerator[ChatEvent, None]:
         trace_start = perf_counter()
         last_stage = trace_start
         trace_id = f"{request.conversation_id}:{int(trace_start * 1000)}"
+        progress.trace_id = trace_id
+        progress.started_at = trace_start
 
         def mark(stage: str, **extra):
             nonlocal last_stage
+            progress.stage = stage
+            if stage == "persist_assistant_message":
+                progress.persisted = True
             now = perf_counter()
             delta_ms = (now - last_stage) * 1000
             total_ms = (now - trace_start) * 1000
             last_stage = now
+            progress.timings[stage] = round(progress.timings.get(stage, 0.0) + delta_ms, 1)
             details = " ".join(f"{key}={value}" for key, value in extra.items())
             logger.info("QA_TIMING trace=%s stage=%s delta_ms=%.1f total_ms=%.1f %s", trace_id, stage, delta_ms, total_ms, details)
 
@@ -90,17 +185,18 @@ class QAOrchestrator:
                 query_type="knowledge_qa",
                 matched_scenario="general",
                 intents=[IntentItem(intent_id="I1", intent_name="默认法律知识问答", rewritten_query=request.query)],
+                law_names=default_catalog().match(request.query),
                 slots={},
                 case_slot_state=case_slot_state,
             )
             mark("normal_default_route", query_type=analysis.query_type, intents=len(analysis.intents))
         else:
             yield self._progress("intent", "意图识别中")
-            analysis = self.intent.analyze(request.query, case_slot_state=case_slot_state)
+            analysis = await asyncio.to_thread(self.intent.analyze, request.query, case_slot_state=case_slot_state)
             case_slot_state = await self.mongo.update_case_slot_state(request.conversation_id, analysis.case_slot_state.model_dump())
             analysis.case_slot_state = CaseSlotState(**case_slot_state)
             mark("intent_analysis", query_type=analysis.query_type, intents=len(analysis.intents))
-        yield self._event("intent", analysis.model_dump())
+        yield self._event("intent", analysis)
         if not normal_mode and (analysis.need_human or analysis.query_type == "human_handoff"):
             mark("human_handoff_check", need_human=True, reason=analysis.handoff_reason or "model_route")
             answer = "已为您进入人工客服通道。请继续在当前输入框描述问题，在线客服接入后会通过实时对话回复您。"
@@ -133,7 +229,7 @@ class QAOrchestrator:
             self.memory.write_short(request.conversation_id, qa_id, request.query, answer, [])
             mark("write_short_memory")
             if analysis.query_type == "simple_chat":
-                direct_query_vector = self.model.embed_text(request.query)
+                direct_query_vector = await asyncio.to_thread(self.model.embed_text, request.query)
                 mark("simple_chat_embedding", has_vector=bool(direct_query_vector))
                 self.memory.write_long(
                     request.conversation_id,
@@ -154,25 +250,43 @@ class QAOrchestrator:
             return
 
         yield self._progress("retrieval", "检索相关条款中")
+        filters = self.retrieval.build_filters(request.filters, analysis)
         if normal_mode:
-            retrieval_result = self.retrieval.retrieve_for_query(request.query, top_n=3)
+            top_n, queries, intent_ids = 3, [request.query], None
+            retrieval_task = asyncio.create_task(asyncio.to_thread(self.retrieval.retrieve_for_query, request.query, top_n, filters, "normal", cancel))
         else:
-            plus_top_n = 3 if analysis.query_type == "knowledge_qa" else settings.docs_per_intent
-            retrieval_result = self.retrieval.retrieve_for_analysis(analysis, top_n=plus_top_n)
+            top_n = 3 if analysis.query_type == "knowledge_qa" else settings.docs_per_intent
+            queries = [intent.rewritten_query for intent in analysis.intents]
+            intent_ids = [intent.intent_id or f"I{idx}" for idx, intent in enumerate(analysis.intents, 1)]
+            retrieval_task = asyncio.create_task(asyncio.to_thread(self.retrieval.retrieve_for_analysis, analysis, top_n, filters, "plus", cancel))
+        try:
+            if progressive:
+                try:
+                    provisional = await asyncio.to_thread(self.retrieval.provisional_citations, queries, top_n, filters, intent_ids)
+                except Exception as exc:
+                    logger.warning("词法初筛失败，等待完整检索结果: %s", exc)
+                    provisional = []
+                if provisional and not retrieval_task.done():
+                    mark("provisional_citations", citations=len(provisional))
+                    yield self._event("citations", {"citations": provisional, "provisional": True})
+            retrieval_result = await retrieval_task
+        finally:
+            if not retrieval_task.done():
+                retrieval_task.cancel()
         citations = retrieval_result.citations
-        mark("retrieval_and_rerank", citations=len(citations))
-        yield self._event("citations", {"citations": [c.model_dump() for c in citations]})
+        mark("retrieval_and_rerank", citations=len(citations), filters=",".join(sorted(filters)) or "none", rerank_fallback=",".join(retrieval_result.rerank_fallback_intents) or "none")
+        yield self._event("citations_final" if progressive else "citations", {"citations": citations})
         query_vector = retrieval_result.query_vector
         if query_vector:
             mark("query_embedding_reuse", has_vector=True)
         else:
-            query_vector = self.model.embed_text(request.query)
+            query_vector = await asyncio.to_thread(self.model.embed_text, request.query)
             mark("query_embedding_fallback", has_vector=bool(query_vector))
         yield self._progress("memory", "记忆提取与注入中")
         memory_vector = query_vector
         original_query_vector = None
         if not normal_mode:
-            original_query_vector = self.model.embed_text(request.query)
+            original_query_vector = await asyncio.to_thread(self.model.embed_text, request.query)
             memory_vector = self.memory.build_memory_vector(original_query_vector, retrieval_result.intent_vectors)
             mark(
                 "long_memory_vector_blend",
@@ -191,44 +305,85 @@ class QAOrchestrator:
                 include_long_docs=False,
             )
         mark("memory_context", chars=len(memory_context or ""))
-        follow_up = self._is_follow_up(request.query, memory_context)
-        messages = self._build_generation_messages(request.query, analysis.model_dump(), citations, memory_context, request.mode, follow_up=follow_up)
-        mark("prompt_build", prompt_chars=sum(len(message.get("content", "")) for message in messages))
-        generation_model = settings.small_llm_model if normal_mode else None
-        generation_max_tokens = 900 if normal_mode else 1200
-        mark("generation_config", model=generation_model or "default_plus_model", max_tokens=generation_max_tokens, follow_up=follow_up)
-        yield self._progress("generation", "生成回答中")
-        answer_parts: List[str] = []
-        if not normal_mode:
-            draft_messages = self._build_draft_messages(request.query, analysis.model_dump(), citations, memory_context, follow_up=follow_up)
-            draft_start = perf_counter()
-            draft_first_token = False
-            yield self._progress("draft_generation", "生成简短初答中")
-            for token in self.model.stream_main(draft_messages, model=settings.small_llm_model, max_tokens=350, temperature=0.2):
-                if not draft_first_token:
-                    draft_first_token = True
-                    mark("draft_first_token", first_token_ms=f"{(perf_counter() - draft_start) * 1000:.1f}")
-                answer_parts.append(token)
+        cacheable = bool(self.answer_cache is not None and normal_mode and not memory_context and case_slots_empty(case_slot_state) and citations)
+        cached_answer, cache_tier, index_version = None, "", retrieval_result.index_version
+        if cacheable:
+            cached_answer, cache_tier = self.answer_cache.lookup(request.query, query_vector, citations, index_version, settings.small_llm_model)
+            mark("answer_cache", hit=cached_answer is not None, tier=cache_tier or "none")
+        if cached_answer is not None:
+            yield self._progress("generation", "命中答案缓存")
+            for token in self._chunk(cached_answer):
                 yield self._event("token", {"content": token})
-            mark("draft_generation_complete", answer_chars=sum(len(part) for part in answer_parts))
-            separator = "\n\n---\n\n【补充严谨分析】\n"
-            answer_parts.append(separator)
-            yield self._event("token", {"content": separator})
-            yield self._progress("generation", "答案生成中")
-        generation_start = perf_counter()
-        first_token_sent = False
-        for token in self.model.stream_main(messages, model=generation_model, max_tokens=generation_max_tokens):
-            if not first_token_sent:
-                first_token_sent = True
-                mark("first_token", first_token_ms=f"{(perf_counter() - generation_start) * 1000:.1f}")
-            answer_parts.append(token)
-            yield self._event("token", {"content": token})
-        mark("generation_complete", answer_chars=sum(len(part) for part in answer_parts))
-        answer = "".join(answer_parts).strip()
-        if "【特别声明】" not in answer:
-            answer += DISCLAIMER
-            yield self._event("token", {"content": DISCLAIMER})
-            mark("append_disclaimer")
+            answer = cached_answer
+        else:
+            follow_up = self._is_follow_up(request.query, memory_context)
+            prompt_analysis = "" if normal_mode else json.dumps(self._trim_prompt_analysis(analysis.model_dump()), ensure_ascii=False)
+            packed = self.packer.pack("normal" if normal_mode else "plus", request.query, citations, memory_context, prompt_analysis, follow_up=follow_up)
+            mark("context_pack", **packed.summary())
+            messages = self._build_generation_messages(request.query, packed, request.mode, follow_up=follow_up)
+            mark("prompt_build", prompt_chars=sum(len(message.get("content", "")) for message in messages))
+            generation_model = settings.small_llm_model if normal_mode else None
+            generation_max_tokens = 900 if normal_mode else 1200
+            mark("generation_config", model=generation_model or "default_plus_model", max_tokens=generation_max_tokens, follow_up=follow_up)
+            yield self._progress("generation", "生成回答中")
+            answer_parts: List[str] = []
+            pipelined = settings.generation_pipelined and not normal_mode
+            main_stream = ThreadedStream(lambda: self.model.stream_main(messages, model=generation_model, max_tokens=generation_max_tokens, cancel=cancel), self.model.stream_executor)
+            try:
+                if pipelined:
+                    main_stream.start()
+                    mark("main_generation_started", pipelined=True)
+                if not normal_mode:
+                    draft_packed = self.packer.pack("draft", request.query, citations, memory_context, prompt_analysis, follow_up=follow_up)
+                    mark("draft_context_pack", **draft_packed.summary())
+                    draft_messages = self._build_draft_messages(request.query, draft_packed, follow_up=follow_up)
+                    draft_start = perf_counter()
+                    draft_first_token = False
+                    yield self._progress("draft_generation", "生成简短初答中")
+                    async for token in ThreadedStream(lambda: self.model.stream_main(draft_messages, model=settings.small_llm_model, max_tokens=350, temperature=0.2, cancel=cancel), self.model.stream_executor):
+                        if not draft_first_token:
+                            draft_first_token = True
+                            mark("draft_first_token", first_token_ms=f"{(perf_counter() - draft_start) * 1000:.1f}")
+                        answer_parts.append(token)
+                        yield self._event("token", {"content": token})
+                    cancel.raise_if_cancelled()
+                    mark("draft_generation_complete", answer_chars=sum(len(part) for part in answer_parts), main_buffered=main_stream.buffered)
+                    separator = "\n\n---\n\n【补充严谨分析】\n"
+                    answer_parts.append(separator)
+                    yield self._event("token", {"content": separator})
+                    yield self._progress("generation", "答案生成中")
+                generation_start = perf_counter()
+                first_token_sent = False
+                async for token in main_stream:
+                    if not first_token_sent:
+                        first_token_sent = True
+                        arrival_ms = main_stream.first_item_ms()
+                        mark(
+                            "first_token",
+                            first_token_ms=f"{(perf_counter() - generation_start) * 1000:.1f}",
+                            arrival_ms=f"{arrival_ms:.1f}" if arrival_ms is not None else "none",
+                            buffered=main_stream.buffered + 1,
+                            pipelined=pipelined,
+                        )
+                    answer_parts.append(token)
+                    yield self._event("token", {"content": token})
+                cancel.raise_if_cancelled()
+            except (asyncio.CancelledError, GeneratorExit):
+                cancel.cancel("client_disconnect")
+                raise
+            except Exception:
+                cancel.cancel("generation_failed")
+                raise
+            finally:
+                main_stream.close()
+            mark("generation_complete", answer_chars=sum(len(part) for part in answer_parts))
+            answer = "".join(answer_parts).strip()
+            if "【特别声明】" not in answer:
+                answer += DISCLAIMER
+                yield self._event("token", {"content": DISCLAIMER})
+                mark("append_disclaimer")
+            if cacheable and STREAM_FAILURE_TEXT.strip() not in answer:
+                self.answer_cache.store(request.query, query_vector, citations, answer, index_version, settings.small_llm_model)
         await self.conversation.append_assistant(request.conversation_id, qa_id, answer, request.mode, citations)
         mark("persist_assistant_message", answer_chars=len(answer))
         self.memory.write_short(request.conversation_id, qa_id, request.query, answer, citations)
@@ -255,24 +410,12 @@ class QAOrchestrator:
         yield self._event("done", {"status": "ok"})
 
     async def non_stream_chat(self, request: ChatRequest) -> ChatResponse:
-        answer = []
-        citations = []
-        qa_id = ""
-        async for event in self.stream_chat(request):
-            if event.startswith("event: meta"):
-                data = json.loads(event.split("data: ", 1)[1])
-                qa_id = data["qa_id"]
-            elif event.startswith("event: token"):
-                data = json.loads(event.split("data: ", 1)[1])
-                answer.append(data.get("content", ""))
-            elif event.startswith("event: citations"):
-                data = json.loads(event.split("data: ", 1)[1])
-                citations = [Citation(**c) for c in data.get("citations", [])]
-        return ChatResponse(conversation_id=request.conversation_id, qa_id=qa_id, answer="".join(answer), mode=request.mode, citations=citations)
-
-    def _build_generation_messages(self, query, analysis, citations, memory_context, mode="plus", follow_up=False):
-        context = "\n\n".join([f"[{c.citation_id}]《{c.law_name}》{c.article_id} 来源:{c.filename}\n{c.content}" for c in citations]) or "未检索到可靠法律条文。"
-        prompt_analysis = self._trim_prompt_analysis(analysis)
+        progress = StreamProgress()
+        async for _ in self.stream_chat(request, progress=progress, progressive=False):
+            pass
+        return progress.response(request)
+
+    def _build_generation_messages(self, query, packed: PackedContext, mode="plus", follow_up=False):
         if mode == "normal":
             system = """你是企业公司法咨询助手。请严格基于检索资料回答，不得伪造法条。
 Normal 模式要求回答简洁，结构只使用：
@@ -282,10 +425,10 @@ Normal 模式要求回答简洁，结构只使用：
 {query}
 
 【短期记忆】
-{memory_context or '无'}
+{packed.memory or '无'}
 
 【检索到的法律依据】
-{context}
+{packed.context}
 """
             return [{"role": "system", "content": system}, {"role": "user", "content": user}]
         if follow_up:
@@ -305,19 +448,17 @@ Normal 模式要求回答简洁，结构只使用：
 {query}
 
 【意图识别与槽位】
-{json.dumps(prompt_analysis, ensure_ascii=False)}
+{packed.analysis}
 
 【会话记忆】
-{memory_context or '无'}
+{packed.memory or '无'}
 
 【检索到的法律依据】
-{context}
+{packed.context}
 """
         return [{"role": "system", "content": system}, {"role": "user", "content": user}]
 
-    def _build_draft_messages(self, query, analysis, citations, memory_context, follow_up=False):
-        context = "\n".join([f"[{c.citation_id}]《{c.law_name}》{c.article_id}: {c.content[:180]}" for c in citations[:3]]) or "未检索到可靠法律条文。"
-        prompt_analysis = self._trim_prompt_analysis(analysis)
+    def _build_draft_messages(self, query, packed: PackedContext, follow_up=False):
         instruction = "这是追问问题，请结合会话记忆直接回答当前问题。" if follow_up else "请先给出一个可读的简短初答。"
         system = """你是企业公司法咨询助手。请用 qwen3.6-flash 快速生成简短初答，降低用户等待。
 事实优先级规则：当前【意图识别与槽位】中的 case_slot_state/slots 是用户最新确认或手动修正的案件事实，优先级高于【压缩记忆】。如果槽位与记忆冲突，必须以槽位为准；例如记忆中持股比例为 12%，但当前槽位为 15%，初答必须按 15% 给出判断。
@@ -330,13 +471,13 @@ Normal 模式要求回答简洁，结构只使用：
 {query}
 
 【意图识别与槽位】
-{json.dumps(prompt_analysis, ensure_ascii=False)}
+{packed.analysis}
 
 【压缩记忆】
-{memory_context or '无'}
+{packed.memory or '无'}
 
 【主要依据】
-{context}
+{packed.context}
 """
         return [{"role": "system", "content": system}, {"role": "user", "content": user}]
 
@@ -349,6 +490,9 @@ Normal 模式要求回答简洁，结构只使用：
 
     def _trim_prompt_analysis(self, analysis):
         prompt_analysis = dict(analysis or {})
+        for key in ["direct_answer", "direct_answer_text", "need_human", "handoff_reason"]:
+            prompt_analysis.pop(key, None)
+        prompt_analysis = {key: value for key, value in prompt_analysis.items() if value not in (None, "", [], {})}
         case_slot_state = (prompt_analysis.get("case_slot_state") or {}).copy()
         if not case_slot_state:
             return prompt_analysis
@@ -367,7 +511,7 @@ Normal 模式要求回答简洁，结构只使用：
         return any(value not in (None, "", [], {}) for value in (slot_values or {}).values())
 
     def _event(self, name, data):
-        return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        return ChatEvent(name, data)
 
     def _progress(self, stage, message):
         return self._event("progress", {"stage": stage, "message": message})
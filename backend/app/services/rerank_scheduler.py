@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from time import monotonic
+from typing import Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Pair = Tuple[str, str]
+
+
+@dataclass
+class _RerankJob:
+    pairs: List[Pair]
+    future: Future = field(default_factory=Future)
+    scores: List[Optional[float]] = field(default_factory=list)
+
+
+class RerankScheduler:
+    def __init__(self, score_fn: Callable[[List[Pair]], List[float]], window_ms: float = 10, max_batch_pairs: int = 64, bucket_chars: int = 64, max_length: int = 512, min_batch_pairs: int = 8):
+        self.score_fn = score_fn
+        self.window = window_ms / 1000
+        self.max_batch_pairs = max(1, max_batch_pairs)
+        self.min_batch_pairs = max(1, min_batch_pairs)
+        self.bucket_chars = max(1, bucket_chars)
+        self.max_length = max_length
+        self.queue: "queue.Queue[_RerankJob]" = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="rerank-scheduler", daemon=True)
+        self.thread.start()
+
+    def submit(self, pairs: List[Pair]) -> Future:
+        job = _RerankJob(pairs=list(pairs), scores=[None] * len(pairs))
+        if not job.pairs:
+            job.future.set_result([])
+        else:
+            self.queue.put(job)
+        return job.future
+
+    def score(self, pairs: List[Pair], timeout: float = None) -> List[float]:
+        return self.submit(pairs).result(timeout=timeout)
+
+    async def score_async(self, pairs: List[Pair]) -> List[float]:
+        return await asyncio.wrap_future(self.submit(pairs))
+
+    def _run(self):
+        while True:
+            pending = [self.queue.get()]
+            total = len(pending[0].pairs)
+            deadline = monotonic() + self.window
+            while total < self.max_batch_pairs:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    job = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                pending.append(job)
+                total += len(job.pairs)
+            self._dispatch(pending)
+
+    def _dispatch(self, jobs: List[_RerankJob]):
+        entries = []
+        for job in jobs:
+            for idx, pair in enumerate(job.pairs):
+                entries.append((self._length(pair), job, idx))
+        entries.sort(key=lambda x: x[0])
+        failed = {}
+        for batch in self._batches(entries):
+            pairs = [job.pairs[idx] for _, job, idx in batch]
+            try:
+                scores = self.score_fn(pairs)
+            except Exception as exc:
+                logger.warning("Rerank 批处理失败: pairs=%d error=%s", len(pairs), exc)
+                for _, job, _ in batch:
+                    failed[id(job)] = exc
+                continue
+            for (_, job, idx), score in zip(batch, scores):
+                job.scores[idx] = float(score)
+        logger.debug("Rerank 批处理完成: jobs=%d pairs=%d", len(jobs), len(entries))
+        for job in jobs:
+            if id(job) in failed:
+                job.future.set_exception(failed[id(job)])
+            else:
+                job.future.set_result(job.scores)
+
+    def _batches(self, entries):
+        batch = []
+        for entry in entries:
+            spread = entry[0] - batch[0][0] if batch else 0
+            if len(batch) >= self.max_batch_pairs or (spread > self.bucket_chars and len(batch) >= self.min_batch_pairs):
+                yield batch
+                batch = []
+            batch.append(entry)
+        if batch:
+            yield batch
+
+    def _length(self, pair: Pair) -> int:
+        return min(len(pair[0]) + len(pair[1]), self.max_length)
@@ -1,12 +1,64 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import Dict, List
+from time import monotonic
+from typing import Dict, List, Optional, Tuple
 from importlib import import_module
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+from app.core.cache import TTLCache, query_hash
+from app.core.cancellation import CancellationToken, RequestCancelled
 from app.core.config import settings
+from app.core.rate_limit import RateLimiter
+from app.services.rerank_scheduler import RerankScheduler
 
 logger = logging.getLogger(__name__)
 
+ONNX_MODEL_FILE = "model.int8.onnx"
+CANCEL_POLL_SECONDS = 0.05
+
+
+class TorchCrossEncoder:
+    backend = "torch"
+
+    def __init__(self, model_path: str):
+        self.torch = import_module("torch")
+        transformers = import_module("transformers")
+        self.tokenizer = transformers.AutoTokenizer.from_pretrained(model_path)
+        self.model = transformers.AutoModelForSequenceClassification.from_pretrained(model_path)
+        self.model.eval()
+        self.device = "cuda" if self.torch.cuda.is_available() else "cpu"
+        self.model.to(self.device)
+
+    def score(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        with self.torch.no_grad():
+            inputs = self.tokenizer(pairs, padding=True, truncation=True, return_tensors="pt", max_length=settings.rerank_max_length)
+            inputs = {k: v.to(self.device) for k, v in inputs.items()}
+            return self.model(**inputs).logits.reshape(-1).tolist()
+
+
+class OnnxCrossEncoder:
+    backend = "onnx"
+    device = "cpu"
+
+    def __init__(self, model_dir: str, threads: int = 4):
+        ort = import_module("onnxruntime")
+        transformers = import_module("transformers")
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.tokenizer = transformers.AutoTokenizer.from_pretrained(model_dir)
+        self.session = ort.InferenceSession(str(Path(model_dir) / ONNX_MODEL_FILE), options, providers=["CPUExecutionProvider"])
+        self.input_names = [item.name for item in self.session.get_inputs()]
+
+    def score(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        inputs = self.tokenizer(pairs, padding=True, truncation=True, return_tensors="np", max_length=settings.rerank_max_length)
+        feeds = {name: inputs[name].astype(np.int64) for name in self.input_names if name in inputs}
+        logits = self.session.run(None, feeds)[0]
+        return logits.reshape(-1).tolist()
+
 
 class Reranker:
     def __init__(self):
@@ -14,6 +66,14 @@ class Reranker:
         self.device = "cpu"
         self.tokenizer = None
         self.model = None
+        self.scheduler = None
+        self.cache = TTLCache(settings.rerank_cache_size, settings.rerank_cache_ttl_seconds) if settings.rerank_cache_enabled else None
+        self.executor = ThreadPoolExecutor(max_workers=settings.rerank_pool_size, thread_name_prefix="rerank")
+        self.session = requests.Session()
+        self.limiter = RateLimiter("rerank", settings.rerank_rate_limit_rps, settings.rerank_rate_limit_burst)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.rerank_pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
         if not settings.rerank_enabled:
             logger.info("Rerank 已关闭，使用 RRF 结果")
             return
@@ -28,49 +88,137 @@ class Reranker:
         if self.provider == "none":
             logger.info("Rerank provider=none，使用 RRF 结果")
             return
-        model_path = Path(settings.rerank_model_path)
-        if not model_path.exists():
-            logger.info("Rerank 模型目录不存在，降级使用 RRF: %s", model_path)
-            return
+        backend = settings.rerank_backend.lower()
         try:
-            torch = import_module("torch")
-            transformers = import_module("transformers")
-            self.torch = torch
-            self.tokenizer = transformers.AutoTokenizer.from_pretrained(str(model_path))
-            self.model = transformers.AutoModelForSequenceClassification.from_pretrained(str(model_path))
-            self.model.eval()
-            self.device = "cuda" if torch.cuda.is_available() else "cpu"
-            self.model.to(self.device)
+            if backend == "onnx" and Path(settings.rerank_onnx_path, ONNX_MODEL_FILE).exists():
+                self.model = OnnxCrossEncoder(settings.rerank_onnx_path, threads=settings.rerank_onnx_threads)
+            else:
+                if backend == "onnx":
+                    logger.warning("ONNX Rerank 模型不存在，回退 PyTorch: %s", settings.rerank_onnx_path)
+                model_path = Path(settings.rerank_model_path)
+                if not model_path.exists():
+                    logger.info("Rerank 模型目录不存在，降级使用 RRF: %s", model_path)
+                    return
+                self.model = TorchCrossEncoder(str(model_path))
+            self.tokenizer = self.model.tokenizer
+            self.device = self.model.device
             self.available = True
-            logger.info("Rerank 模型加载成功: %s", model_path)
+            if settings.rerank_batching_enabled:
+                self.scheduler = RerankScheduler(
+                    self.model.score,
+                    window_ms=settings.rerank_batch_window_ms,
+                    max_batch_pairs=settings.rerank_max_batch_pairs,
+                    bucket_chars=settings.rerank_bucket_chars,
+                    max_length=settings.rerank_max_length,
+                )
+            logger.info("Rerank 模型加载成功: backend=%s device=%s batching=%s", self.model.backend, self.device, bool(self.scheduler))
         except Exception as exc:
             logger.warning("Rerank 模型加载失败，降级使用 RRF: %s", exc)
 
-    def rerank(self, query: str, docs: List[Dict], top_n: int) -> List[Dict]:
+    def rerank(self, query: str, docs: List[Dict], top_n: int, index_version: str = "") -> Tuple[List[Dict], bool]:
         if not self.available or not docs:
-            return docs[:top_n]
-        if self.provider == "dashscope":
-            return self._rerank_dashscope(query, docs, top_n)
-        pairs = [(query, doc.get("content", "")) for doc in docs]
-        with self.torch.no_grad():
-            inputs = self.tokenizer(pairs, padding=True, truncation=True, return_tensors="pt", max_length=512)
-            inputs = {k: v.to(self.device) for k, v in inputs.items()}
-            scores = self.model(**inputs).logits.reshape(-1).tolist()
-        reranked = []
+            return docs[:top_n], False
+        scores = self._cached_scores(query, docs, index_version)
+        missing = [idx for idx, score in enumerate(scores) if score is None]
+        if missing:
+            missing_docs = [docs[idx] for idx in missing]
+            if self.provider == "dashscope":
+                fresh = self._score_dashscope(query, missing_docs)
+            else:
+                fresh = self._score_local(query, missing_docs)
+            if fresh is not None:
+                for idx, score in zip(missing, fresh):
+                    scores[idx] = score
+                self._store_scores(query, missing_docs, fresh, index_version)
+        channel = "dashscope_rerank" if self.provider == "dashscope" else "rerank"
+        reranked, unscored = [], []
         for doc, score in zip(docs, scores):
+            if score is None:
+                unscored.append(doc)
+                continue
             item = doc.copy()
             item["score"] = float(score)
-            item["channel"] = "rerank"
+            item["channel"] = channel
             reranked.append(item)
+        if not reranked:
+            return docs[:top_n], True
         reranked.sort(key=lambda x: x["score"], reverse=True)
-        return reranked[:top_n]
+        if unscored:
+            logger.warning("Rerank 部分降级: provider=%s input=%d scored=%d unscored=%d，未打分条文按 RRF 顺序追加", self.provider, len(docs), len(reranked), len(unscored))
+            return (reranked + unscored)[:top_n], True
+        logger.info("Rerank 完成: provider=%s input=%d scored=%d cache_hits=%d", self.provider, len(docs), len(missing), len(docs) - len(missing))
+        return reranked[:top_n], False
+
+    def rerank_many(self, jobs: List[Tuple[str, List[Dict], int]], index_version: str = "", deadline: float = None, cancel: Optional[CancellationToken] = None) -> Tuple[List[List[Dict]], List[int]]:
+        if not self.available:
+            return [docs[:top_n] for _, docs, top_n in jobs], []
+        if deadline is None:
+            deadline = settings.rerank_deadline_seconds if self.provider == "dashscope" else settings.rerank_local_deadline_seconds
+        futures = [self.executor.submit(self.rerank, query, docs, top_n, index_version) for query, docs, top_n in jobs]
+        done = self._wait(futures, deadline, cancel)
+        results = []
+        fallback = []
+        timed_out = []
+        for idx, (future, (_, docs, top_n)) in enumerate(zip(futures, jobs)):
+            if future in done and future.exception() is None:
+                reranked, degraded = future.result()
+                results.append(reranked)
+                if degraded:
+                    fallback.append(idx)
+                continue
+            future.cancel()
+            results.append(docs[:top_n])
+            fallback.append(idx)
+            if future not in done:
+                timed_out.append(idx)
+        if fallback:
+            logger.warning("Rerank 降级使用 RRF: deadline=%.2fs fallback=%s timed_out=%s total=%d", deadline, fallback, timed_out, len(jobs))
+        return results, fallback
+
+    def _wait(self, futures, deadline: float, cancel: Optional[CancellationToken]):
+        if cancel is None:
+            return wait(futures, timeout=deadline if deadline > 0 else None)[0]
+        stop = monotonic() + deadline if deadline > 0 else None
+        while True:
+            timeout = CANCEL_POLL_SECONDS if stop is None else max(0.0, min(CANCEL_POLL_SECONDS, stop - monotonic()))
+            done, pending = wait(futures, timeout=timeout)
+            if cancel.cancelled:
+                for future in pending:
+                    future.cancel()
+                raise RequestCancelled(cancel.reason)
+            if not pending or (stop is not None and monotonic() >= stop):
+                return done
+
+    def _cached_scores(self, query: str, docs: List[Dict], index_version: str) -> List[Optional[float]]:
+        if self.cache is None:
+            return [None] * len(docs)
+        self.cache.ensure_version(index_version)
+        qhash = query_hash(query)
+        return [self.cache.get((qhash, doc["id"])) if doc.get("id") else None for doc in docs]
+
+    def _store_scores(self, query: str, docs: List[Dict], scores: List[Optional[float]], index_version: str):
+        if self.cache is None or self.cache.version != index_version:
+            return
+        qhash = query_hash(query)
+        for doc, score in zip(docs, scores):
+            if doc.get("id") and score is not None:
+                self.cache.set((qhash, doc["id"]), float(score))
+
+    def _score_local(self, query: str, docs: List[Dict]) -> Optional[List[float]]:
+        pairs = [(query, doc.get("content", "")) for doc in docs]
+        try:
+            return self.scheduler.score(pairs) if self.scheduler else self.model.score(pairs)
+        except Exception as exc:
+            logger.warning("本地 Rerank 异常，降级使用 RRF: %s", exc)
+            return None
 
-    def _rerank_dashscope(self, query: str, docs: List[Dict], top_n: int) -> List[Dict]:
+    def _score_dashscope(self, query: str, docs: List[Dict]) -> Optional[List[Optional[float]]]:
         documents = [doc.get("content", "") for doc in docs]
         if not any(documents):
-            return docs[:top_n]
+            return None
         try:
-            response = requests.post(
+            self.limiter.acquire()
+            response = self.session.post(
                 settings.rerank_endpoint,
                 headers={
                     "Authorization": f"Bearer {settings.dashscope_api_key}",
@@ -80,17 +228,17 @@ class Reranker:
                     "model": settings.rerank_model_name,
                     "query": query,
                     "documents": documents,
-                    "top_n": min(top_n, len(documents)),
+                    "top_n": len(documents),
                     "return_documents": False,
                 },
-                timeout=30,
+                timeout=settings.rerank_timeout_seconds,
             )
             if response.status_code != 200:
                 logger.warning("DashScope Rerank 调用失败，降级使用 RRF: %s %s", response.status_code, response.text[:300])
-                return docs[:top_n]
+                return None
             data = response.json()
             results = data.get("results") or data.get("output", {}).get("results") or []
-            reranked = []
+            scores: List[Optional[float]] = [None] * len(docs)
             for item in results:
                 index = item.get("index")
                 if index is None:
@@ -98,16 +246,12 @@ class Reranker:
                 if index is None or not 0 <= int(index) < len(docs):
                     continue
                 score = item.get("relevance_score", item.get("score", item.get("document", {}).get("score", 0.0)))
-                doc = docs[int(index)].copy()
-                doc["score"] = float(score or 0.0)
-                doc["channel"] = "dashscope_rerank"
-                reranked.append(doc)
-            if not reranked:
+                scores[int(index)] = float(score or 0.0)
+            if all(score is None for score in scores):
                 logger.warning("DashScope Rerank 响应为空，降级使用 RRF")
-                return docs[:top_n]
-            reranked.sort(key=lambda x: x["score"], reverse=True)
-            logger.info("DashScope Rerank 成功: model=%s input=%d output=%d", settings.rerank_model_name, len(docs), len(reranked[:top_n]))
-            return reranked[:top_n]
+                return None
+            logger.info("DashScope Rerank 成功: model=%s input=%d", settings.rerank_model_name, len(docs))
+            return scores
         except Exception as exc:
             logger.warning("DashScope Rerank 异常，降级使用 RRF: %s", exc)
-            return docs[:top_n]
+            return None
@@ -1,14 +1,24 @@
 import logging
+import random
 import re
+import threading
 from collections import defaultdict
 from dataclasses import dataclass, field
+from time import monotonic
 from typing import Dict, List, Optional, Tuple
+import numpy as np
 from cn2an import an2cn
+from app.core.cache import TTLCache, query_hash
+from app.core.cancellation import CancellationToken, check_cancelled
 from app.core.config import settings
-from app.repositories.es_repo import ElasticsearchRepository
-from app.schemas.chat import Citation, IntentAnalysis
+from app.core.metrics import metrics
+from app.repositories.document_store import DocumentStore
+from app.repositories.es_repo import DOC_FIELDS, ElasticsearchRepository, Filters
+from app.repositories.memory_repo import InMemoryRetrievalRepository
+from app.schemas.chat import Citation, IntentAnalysis, RetrievalFilters
 from app.services.model_service import ModelService
 from app.services.reranker import Reranker
+from app.services.rule_index import RuleIndex
 
 logger = logging.getLogger(__name__)
 
@@ -20,52 +30,150 @@ class RetrievalResult:
     intent_vectors: List[List[float]] = field(default_factory=list)
     intent_queries: List[str] = field(default_factory=list)
     intent_names: List[str] = field(default_factory=list)
+    rerank_fallback_intents: List[str] = field(default_factory=list)
+    index_version: str = ""
 
 
 class RetrievalService:
     def __init__(self, model_service: ModelService):
         self.model = model_service
-        self.es = ElasticsearchRepository()
+        self.es = InMemoryRetrievalRepository.load() if settings.retrieval_backend.lower() == "memory" else ElasticsearchRepository()
         self.reranker = Reranker()
+        self.documents = DocumentStore(self.es)
+        self.result_cache = TTLCache(settings.retrieval_cache_size, settings.retrieval_cache_ttl_seconds) if settings.retrieval_cache_enabled else None
+        self.rule_index: Optional[RuleIndex] = None
+        self._local_index_lock = threading.Lock()
+        self._local_index_retry_at = 0.0
+        self._refresh_local_indexes()
 
-    def retrieve_for_analysis(self, analysis: IntentAnalysis, top_n: int = None) -> RetrievalResult:
+    def build_filters(self, filters: Optional[RetrievalFilters] = None, analysis: Optional[IntentAnalysis] = None) -> Dict[str, List[str]]:
+        result = {name: list(values) for name, values in (filters.model_dump() if filters else {}).items() if values}
+        if "law_name" not in result and analysis is not None and analysis.law_names:
+            result["law_name"] = list(analysis.law_names)
+        return result
+
+    def retrieve_for_analysis(self, analysis: IntentAnalysis, top_n: int = None, filters: Filters = None, mode: str = "plus", cancel: Optional[CancellationToken] = None) -> RetrievalResult:
         docs = []
-        primary_query_vector = None
-        intent_vectors = []
-        intent_queries = []
-        intent_names = []
         intents = analysis.intents or []
         top_n = top_n or settings.docs_per_intent
-        for idx, intent in enumerate(intents, 1):
-            query = intent.rewritten_query
-            per_intent_docs, query_vector = self.retrieve_one(query, top_k=settings.fusion_top_k, top_n=top_n)
-            if primary_query_vector is None:
-                primary_query_vector = query_vector
-            if query_vector:
-                intent_vectors.append(query_vector)
-            intent_queries.append(query)
-            intent_names.append(intent.intent_name)
+        queries = [intent.rewritten_query for intent in intents]
+        reranked_sets, vectors, fallback, version = self._retrieve_many([(query, top_n) for query in queries], settings.fusion_top_k, filters, mode, cancel)
+        for idx, (intent, per_intent_docs) in enumerate(zip(intents, reranked_sets), 1):
             for doc in per_intent_docs:
                 doc["intent_id"] = intent.intent_id or f"I{idx}"
             docs.extend(per_intent_docs)
+        intent_vectors = [vector for vector in vectors if vector]
         return RetrievalResult(
             citations=self._dedupe_to_citations(docs),
-            query_vector=primary_query_vector,
+            query_vector=vectors[0] if vectors else None,
             intent_vectors=intent_vectors,
-            intent_queries=intent_queries,
-            intent_names=intent_names,
+            intent_queries=queries,
+            intent_names=[intent.intent_name for intent in intents],
+            rerank_fallback_intents=[intents[idx].intent_id or f"I{idx + 1}" for idx in fallback],
+            index_version=version,
+        )
+
+    def retrieve_for_query(self, query: str, top_n: int, filters: Filters = None, mode: str = "normal", cancel: Optional[CancellationToken] = None) -> RetrievalResult:
+        reranked_sets, vectors, fallback, version = self._retrieve_many([(query, top_n)], settings.fusion_top_k, filters, mode, cancel)
+        return RetrievalResult(
+            citations=self._dedupe_to_citations(reranked_sets[0]),
+            query_vector=vectors[0],
+            rerank_fallback_intents=["I1"] if fallback else [],
+            index_version=version,
+        )
+
+    def provisional_citations(self, queries: List[str], top_n: int, filters: Filters = None, intent_ids: Optional[List[str]] = None) -> List[Citation]:
+        top_k = settings.fusion_top_k
+        ids_only = settings.retrieval_ids_only and self._refresh_local_indexes()
+        docs = []
+        for idx, query in enumerate(queries):
+            bm25 = self.es.search_bm25(query, top_k=top_k, ids_only=ids_only, filters=filters)
+            rule = self._rule_search(query, top_k=top_k, filters=filters)
+            fused = self._rrf([bm25, rule], top_k=top_n)
+            for doc in self.documents.hydrate(fused) if ids_only else fused:
+                if intent_ids:
+                    doc["intent_id"] = intent_ids[idx]
+                docs.append(doc)
+        logger.info("词法初筛完成: queries=%d docs=%d filters=%s", len(queries), len(docs), filters or {})
+        return self._dedupe_to_citations(docs)
+
+    def cache_stats(self) -> Dict:
+        stats = self.result_cache.stats() if self.result_cache is not None else {"enabled": False}
+        for mode in ("normal", "plus"):
+            stats[mode] = {
+                "hits": metrics.get("retrieval_cache_hits", mode=mode),
+                "misses": metrics.get("retrieval_cache_misses", mode=mode),
+                "hit_rate": metrics.ratio("retrieval_cache_hits", "retrieval_cache_misses", mode=mode),
+            }
+        return stats
+
+    def _retrieve_many(self, jobs: List[Tuple[str, int]], top_k: int, filters: Filters, mode: str, cancel: Optional[CancellationToken] = None) -> Tuple[List[List[Dict]], List[Optional[List[float]]], List[int], str]:
+        version = self.es.index_version()
+        results: List[List[Dict]] = [[] for _ in jobs]
+        vectors: List[Optional[List[float]]] = [None] * len(jobs)
+        misses = []
+        for idx, (query, top_n) in enumerate(jobs):
+            cached = self._cache_get(query, top_k, top_n, filters, version)
+            metrics.incr("retrieval_cache_hits" if cached else "retrieval_cache_misses", mode=mode)
+            if cached:
+                results[idx], vectors[idx] = cached
+            else:
+                misses.append(idx)
+        if not misses:
+            logger.info("检索结果缓存命中: mode=%s queries=%d", mode, len(jobs))
+            return results, vectors, [], version
+        fused_sets = []
+        for idx in misses:
+            check_cancelled(cancel)
+            fused, vectors[idx] = self._fuse(jobs[idx][0], top_k=top_k, filters=filters, cancel=cancel)
+            fused_sets.append(fused)
+        check_cancelled(cancel)
+        reranked_sets, fallback = self.reranker.rerank_many(
+            [(jobs[idx][0], fused, jobs[idx][1]) for idx, fused in zip(misses, fused_sets)],
+            index_version=version,
+            cancel=cancel,
         )
+        for pos, idx in enumerate(misses):
+            results[idx] = reranked_sets[pos]
+            if pos not in fallback:
+                self._cache_set(jobs[idx][0], top_k, jobs[idx][1], filters, version, reranked_sets[pos], vectors[idx])
+        return results, vectors, [misses[pos] for pos in fallback], version
+
+    def _cache_key(self, query: str, top_k: int, top_n: int, filters: Filters) -> tuple:
+        filter_key = tuple((name, tuple(sorted(values))) for name, values in sorted((filters or {}).items()) if values)
+        return query_hash(query), top_k, top_n, filter_key
+
+    def _cache_get(self, query: str, top_k: int, top_n: int, filters: Filters, version: str) -> Optional[Tuple[List[Dict], Optional[List[float]]]]:
+        if self.result_cache is None or not version:
+            return None
+        self.result_cache.ensure_version(version)
+        entry = self.result_cache.get(self._cache_key(query, top_k, top_n, filters))
+        if entry is None:
+            return None
+        ids, scores, channels, vector = entry
+        docs = self.documents.hydrate([{"id": doc_id, "score": float(score), "channel": channel} for doc_id, score, channel in zip(ids, scores, channels)])
+        if len(docs) != len(ids):
+            return None
+        return docs, vector.tolist() if vector is not None else None
 
-    def retrieve_for_query(self, query: str, top_n: int) -> RetrievalResult:
-        docs, query_vector = self.retrieve_one(query, top_k=settings.fusion_top_k, top_n=top_n)
-        return RetrievalResult(citations=self._dedupe_to_citations(docs), query_vector=query_vector)
+    def _cache_set(self, query: str, top_k: int, top_n: int, filters: Filters, version: str, docs: List[Dict], vector: Optional[List[float]]):
+        if self.result_cache is None or not version or self.result_cache.version != version or any(not doc.get("id") for doc in docs):
+            return
+        self.documents.remember(docs, DOC_FIELDS)
+        entry = (
+            tuple(doc["id"] for doc in docs),
+            np.asarray([doc.get("score") or 0.0 for doc in docs], dtype=np.float32),
+            tuple(doc.get("channel", "") for doc in docs),
+            np.asarray(vector, dtype=np.float32) if vector else None,
+        )
+        self.result_cache.set(self._cache_key(query, top_k, top_n, filters), entry)
 
-    def retrieve_rrf_only(self, query: str, top_k: int = None, top_n: int = 3) -> Tuple[List[Dict], Optional[List[float]]]:
+    def retrieve_rrf_only(self, query: str, top_k: int = None, top_n: int = 3, filters: Filters = None) -> Tuple[List[Dict], Optional[List[float]]]:
         top_k = top_k or settings.fusion_top_k
         embedding = self.model.embed_text(query)
-        dense = self.es.search_knn(embedding, top_k=top_k)
-        bm25 = self.es.search_bm25(query, top_k=top_k)
-        rule = self._rule_search(query, top_k=top_k)
+        dense = self.es.search_knn(embedding, top_k=top_k, filters=filters)
+        bm25 = self.es.search_bm25(query, top_k=top_k, filters=filters)
+        rule = self._rule_search(query, top_k=top_k, filters=filters)
         fused = self._rrf([dense, bm25, rule], top_k=top_k)
         logger.info(
             "Normal RRF 检索完成: query=%s dense=%d bm25=%d rule=%d fused=%d output=%d",
@@ -78,27 +186,85 @@ class RetrievalService:
         )
         return fused[:top_n], embedding
 
-    def retrieve_one(self, query: str, top_k: int = None, top_n: int = None) -> Tuple[List[Dict], Optional[List[float]]]:
-        top_k = top_k or settings.fusion_top_k
+    def retrieve_one(self, query: str, top_k: int = None, top_n: int = None, filters: Filters = None, mode: str = "normal") -> Tuple[List[Dict], Optional[List[float]]]:
         top_n = top_n or settings.rerank_top_n
+        reranked_sets, vectors, _, _ = self._retrieve_many([(query, top_n)], top_k or settings.fusion_top_k, filters, mode)
+        logger.info("Rerank 完成: query=%s output=%d", query[:40], len(reranked_sets[0]))
+        return reranked_sets[0], vectors[0]
+
+    def _fuse(self, query: str, top_k: int = None, fusion: str = None, filters: Filters = None, cancel: Optional[CancellationToken] = None) -> Tuple[List[Dict], Optional[List[float]]]:
+        top_k = top_k or settings.fusion_top_k
+        fusion = (fusion or settings.retrieval_fusion).lower()
+        local_ready = self._refresh_local_indexes()
+        ids_only = settings.retrieval_ids_only and local_ready
         embedding = self.model.embed_text(query)
-        dense = self.es.search_knn(embedding, top_k=top_k)
-        bm25 = self.es.search_bm25(query, top_k=top_k)
-        rule = self._rule_search(query, top_k=top_k)
+        check_cancelled(cancel)
+        fused = None
+        if fusion == "server" and self.rule_index is not None:
+            fused = self._fuse_server(query, embedding, top_k, ids_only, filters)
+            if fused is not None and random.random() < settings.hybrid_parity_sample_rate:
+                self._log_parity(query, fused, self._fuse_python(query, embedding, top_k, ids_only, filters))
+        if fused is None:
+            fused = self._fuse_python(query, embedding, top_k, ids_only, filters)
+        if ids_only:
+            fused = self.documents.hydrate(fused)
+        return fused, embedding
+
+    def _fuse_python(self, query: str, embedding: Optional[List[float]], top_k: int, ids_only: bool, filters: Filters = None) -> List[Dict]:
+        dense = self.es.search_knn(embedding, top_k=top_k, ids_only=ids_only, filters=filters)
+        bm25 = self.es.search_bm25(query, top_k=top_k, ids_only=ids_only, filters=filters)
+        rule = self._rule_search(query, top_k=top_k, filters=filters)
         fused = self._rrf([dense, bm25, rule], top_k=top_k)
-        logger.info("检索粗排完成: query=%s dense=%d bm25=%d rule=%d fused=%d", query[:40], len(dense), len(bm25), len(rule), len(fused))
-        reranked = self.reranker.rerank(query, fused, top_n=top_n)
-        logger.info("Rerank 完成: query=%s output=%d", query[:40], len(reranked))
-        return reranked, embedding
+        logger.info("检索粗排完成: query=%s dense=%d bm25=%d rule=%d fused=%d ids_only=%s filters=%s", query[:40], len(dense), len(bm25), len(rule), len(fused), ids_only, filters or {})
+        return fused
+
+    def _fuse_server(self, query: str, embedding: Optional[List[float]], top_k: int, ids_only: bool, filters: Filters = None) -> Optional[List[Dict]]:
+        rule = self._rule_search(query, top_k=top_k, filters=filters)
+        hits = self.es.search_hybrid(embedding, query, rule_ids=[doc["id"] for doc in rule], top_k=top_k, ids_only=ids_only, filters=filters)
+        if hits is None:
+            return None
+        fused = []
+        for hit in hits[:top_k]:
+            item = hit.copy()
+            item["channel"] = "rrf"
+            fused.append(item)
+        logger.info("服务端混合检索完成: query=%s rule=%d fused=%d ids_only=%s", query[:40], len(rule), len(fused), ids_only)
+        return fused
+
+    def _log_parity(self, query: str, server: List[Dict], python: List[Dict]):
+        server_ids = [doc.get("id") for doc in server]
+        python_ids = [doc.get("id") for doc in python]
+        overlap = len(set(server_ids) & set(python_ids)) / max(1, len(python_ids))
+        logger.info("混合检索一致性: query=%s overlap=%.2f top1_match=%s", query[:40], overlap, server_ids[:1] == python_ids[:1])
+
+    def _refresh_local_indexes(self) -> bool:
+        version = self.es.index_version()
+        if self.documents.version == version:
+            return True
+        if monotonic() < self._local_index_retry_at:
+            return self.rule_index is not None
+        with self._local_index_lock:
+            if self.documents.version == version:
+                return True
+            try:
+                self.documents.load(version)
+                self.rule_index = RuleIndex(self.documents.docs.values(), version=version)
+                return True
+            except Exception as exc:
+                self._local_index_retry_at = monotonic() + 30
+                logger.warning("本地文档库/规则索引加载失败，检索回退为 ES 全字段查询: %s", exc)
+                return False
 
-    def _rule_search(self, query: str, top_k: int) -> List[Dict]:
+    def _rule_search(self, query: str, top_k: int, filters: Filters = None) -> List[Dict]:
+        if self.rule_index is not None:
+            return self.rule_index.search(query, top_k=top_k, filters=filters)
         results = []
         article = self._extract_article(query)
         if article:
-            results.extend(self.es.search_rule_article(article, top_k=top_k))
+            results.extend(self.es.search_rule_article(article, top_k=top_k, filters=filters))
         chapter = self._extract_chapter(query)
         if chapter:
-            results.extend(self.es.search_rule_chapter(chapter, top_k=top_k))
+            results.extend(self.es.search_rule_chapter(chapter, top_k=top_k, filters=filters))
         return results
 
     def _extract_article(self, query: str):
@@ -146,6 +312,7 @@ class RetrievalService:
             seen.add(key)
             citations.append(Citation(
                 citation_id=str(len(citations) + 1),
+                doc_id=doc.get("id") or "",
                 law_name=doc.get("law_name") or "中华人民共和国公司法",
                 article_id=doc.get("article_id") or "",
                 content=doc.get("content") or "",
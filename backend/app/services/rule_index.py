@@ -0,0 +1,97 @@
+import logging
+import re
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+from cn2an import cn2an
+from app.repositories.es_repo import FILTER_FIELDS, Filters
+
+logger = logging.getLogger(__name__)
+
+NUM = r"[\d一二三四五六七八九十百千万零两]+"
+LIST_SEP = r"、|,|，|和|及|与|以及"
+RANGE_SEP = r"至|到|~|～|-|—|－"
+MAX_RANGE = 50
+
+
+def _span_re(unit: str):
+    return re.compile(rf"第\s*{NUM}(?:\s*{unit}?\s*(?:{LIST_SEP}|{RANGE_SEP})\s*第?\s*{NUM})*\s*{unit}")
+
+
+ARTICLE_SPAN_RE = _span_re("条")
+CHAPTER_SPAN_RE = _span_re("章")
+TOKEN_RE = re.compile(rf"({NUM})|({RANGE_SEP})")
+
+
+def to_number(raw: str) -> Optional[int]:
+    raw = (raw or "").strip()
+    if not raw:
+        return None
+    if raw.isdigit():
+        return int(raw)
+    try:
+        return int(cn2an(raw.replace("两", "二"), "smart"))
+    except Exception:
+        return None
+
+
+def parse_numbers(query: str, span_re) -> List[int]:
+    numbers: List[int] = []
+    for span in span_re.finditer(query or ""):
+        pending_range = False
+        for num, range_sep in TOKEN_RE.findall(span.group(0)):
+            if range_sep:
+                pending_range = bool(numbers)
+                continue
+            value = to_number(num)
+            if value is None:
+                continue
+            if pending_range and value > numbers[-1] and value - numbers[-1] <= MAX_RANGE:
+                numbers.extend(range(numbers[-1] + 1, value + 1))
+            else:
+                numbers.append(value)
+            pending_range = False
+    return list(dict.fromkeys(numbers))
+
+
+class RuleIndex:
+    def __init__(self, docs: Iterable[Dict[str, Any]], version: str = ""):
+        self.version = version
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self.articles: Dict[int, List[str]] = defaultdict(list)
+        self.chapters: Dict[int, List[str]] = defaultdict(list)
+        for doc in docs:
+            doc_id = doc.get("id")
+            if not doc_id:
+                continue
+            self.docs[doc_id] = doc
+            article = to_number(self._inner(doc.get("article_id"), "条"))
+            if article is not None:
+                self.articles[article].append(doc_id)
+            chapter = to_number(self._inner(doc.get("chapter"), "章"))
+            if chapter is not None:
+                self.chapters[chapter].append(doc_id)
+        for ids in list(self.articles.values()) + list(self.chapters.values()):
+            ids.sort(key=lambda doc_id: int(self.docs[doc_id].get("chunk_index") or 0))
+        logger.info("规则索引构建完成: version=%s docs=%d articles=%d chapters=%d", version, len(self.docs), len(self.articles), len(self.chapters))
+
+    def search(self, query: str, top_k: int = 10, filters: Filters = None) -> List[Dict[str, Any]]:
+        ids: List[str] = []
+        for article in parse_numbers(query, ARTICLE_SPAN_RE):
+            ids.extend(self.articles.get(article, []))
+        for chapter in parse_numbers(query, CHAPTER_SPAN_RE):
+            ids.extend(self.chapters.get(chapter, []))
+        results = []
+        for doc_id in dict.fromkeys(ids):
+            if len(results) >= top_k:
+                break
+            if not self._matches(self.docs[doc_id], filters):
+                continue
+            results.append({**self.docs[doc_id], "id": doc_id, "score": 1.0, "channel": "rule"})
+        return results
+
+    def _matches(self, doc: Dict[str, Any], filters: Filters) -> bool:
+        return all(doc.get(name) in filters[name] for name in FILTER_FIELDS if filters and filters.get(name))
+
+    def _inner(self, value: str, unit: str) -> str:
+        m = re.search(rf"第({NUM}){unit}", value or "")
+        return m.group(1) if m else ""
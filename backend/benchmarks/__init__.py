@@ -0,0 +1 @@
+"""Offline benchmarks and evaluation harnesses for the RAG backend."""
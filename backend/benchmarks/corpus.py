@@ -0,0 +1,48 @@
+from collections import Counter
+from typing import Dict, List
+from app.core.config import settings
+from app.rag.knowledge_ingest import load_chunks
+
+SAMPLE_QUERIES = [
+    "股东可以查阅公司会计账簿吗",
+    "公司拒绝股东查账，股东如何起诉",
+    "有限责任公司股权转让需要其他股东同意吗",
+    "股东优先购买权如何行使",
+    "股东未按期缴纳出资要承担什么责任",
+    "抽逃出资的法律后果",
+    "公司法第五十七条规定了什么",
+    "董事会决议无效的情形",
+    "公司解散后清算组如何组成",
+    "清算义务人未及时清算对债权人的责任",
+    "董事监事高级管理人员的忠实义务",
+    "公司合并时债权人保护程序",
+]
+
+
+def load_corpus(docs_folder: str = None) -> List[Dict]:
+    return load_chunks(docs_folder)
+
+
+def _bigrams(text: str) -> Counter:
+    text = "".join(text.split())
+    return Counter(text[i:i + 2] for i in range(len(text) - 1))
+
+
+def lexical_candidates(query: str, chunks: List[Dict], top_k: int = None) -> List[Dict]:
+    top_k = top_k or settings.fusion_top_k
+    query_grams = _bigrams(query)
+    scored = []
+    for chunk in chunks:
+        overlap = sum((query_grams & _bigrams(chunk["content"])).values())
+        if overlap:
+            scored.append((overlap, chunk))
+    scored.sort(key=lambda x: x[0], reverse=True)
+    return [chunk for _, chunk in scored[:top_k]]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
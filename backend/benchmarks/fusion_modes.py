@@ -0,0 +1,52 @@
+import argparse
+from statistics import mean
+from time import perf_counter
+from app.core.config import settings
+from app.services.model_service import ModelService
+from app.services.retrieval_service import RetrievalService
+from benchmarks.corpus import SAMPLE_QUERIES, percentile
+
+
+def run(top_k: int, repeat: int):
+    service = RetrievalService(ModelService())
+    if service.rule_index is None:
+        raise SystemExit("规则索引未加载，服务端混合检索不可用（请确认 ES 可访问）")
+    ids_only = settings.retrieval_ids_only
+    latencies = {"python": [], "server": []}
+    overlaps, top1, unsupported = [], [], 0
+    for query in SAMPLE_QUERIES:
+        embedding = service.model.embed_text(query)
+        python_ids, server_ids = [], None
+        for _ in range(repeat):
+            start = perf_counter()
+            python_ids = [doc["id"] for doc in service._fuse_python(query, embedding, top_k, ids_only)]
+            latencies["python"].append((perf_counter() - start) * 1000)
+            start = perf_counter()
+            server = service._fuse_server(query, embedding, top_k, ids_only)
+            if server is None:
+                unsupported += 1
+                break
+            latencies["server"].append((perf_counter() - start) * 1000)
+            server_ids = [doc["id"] for doc in server]
+        if server_ids is None:
+            continue
+        overlaps.append(len(set(python_ids) & set(server_ids)) / max(1, len(python_ids)))
+        top1.append(1.0 if python_ids[:1] == server_ids[:1] else 0.0)
+    print(f"queries={len(SAMPLE_QUERIES)} compared={len(overlaps)} server_unsupported={unsupported} top_k={top_k} ids_only={ids_only}")
+    for name, values in latencies.items():
+        if values:
+            print(f"{name}: mean_ms={mean(values):.1f} p50_ms={percentile(values, 50):.1f} p95_ms={percentile(values, 95):.1f}")
+    if overlaps:
+        print(f"parity: top{top_k}_overlap={mean(overlaps):.3f} top1_match={mean(top1):.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比 Python RRF 与 ES 服务端 RRF 的结果重合度与延迟")
+    parser.add_argument("--top-k", type=int, default=settings.fusion_top_k)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.top_k, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
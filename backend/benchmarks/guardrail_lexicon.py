@@ -0,0 +1,57 @@
+import argparse
+import random
+from statistics import mean
+from time import perf_counter
+from app.services.guardrail_lexicon import GuardrailLexicon, LexiconEntry, normalize_text
+from benchmarks.corpus import SAMPLE_QUERIES, percentile
+
+ALPHABET = "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处理府研质"
+MIXED_QUERIES = SAMPLE_QUERIES + [
+    "公司老闆想轉移資產逃避執行，我該怎麼辦",
+    "怎么 转 移 资 产 才能不被抓",
+    "ｈｏｗ to 洗·钱",
+    "股东查阅权受限时如何提起诉讼并申请证据保全，同时公司是否需要承担赔偿责任" * 4,
+]
+
+
+def synthetic_terms(count: int, seed: int):
+    rng = random.Random(seed)
+    return [("".join(rng.choice(ALPHABET) for _ in range(rng.randint(3, 6))), rng.choice(("banned", "handoff"))) for _ in range(count)]
+
+
+def run(count: int, repeat: int, seed: int):
+    terms = synthetic_terms(count, seed) + [("逃避执行", "banned"), ("转移资产", "banned"), ("洗钱", "banned"), ("转人工", "handoff")]
+    start = perf_counter()
+    lexicon = GuardrailLexicon(LexiconEntry(kind, term) for term, kind in terms)
+    build_ms = (perf_counter() - start) * 1000
+    naive_terms = [normalize_text(term)[0] for term, _ in terms]
+    latencies = {"automaton": [], "linear": []}
+    mismatched = 0
+    for query in MIXED_QUERIES:
+        for _ in range(repeat):
+            start = perf_counter()
+            found = {match.term for match in lexicon.scan(query)}
+            latencies["automaton"].append((perf_counter() - start) * 1e6)
+            start = perf_counter()
+            normalized, _ = normalize_text(query)
+            linear = {term for term in naive_terms if term in normalized}
+            latencies["linear"].append((perf_counter() - start) * 1e6)
+        mismatched += {normalize_text(term)[0] for term in found} != linear
+    print(f"terms={len(lexicon)} build_ms={build_ms:.1f} queries={len(MIXED_QUERIES)} repeat={repeat} mismatched={mismatched}")
+    for name, values in latencies.items():
+        print(f"{name}: mean_us={mean(values):.1f} p50_us={percentile(values, 50):.1f} p95_us={percentile(values, 95):.1f}")
+    for query in MIXED_QUERIES[-4:-1]:
+        print(f"{query} -> " + "; ".join(match.explain() for match in lexicon.scan(query)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="评估护栏词库在大规模词条下的单次匹配开销（自动机 vs 线性扫描）")
+    parser.add_argument("--terms", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    run(args.terms, args.repeat, args.seed)
+
+
+if __name__ == "__main__":
+    main()
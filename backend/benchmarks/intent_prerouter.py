@@ -0,0 +1,66 @@
+import argparse
+import json
+from collections import Counter
+from pathlib import Path
+from statistics import mean
+from time import perf_counter
+from app.core.config import settings
+from app.services.guardrail_service import GuardrailService
+from app.services.intent_router import IntentPreRouter
+from benchmarks.corpus import SAMPLE_QUERIES, percentile
+
+MIXED_QUERIES = SAMPLE_QUERIES + [
+    "你好",
+    "在吗？",
+    "谢谢",
+    "你是谁",
+    "我要转人工",
+    "你这个回答完全没用，我要投诉",
+    "公司法第七十一条至第七十三条的内容",
+    "第二十条是什么",
+    "你好，我是小股东，公司不给我看账怎么办",
+    "我之前提到的小明是做什么职业的？",
+]
+
+
+def load_queries(path: str):
+    if not path:
+        return MIXED_QUERIES
+    queries = []
+    for line in Path(path).read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        queries.append(json.loads(line).get("query", "") if line.startswith("{") else line)
+    return [q for q in queries if q]
+
+
+def run(path: str, threshold: float, verbose: bool):
+    router = IntentPreRouter(GuardrailService().handoff_keywords)
+    queries = load_queries(path)
+    rules, latencies = Counter(), []
+    for query in queries:
+        start = perf_counter()
+        decision = router.route(query, {})
+        latencies.append((perf_counter() - start) * 1e6)
+        local = decision.analysis is not None and decision.confidence >= threshold
+        rules[decision.rule if local else "llm"] += 1
+        if verbose:
+            print(f"{'local' if local else 'llm  '} rule={decision.rule} confidence={decision.confidence:.2f} query={query}")
+    skipped = len(queries) - rules["llm"]
+    print(f"queries={len(queries)} threshold={threshold} llm_skipped={skipped} skip_ratio={skipped / max(1, len(queries)):.3f}")
+    print("routes: " + " ".join(f"{rule}={count}" for rule, count in rules.most_common()))
+    print(f"latency_us: mean={mean(latencies):.1f} p50={percentile(latencies, 50):.1f} p95={percentile(latencies, 95):.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="统计本地意图预路由可跳过小模型调用的流量占比")
+    parser.add_argument("--file", default="", help="每行一个问题，或 JSONL（读取 query 字段）；缺省使用内置样例")
+    parser.add_argument("--threshold", type=float, default=settings.intent_router_threshold)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    run(args.file, args.threshold, args.verbose)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import argparse
+from statistics import mean
+from time import perf_counter
+import numpy as np
+from app.repositories.memory_repo import InMemoryRetrievalRepository
+from benchmarks.corpus import SAMPLE_QUERIES, percentile
+
+
+def timed(fn, repeat: int):
+    latencies = []
+    for _ in range(repeat):
+        start = perf_counter()
+        fn()
+        latencies.append((perf_counter() - start) * 1000)
+    return latencies
+
+
+def replicate(repo: InMemoryRetrievalRepository, laws: int) -> InMemoryRetrievalRepository:
+    docs = [{**doc, "id": f"{doc.get('id', '')}#{law}", "law_name": f"{doc.get('law_name') or '法规'}#{law}"} for law in range(laws) for doc in repo.docs]
+    embeddings = np.tile(np.asarray(repo.embeddings), (laws, 1)) if repo.embeddings is not None else None
+    return InMemoryRetrievalRepository(docs, embeddings, version=f"{repo.version}x{laws}")
+
+
+def run(repeat: int, top_k: int, snapshot: bool, laws: int):
+    repo = InMemoryRetrievalRepository.load() if snapshot else InMemoryRetrievalRepository.from_docs_folder()
+    filters = None
+    if laws > 1:
+        repo = replicate(repo, laws)
+        filters = {"law_name": [repo.docs[0]["law_name"]]}
+    dims = repo.embeddings.shape[1] if repo.embeddings is not None else 0
+    rng = np.random.default_rng(0)
+    channels = {"bm25": [], "rule": [], "dense": []}
+    for query in SAMPLE_QUERIES:
+        channels["bm25"].extend(timed(lambda: repo.search_bm25(query, top_k=top_k, filters=filters), repeat))
+        channels["rule"].extend(timed(lambda: repo.search_rule_article("第五十七条", top_k=top_k, filters=filters), repeat))
+        if dims:
+            vector = rng.standard_normal(dims).astype(np.float32).tolist()
+            channels["dense"].extend(timed(lambda: repo.search_knn(vector, top_k=top_k, filters=filters), repeat))
+    print(f"docs={len(repo.docs)} laws={max(1, laws)} filters={filters or {}} dims={dims} version={repo.index_version()} top_k={top_k}")
+    for name, values in channels.items():
+        if values:
+            print(f"{name}: mean_ms={mean(values):.3f} p50_ms={percentile(values, 50):.3f} p95_ms={percentile(values, 95):.3f}")
+        else:
+            print(f"{name}: skipped (快照中没有向量)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地内存检索引擎各通道延迟")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--snapshot", action="store_true", help="加载 LOCAL_INDEX_DIR 快照，而不是直接解析 DOCS_FOLDER")
+    parser.add_argument("--laws", type=int, default=1, help="将语料复制为 N 部法规并按其中一部过滤，观察语料增长时的过滤检索延迟")
+    args = parser.parse_args()
+    run(args.repeat, args.top_k, args.snapshot, args.laws)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import argparse
+import asyncio
+import time
+from statistics import mean
+from time import perf_counter
+from app.core.config import settings
+from app.core.streams import ThreadedStream
+from app.services.model_service import ModelService
+from benchmarks.corpus import SAMPLE_QUERIES, percentile
+
+
+def simulated_stream(ttft_ms: float, tokens: int, token_ms: float):
+    def factory():
+        time.sleep(ttft_ms / 1000)
+        for i in range(tokens):
+            if i:
+                time.sleep(token_ms / 1000)
+            yield "字"
+    return factory
+
+
+def live_streams(model: ModelService, query: str):
+    draft = [{"role": "system", "content": "你是企业公司法咨询助手。请给出200字以内的简短初答。"}, {"role": "user", "content": query}]
+    main = [{"role": "system", "content": "你是企业公司法咨询助手。请给出结构化的完整法律分析。"}, {"role": "user", "content": query}]
+    return (
+        lambda: model.stream_main(draft, model=settings.small_llm_model, max_tokens=350, temperature=0.2),
+        lambda: model.stream_main(main, max_tokens=1200),
+    )
+
+
+async def consume(draft_factory, main_factory, pipelined: bool):
+    start = perf_counter()
+    main_stream = ThreadedStream(main_factory)
+    if pipelined:
+        main_stream.start()
+    async for _ in ThreadedStream(draft_factory):
+        pass
+    draft_done = perf_counter()
+    first_main = None
+    async for _ in main_stream:
+        if first_main is None:
+            first_main = perf_counter()
+    end = perf_counter()
+    return {
+        "total_ms": (end - start) * 1000,
+        "gap_ms": ((first_main or end) - draft_done) * 1000,
+    }
+
+
+def run(args):
+    model = ModelService() if args.live else None
+    queries = SAMPLE_QUERIES[:args.queries]
+    results = {"sequential": [], "pipelined": []}
+    for query in queries:
+        for mode in results:
+            if args.live:
+                draft_factory, main_factory = live_streams(model, query)
+            else:
+                draft_factory = simulated_stream(args.draft_ttft_ms, args.draft_tokens, args.draft_token_ms)
+                main_factory = simulated_stream(args.main_ttft_ms, args.main_tokens, args.main_token_ms)
+            results[mode].append(asyncio.run(consume(draft_factory, main_factory, mode == "pipelined")))
+    print(f"queries={len(queries)} source={'live' if args.live else 'simulated'}")
+    for mode, values in results.items():
+        totals = [item["total_ms"] for item in values]
+        gaps = [item["gap_ms"] for item in values]
+        print(f"{mode}: total_mean_ms={mean(totals):.1f} total_p95_ms={percentile(totals, 95):.1f} draft_to_main_gap_ms={mean(gaps):.1f}")
+    sequential = mean(item["total_ms"] for item in results["sequential"])
+    pipelined = mean(item["total_ms"] for item in results["pipelined"])
+    print(f"total_latency_reduction_ms={sequential - pipelined:.1f} ({(sequential - pipelined) / sequential:.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比 Plus 模式初答与完整回答串行/并行生成的总时延")
+    parser.add_argument("--live", action="store_true", help="调用真实模型接口；缺省使用模拟流")
+    parser.add_argument("--queries", type=int, default=3)
+    parser.add_argument("--draft-ttft-ms", type=float, default=400)
+    parser.add_argument("--draft-tokens", type=int, default=60)
+    parser.add_argument("--draft-token-ms", type=float, default=15)
+    parser.add_argument("--main-ttft-ms", type=float, default=1500)
+    parser.add_argument("--main-tokens", type=int, default=120)
+    parser.add_argument("--main-token-ms", type=float, default=25)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
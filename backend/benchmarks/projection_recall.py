@@ -0,0 +1,68 @@
+import argparse
+from statistics import mean
+from time import perf_counter
+import numpy as np
+from app.core.config import settings
+from app.repositories.memory_repo import read_full_embeddings
+from app.services.embedding_projection import EmbeddingProjection, l2_normalize
+from app.services.model_service import ModelService
+from benchmarks.corpus import SAMPLE_QUERIES
+
+
+def query_vectors(corpus: np.ndarray, source: str) -> np.ndarray:
+    if source == "api":
+        vectors = [vector for vector in ModelService().embed_texts(SAMPLE_QUERIES, raw=True) if vector]
+        if vectors:
+            return l2_normalize(np.asarray(vectors, dtype=np.float32))
+        print("查询向量获取失败，改用条文向量作为查询")
+    return corpus
+
+
+def top_ids(corpus: np.ndarray, queries: np.ndarray, k: int, exclude_self: bool) -> np.ndarray:
+    scores = queries @ corpus.T
+    if exclude_self:
+        np.fill_diagonal(scores, -np.inf)
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def run(dims_list, ks, source: str):
+    corpus = read_full_embeddings(settings.local_index_dir)
+    if corpus is None or not corpus.size:
+        raise SystemExit(f"本地快照中没有原始向量，请先运行入库: {settings.local_index_dir}")
+    corpus = l2_normalize(np.asarray(corpus, dtype=np.float32))
+    queries = query_vectors(corpus, source)
+    exclude_self = queries is corpus
+    max_k = max(ks)
+    start = perf_counter()
+    baseline = top_ids(corpus, queries, max_k, exclude_self)
+    full_ms = (perf_counter() - start) * 1000 / len(queries)
+    print(f"articles={corpus.shape[0]} queries={len(queries)} source={'articles' if exclude_self else 'api'} full_dims={corpus.shape[1]} full_bytes={corpus.shape[1] * 4} full_ms={full_ms:.3f}")
+    for dims in dims_list:
+        if dims >= corpus.shape[1]:
+            continue
+        if dims > EmbeddingProjection.max_dims(*corpus.shape):
+            print(f"dims={dims} skipped: 超出可拟合上限 {EmbeddingProjection.max_dims(*corpus.shape)}（条文数 {corpus.shape[0]}）")
+            continue
+        projection = EmbeddingProjection.fit(corpus, dims)
+        reduced_corpus = projection.apply_many(corpus)
+        reduced_queries = reduced_corpus if exclude_self else projection.apply_many(queries)
+        start = perf_counter()
+        reduced = top_ids(reduced_corpus, reduced_queries, max_k, exclude_self)
+        reduced_ms = (perf_counter() - start) * 1000 / len(queries)
+        recalls = []
+        for k in ks:
+            recalls.append(f"recall@{k}={mean(len(set(a[:k]) & set(b[:k])) / k for a, b in zip(baseline, reduced)):.3f}")
+        print(f"dims={projection.dims} explained={float(projection.explained.sum()):.3f} bytes={projection.dims * 4} ms={reduced_ms:.3f} " + " ".join(recalls))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="评估降维投影相对原始维度检索的 recall@k")
+    parser.add_argument("--dims", default="64,128,256,384,512,768")
+    parser.add_argument("--k", default="5,10,20")
+    parser.add_argument("--queries", choices=["articles", "api"], default="articles", help="articles: 以条文向量互查（留一）; api: 调用 Embedding 接口生成样例查询向量")
+    args = parser.parse_args()
+    run([int(x) for x in args.dims.split(",")], [int(x) for x in args.k.split(",")], args.queries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import argparse
+from pathlib import Path
+from statistics import mean
+from time import perf_counter
+from typing import Dict, List
+from app.core.config import settings
+from app.services.reranker import ONNX_MODEL_FILE, OnnxCrossEncoder, TorchCrossEncoder
+from benchmarks.corpus import SAMPLE_QUERIES, lexical_candidates, load_corpus, percentile
+
+
+def kendall_tau(a: List[float], b: List[float]) -> float:
+    concordant = discordant = 0
+    for i in range(len(a)):
+        for j in range(i + 1, len(a)):
+            sign = (a[i] - a[j]) * (b[i] - b[j])
+            if sign > 0:
+                concordant += 1
+            elif sign < 0:
+                discordant += 1
+    total = concordant + discordant
+    return (concordant - discordant) / total if total else 1.0
+
+
+def top_ids(docs: List[Dict], scores: List[float], top_n: int) -> List[str]:
+    ordered = sorted(zip(docs, scores), key=lambda x: x[1], reverse=True)
+    return [doc["id"] for doc, _ in ordered[:top_n]]
+
+
+def timed_score(encoder, pairs, repeat: int):
+    latencies = []
+    scores = []
+    for _ in range(repeat):
+        start = perf_counter()
+        scores = encoder.score(pairs)
+        latencies.append((perf_counter() - start) * 1000)
+    return scores, latencies
+
+
+def run(repeat: int, top_n: int, threads: int):
+    chunks = load_corpus()
+    torch_encoder = TorchCrossEncoder(settings.rerank_model_path)
+    if not Path(settings.rerank_onnx_path, ONNX_MODEL_FILE).exists():
+        raise SystemExit(f"ONNX 模型不存在，请先执行 python -m app.rag.rerank_onnx: {settings.rerank_onnx_path}")
+    onnx_encoder = OnnxCrossEncoder(settings.rerank_onnx_path, threads=threads)
+    torch_latencies, onnx_latencies, taus, overlaps, top1 = [], [], [], [], []
+    for query in SAMPLE_QUERIES:
+        docs = lexical_candidates(query, chunks, settings.fusion_top_k)
+        if not docs:
+            continue
+        pairs = [(query, doc["content"]) for doc in docs]
+        torch_encoder.score(pairs)
+        onnx_encoder.score(pairs)
+        torch_scores, latency = timed_score(torch_encoder, pairs, repeat)
+        torch_latencies.extend(latency)
+        onnx_scores, latency = timed_score(onnx_encoder, pairs, repeat)
+        onnx_latencies.extend(latency)
+        torch_top = top_ids(docs, torch_scores, top_n)
+        onnx_top = top_ids(docs, onnx_scores, top_n)
+        taus.append(kendall_tau(torch_scores, onnx_scores))
+        overlaps.append(len(set(torch_top) & set(onnx_top)) / max(1, len(torch_top)))
+        top1.append(1.0 if torch_top[:1] == onnx_top[:1] else 0.0)
+    print(f"corpus_chunks={len(chunks)} queries={len(taus)} candidates={settings.fusion_top_k} top_n={top_n} onnx_threads={threads}")
+    for name, values in [("torch_fp32", torch_latencies), ("onnx_int8", onnx_latencies)]:
+        print(f"{name}: mean_ms={mean(values):.1f} p50_ms={percentile(values, 50):.1f} p95_ms={percentile(values, 95):.1f}")
+    print(f"speedup={mean(torch_latencies) / max(mean(onnx_latencies), 1e-6):.2f}x")
+    print(f"agreement: kendall_tau={mean(taus):.3f} top{top_n}_overlap={mean(overlaps):.3f} top1_match={mean(top1):.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比 PyTorch fp32 与 ONNX int8 Rerank 的延迟与排序一致性")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top-n", type=int, default=settings.rerank_top_n)
+    parser.add_argument("--threads", type=int, default=settings.rerank_onnx_threads)
+    args = parser.parse_args()
+    run(args.repeat, args.top_n, args.threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+from app.schemas.chat import Citation
+from app.services.answer_cache import AnswerCache, case_slots_empty
+
+
+def citations(*ids):
+    return [Citation(citation_id=str(n), doc_id=doc_id, content=doc_id) for n, doc_id in enumerate(ids, 1)]
+
+
+def remember(cache, query, vector, cited, answer, version="v1", model="m"):
+    assert cache.lookup(query, vector, cited, version, model)[0] is None
+    cache.store(query, vector, cited, answer, version, model)
+
+
+def test_exact_hit_requires_same_citation_order():
+    cache = AnswerCache()
+    remember(cache, "股东能查账吗", None, citations("a", "b"), "依据[1]和[2]")
+    assert cache.lookup("股东能查账吗", None, citations("a", "b"), "v1", "m") == ("依据[1]和[2]", "exact")
+    assert cache.lookup("股东能查账吗", None, citations("b", "a"), "v1", "m") == (None, "")
+
+
+def test_exact_key_includes_model_and_query():
+    cache = AnswerCache()
+    remember(cache, "股东能查账吗", None, citations("a"), "答案", model="m1")
+    assert cache.lookup("股东能查账吗", None, citations("a"), "v1", "m2")[0] is None
+    assert cache.lookup("股东能分红吗", None, citations("a"), "v1", "m1")[0] is None
+
+
+def test_semantic_hit_on_similar_vector():
+    cache = AnswerCache(similarity=0.9)
+    remember(cache, "股东能查账吗", [1.0, 0.0], citations("a", "b"), "答案")
+    assert cache.lookup("股东可以查账吗", [0.99, 0.05], citations("a", "b"), "v1", "m") == ("答案", "semantic")
+    assert cache.lookup("股东可以查账吗", [0.0, 1.0], citations("a", "b"), "v1", "m")[0] is None
+
+
+def test_index_version_change_invalidates_and_blocks_stale_store():
+    cache = AnswerCache()
+    remember(cache, "q", None, citations("a"), "旧答案")
+    assert cache.lookup("q", None, citations("a"), "v2", "m")[0] is None
+    cache.store("q", None, citations("a"), "过期答案", "v1", "m")
+    assert cache.lookup("q", None, citations("a"), "v2", "m")[0] is None
+
+
+def test_case_slots_empty():
+    assert case_slots_empty({"active_scenario": "general", "shareholder_governance": {"evidence": []}})
+    assert not case_slots_empty({"active_scenario": "general", "shareholder_governance": {"user_role": "小股东"}})
@@ -0,0 +1,36 @@
+import time
+from app.core.cache import TTLCache, normalize_query, query_hash
+
+
+def test_query_hash_normalizes_width_case_and_spaces():
+    assert normalize_query("  Ａ  股东\t查账 ") == "a 股东 查账"
+    assert query_hash("股东 查账") == query_hash(" 股东  查账 ")
+    assert query_hash("股东查账") != query_hash("股东分红")
+
+
+def test_lru_eviction():
+    cache = TTLCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+
+def test_ttl_expiry():
+    cache = TTLCache(ttl_seconds=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a", "miss") == "miss"
+
+
+def test_version_change_invalidates():
+    cache = TTLCache()
+    cache.ensure_version("v1")
+    cache.set("a", 1)
+    cache.ensure_version("v1")
+    assert cache.get("a") == 1
+    cache.ensure_version("v2")
+    assert cache.get("a") is None
+    assert cache.stats()["version"] == "v2"
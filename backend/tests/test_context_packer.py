@@ -0,0 +1,62 @@
+from app.schemas.chat import Citation
+from app.services.context_packer import NO_CONTEXT, ContextPacker, PackBudget, estimate_tokens, truncate_tokens
+
+ARTICLE = "有限责任公司股东可以要求查阅公司会计账簿、会计凭证。股东要求查阅的，应当向公司提出书面请求并说明目的。"
+OTHER = ["公司应当在每一会计年度终了时编制财务会计报告，并依法经会计师事务所审计。", "股东会会议由股东按照出资比例行使表决权；但是，公司章程另有规定的除外。", "公司分配当年税后利润时，应当提取利润的百分之十列入公司法定公积金。", "董事、监事、高级管理人员应当遵守法律、行政法规和公司章程。"]
+
+
+def citation(n, content=ARTICLE * 4):
+    return Citation(citation_id=str(n), article_id=f"第{n}条", content=content, filename="公司法.docx")
+
+
+def test_estimate_and_truncate_tokens():
+    assert estimate_tokens("股东") == 2
+    assert estimate_tokens("abcd") == 1
+    assert truncate_tokens("股东查阅账簿", 3) == "股东…"
+    assert truncate_tokens("股东查阅账簿", 3, keep_tail=True) == "…账簿"
+    assert truncate_tokens("股东", 0) == ""
+
+
+def test_citations_fit_budget_and_are_trimmed():
+    packer = ContextPacker({"normal": PackBudget(300, 0.25)})
+    packed = packer.pack("normal", "股东能查账吗", [citation(n) for n in range(1, 6)])
+    assert packed.tokens["citations"] <= 300
+    assert sum(packed.tokens.values()) <= 300
+    assert 0 < packed.citations_used < 5
+    assert packed.context.startswith("[1]")
+
+
+def test_duplicate_citations_become_notes():
+    packer = ContextPacker({"normal": PackBudget(2000, 0.25)})
+    packed = packer.pack("normal", "q", [citation(1), citation(2)])
+    assert packed.deduped == 1
+    assert packed.citations_used == 1
+    assert "已省略" in packed.context
+
+
+def test_draft_limits_and_caps_citations():
+    packer = ContextPacker({"draft": PackBudget(5000, 0.25, max_citations=2, citation_cap=30)})
+    packed = packer.pack("draft", "q", [citation(n, content=OTHER[n - 1] * 2) for n in range(1, 5)])
+    assert packed.citations_used == 2
+    assert packed.citations_total == 4
+    assert packed.trimmed == ["1", "2"]
+
+
+def test_memory_keeps_priority_sections_when_over_budget():
+    memory = "\n\n".join(["【长期图记忆】\n" + "长" * 400, "【短期记忆】\n" + "短" * 100])
+    packer = ContextPacker({"plus": PackBudget(300, 0.35)})
+    packed = packer.pack("plus", "q", [], memory)
+    assert "【短期记忆】\n" + "短" * 100 in packed.memory
+    assert "长" * 400 not in packed.memory
+    assert estimate_tokens(packed.memory) <= 300
+    assert "memory" in packed.trimmed
+    assert packed.context == NO_CONTEXT
+
+
+def test_follow_up_reserves_more_memory():
+    memory = "【短期记忆】\n" + "短" * 600
+    packer = ContextPacker({"plus": PackBudget(800, 0.2)})
+    citations = [citation(n, content=OTHER[n - 1] * 6) for n in range(1, 4)]
+    normal = packer.pack("plus", "q", citations, memory)
+    follow_up = packer.pack("plus", "q", citations, memory, follow_up=True)
+    assert follow_up.tokens["memory"] > normal.tokens["memory"]
@@ -0,0 +1,49 @@
+import pytest
+from app.core.config import settings
+from app.services.intent_router import IntentPreRouter
+
+
+@pytest.fixture(scope="module")
+def router():
+    return IntentPreRouter(["转人工", "人工客服", "找客服", "找律师", "真人", "投诉"])
+
+
+def local(decision) -> bool:
+    return decision.analysis is not None and decision.confidence >= settings.intent_router_threshold
+
+
+@pytest.mark.parametrize("query", ["转人工", "我要转人工", "帮我转人工客服！", "你好，我要转人工"])
+def test_explicit_handoff_routes_locally(router, query):
+    decision = router.route(query)
+    assert decision.rule == "handoff"
+    assert local(decision)
+    assert decision.analysis.query_type == "human_handoff"
+
+
+@pytest.mark.parametrize("query", [
+    "我不需要转人工，直接告诉我公司法第57条",
+    "别给我转人工",
+    "公司法对真人股东有什么规定",
+    "我是小股东，公司不给我看账，我要转人工",
+])
+def test_negated_or_embedded_handoff_goes_to_llm(router, query):
+    assert not local(router.route(query))
+
+
+@pytest.mark.parametrize("query,rule", [("你好", "greeting"), ("谢谢你", "thanks"), ("你是谁", "identity")])
+def test_small_talk(router, query, rule):
+    decision = router.route(query)
+    assert decision.rule == rule
+    assert local(decision)
+    assert decision.analysis.direct_answer
+
+
+def test_statute_lookup(router):
+    decision = router.route("公司法第五十七条规定了什么")
+    assert decision.rule == "statute_lookup"
+    assert local(decision)
+    assert decision.analysis.intents[0].rewritten_query.endswith("第五十七条的规定")
+
+
+def test_case_question_is_not_routed(router):
+    assert not local(router.route("你好，我是小股东，公司不给我看账怎么办"))
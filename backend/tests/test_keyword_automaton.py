@@ -0,0 +1,27 @@
+from app.core.keyword_automaton import KeywordAutomaton
+
+
+def test_finds_overlapping_matches_with_payloads():
+    automaton = KeywordAutomaton([("he", 1), ("she", 2), ("his", 3), ("hers", 4)]).build()
+    assert sorted(automaton.finditer("ushers")) == [(1, 4, "she", 2), (2, 4, "he", 1), (2, 6, "hers", 4)]
+
+
+def test_findall_prefers_leftmost_longest():
+    automaton = KeywordAutomaton([("人工", "a"), ("转人工", "b"), ("人工客服", "c")])
+    assert [m[2] for m in automaton.findall("转人工客服")] == ["转人工"]
+    assert [m[2] for m in automaton.findall("人工客服")] == ["人工客服"]
+    assert len(automaton.findall("转人工客服", longest=False)) == 3
+
+
+def test_add_after_build_rebuilds_lazily():
+    automaton = KeywordAutomaton([("洗钱", None)]).build()
+    automaton.add("诈骗", None)
+    assert [m[2] for m in automaton.findall("诈骗和洗钱")] == ["诈骗", "洗钱"]
+    assert len(automaton) == 2
+
+
+def test_empty_keyword_and_text():
+    automaton = KeywordAutomaton([("", None)])
+    assert len(automaton) == 0
+    assert automaton.findall("") == []
+    assert automaton.findall(None) == []
@@ -0,0 +1,49 @@
+import pytest
+from app.services.rule_index import ARTICLE_SPAN_RE, CHAPTER_SPAN_RE, RuleIndex, parse_numbers, to_number
+
+
+@pytest.mark.parametrize("raw,expected", [("57", 57), ("五十七", 57), ("一百零二", 102), ("两", 2), ("", None), ("abc", None)])
+def test_to_number(raw, expected):
+    assert to_number(raw) == expected
+
+
+@pytest.mark.parametrize("query,expected", [
+    ("公司法第57条规定了什么", [57]),
+    ("第五十七条和第五十八条", [57, 58]),
+    ("第57、58条", [57, 58]),
+    ("第57至60条", [57, 58, 59, 60]),
+    ("第五十七条到第六十条的内容", [57, 58, 59, 60]),
+    ("第60至57条", [60, 57]),
+    ("第1至100条", [1, 100]),
+    ("股东可以查阅账簿吗", []),
+])
+def test_parse_articles(query, expected):
+    assert parse_numbers(query, ARTICLE_SPAN_RE) == expected
+
+
+def test_parse_chapters():
+    assert parse_numbers("公司法第三章和第五章", CHAPTER_SPAN_RE) == [3, 5]
+    assert parse_numbers("第三章", ARTICLE_SPAN_RE) == []
+
+
+@pytest.fixture
+def index():
+    docs = [
+        {"id": "a57", "article_id": "第五十七条", "chapter": "第三章", "chunk_index": 2, "law_name": "公司法"},
+        {"id": "a58", "article_id": "第五十八条", "chapter": "第三章", "chunk_index": 3, "law_name": "公司法"},
+        {"id": "j57", "article_id": "第五十七条", "chapter": "", "chunk_index": 1, "law_name": "司法解释"},
+        {"article_id": "第一条"},
+    ]
+    return RuleIndex(docs, version="v1")
+
+
+def test_search_articles_and_filters(index):
+    assert [doc["id"] for doc in index.search("第57条")] == ["j57", "a57"]
+    assert [doc["id"] for doc in index.search("第57条", filters={"law_name": ["公司法"]})] == ["a57"]
+    assert [doc["id"] for doc in index.search("第57至58条", top_k=2, filters={"law_name": ["公司法"]})] == ["a57", "a58"]
+
+
+def test_search_chapter(index):
+    results = index.search("第三章")
+    assert [doc["id"] for doc in results] == ["a57", "a58"]
+    assert all(doc["channel"] == "rule" and doc["score"] == 1.0 for doc in results)
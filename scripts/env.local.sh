@@ -36,11 +36,47 @@ export DASHSCOPE_API_KEY="${DASHSCOPE_API_KEY:-}"
 export LLM_MODEL="${LLM_MODEL:-qwen3.6-max-preview}"
 export SMALL_LLM_MODEL="${SMALL_LLM_MODEL:-qwen3.6-flash}"
 export EMBEDDING_MODEL="${EMBEDDING_MODEL:-tongyi-embedding-vision-plus-2026-03-06}"
+export EMBEDDING_PROJECTION_DIMS="${EMBEDDING_PROJECTION_DIMS:-0}"
 
 export ES_HOST="${ES_HOST:-http://localhost:9200}"
 export ES_INDEX="${ES_INDEX:-${INDEX_NAME:-new_qiyefa}}"
 export INDEX_NAME="$ES_INDEX"
+export ES_INDEX_REPLICAS="${ES_INDEX_REPLICAS:-1}"
+export ES_INDEX_RETAIN="${ES_INDEX_RETAIN:-1}"
 export DOCS_FOLDER="$BACKEND_DIR/rag/data"
+export LAW_CATALOG_PATH="${LAW_CATALOG_PATH:-$BACKEND_DIR/rag/law_catalog.json}"
+export GUARDRAIL_LEXICON_DIR="${GUARDRAIL_LEXICON_DIR:-$BACKEND_DIR/rag/guardrail}"
+export GUARDRAIL_RELOAD_INTERVAL="${GUARDRAIL_RELOAD_INTERVAL:-5}"
+export RETRIEVAL_BACKEND="${RETRIEVAL_BACKEND:-es}"
+export RETRIEVAL_FUSION="${RETRIEVAL_FUSION:-python}"
+export RETRIEVAL_IDS_ONLY="${RETRIEVAL_IDS_ONLY:-false}"
+export RETRIEVAL_CACHE_ENABLED="${RETRIEVAL_CACHE_ENABLED:-true}"
+export RETRIEVAL_CACHE_SIZE="${RETRIEVAL_CACHE_SIZE:-2000}"
+export RETRIEVAL_CACHE_TTL_SECONDS="${RETRIEVAL_CACHE_TTL_SECONDS:-3600}"
+export INTENT_ROUTER_ENABLED="${INTENT_ROUTER_ENABLED:-true}"
+export INTENT_ROUTER_THRESHOLD="${INTENT_ROUTER_THRESHOLD:-0.9}"
+export INTENT_CACHE_ENABLED="${INTENT_CACHE_ENABLED:-true}"
+export INTENT_CACHE_TTL_SECONDS="${INTENT_CACHE_TTL_SECONDS:-1800}"
+export LLM_RATE_LIMIT_RPS="${LLM_RATE_LIMIT_RPS:-0}"
+export EMBEDDING_RATE_LIMIT_RPS="${EMBEDDING_RATE_LIMIT_RPS:-0}"
+export RERANK_RATE_LIMIT_RPS="${RERANK_RATE_LIMIT_RPS:-0}"
+export BATCH_CONCURRENCY="${BATCH_CONCURRENCY:-4}"
+export PROGRESSIVE_CITATIONS="${PROGRESSIVE_CITATIONS:-true}"
+export SSE_WINDOW_MS="${SSE_WINDOW_MS:-40}"
+export SSE_MAX_BYTES="${SSE_MAX_BYTES:-1024}"
+export SSE_MAX_PENDING="${SSE_MAX_PENDING:-256}"
+export GENERATION_PIPELINED="${GENERATION_PIPELINED:-true}"
+export GENERATION_STREAM_WORKERS="${GENERATION_STREAM_WORKERS:-16}"
+export PROMPT_TOKEN_BUDGET_NORMAL="${PROMPT_TOKEN_BUDGET_NORMAL:-2000}"
+export PROMPT_TOKEN_BUDGET_PLUS="${PROMPT_TOKEN_BUDGET_PLUS:-4000}"
+export PROMPT_TOKEN_BUDGET_DRAFT="${PROMPT_TOKEN_BUDGET_DRAFT:-1200}"
+export ANSWER_CACHE_ENABLED="${ANSWER_CACHE_ENABLED:-true}"
+export ANSWER_CACHE_SIMILARITY="${ANSWER_CACHE_SIMILARITY:-0.95}"
+export LOCAL_INDEX_DIR="${LOCAL_INDEX_DIR:-$BACKEND_DIR/rag/local_index}"
+export INGEST_PARSE_WORKERS="${INGEST_PARSE_WORKERS:-4}"
+export INGEST_EMBED_BATCH_SIZE="${INGEST_EMBED_BATCH_SIZE:-8}"
+export INGEST_EMBED_CONCURRENCY="${INGEST_EMBED_CONCURRENCY:-4}"
+export INGEST_WATCH_INTERVAL="${INGEST_WATCH_INTERVAL:-2}"
 
 export MONGODB_URL="${MONGODB_URL:-mongodb://localhost:27017}"
 export MONGODB_DATABASE="${MONGODB_DATABASE:-${DATABASE_NAME:-rag_system}}"
@@ -65,6 +101,11 @@ export RERANK_MODEL_NAME="${RERANK_MODEL_NAME:-qwen3-rerank}"
 export RERANK_ENDPOINT="${RERANK_ENDPOINT:-https://dashscope.aliyuncs.com/compatible-api/v1/reranks}"
 export RERANK_MODEL_PATH="${RERANK_MODEL_PATH:-$BACKEND_DIR/rag/rerank_model}"
 export RERANK_ENABLED="${RERANK_ENABLED:-true}"
+export RERANK_BACKEND="${RERANK_BACKEND:-torch}"
+export RERANK_ONNX_PATH="${RERANK_ONNX_PATH:-$BACKEND_DIR/rag/rerank_model_onnx}"
+export RERANK_ONNX_THREADS="${RERANK_ONNX_THREADS:-4}"
+export RERANK_DEADLINE_SECONDS="${RERANK_DEADLINE_SECONDS:-2.5}"
+export RERANK_LOCAL_DEADLINE_SECONDS="${RERANK_LOCAL_DEADLINE_SECONDS:-0}"
 export FUSION_TOP_K="${FUSION_TOP_K:-10}"
 export RERANK_TOP_N="${RERANK_TOP_N:-5}"
 export DOCS_PER_INTENT="${DOCS_PER_INTENT:-5}"